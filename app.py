@@ -2,21 +2,42 @@ from flask import Flask, render_template, request, jsonify, send_file
 from flask_cors import CORS
 import os
 import json
-import subprocess
 import tempfile
 import datetime
 import uuid
-from libs import printboard as kb
-from libs.switches import gamdias_lp as switch
-from libs.controllers import tinys2 as controller
-from solid import scad_render_to_file
+import mimetypes
+import functools
+import hmac
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import safe_join
 
 # Import V2 API
-from libs.printboard_v2 import KeyboardBuilder, KeyboardConfig, MatrixConfig
+from libs.printboard_v2 import KeyboardBuilder, KeyboardConfig, MatrixConfig, LayoutPlanner
 from libs.printboard_v2.builder import keyboard_builder
+from libs.printboard_v2.placement import place_keys
+from libs.printboard_v2.scad import write_scad
+from libs.printboard_v2.metrics import collect_timings, record_cache, render_metrics, render_queue_depth, rounded, stage
+from libs.printboard_v2.profiling import SamplingProfiler, store_profile
+from libs.printboard_v2.tracing import FileExporter, span, trace
+from libs.printboard_v2.capture import CaptureLog, normalize_payload, routing_seed
+from libs.artifacts import get_artifact_store, COMPRESSED_SUFFIX, VIEWER_SUFFIX, PREVIEW_MESH_SUFFIX, PENDING_SUFFIX
+from libs.render import openscad_available, render_stl
+from libs.mesh import write_viewer_mesh
+from libs.scene import build_scene
+from libs.cavities import render_instances_stl
+from libs.tiling import render_tiled, TILE_MODES
+import numpy as np
 import io
 import base64
 
+# Imported by the first request that needs them instead of at startup: the V1
+# stack (scipy, shapely), the legacy switch, which builds its geometry on
+# import, and the mesh assembler (shapely). serve.py preloads them.
+DEFERRED_MODULES = ('libs.printboard', 'libs.switches.gamdias_lp', 'libs.controllers.tinys2', 'libs.assembler')
+
 app = Flask(__name__)
 CORS(app)
 
@@ -27,13 +48,278 @@ def static_files(filename):
 
 # Configuration
 app.config['SECRET_KEY'] = 'dev-key-change-in-production'
-app.config['OUTPUT_DIR'] = os.path.join(os.path.dirname(__file__), 'output')
+app.config['OUTPUT_DIR'] = os.environ.get('OUTPUT_DIR') or os.path.join(os.path.dirname(__file__), 'output')
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
+app.config['PREVIEW_BATCH_LIMIT'] = int(os.environ.get('PREVIEW_BATCH_LIMIT', 10000))
+app.config['OUTPUT_QUOTA_BYTES'] = int(os.environ.get('OUTPUT_QUOTA_BYTES', 0))  # 0 = unlimited
+app.config['ARTIFACT_MAX_AGE'] = int(os.environ.get('ARTIFACT_MAX_AGE', 365 * 24 * 3600))
+app.config['ARTIFACT_OFFLOAD'] = os.environ.get('ARTIFACT_OFFLOAD', '')  # '', 'x-accel' or 'x-sendfile'
+app.config['ARTIFACT_ACCEL_PREFIX'] = os.environ.get('ARTIFACT_ACCEL_PREFIX', '/protected-output')
+app.config['RENDER_TIMEOUT'] = int(os.environ.get('RENDER_TIMEOUT', 60))
+app.config['VIEWER_QUANTIZE_BITS'] = int(os.environ.get('VIEWER_QUANTIZE_BITS', 0))  # 0 = lossless float32
+app.config['PREVIEW_MESH_FN'] = int(os.environ.get('PREVIEW_MESH_FN', 8))
+app.config['PREVIEW_TRIANGLE_BUDGET'] = int(os.environ.get('PREVIEW_TRIANGLE_BUDGET', 20000))
+app.config['RENDER_TILE_SIZE'] = float(os.environ.get('RENDER_TILE_SIZE', 0))  # mm, 0 = no tiling
+app.config['RENDER_TILE_SEAM'] = float(os.environ.get('RENDER_TILE_SEAM', 2))
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', 0)) or None  # None = one per core
+app.config['SCAD_QUANTIZE_STEP'] = float(os.environ.get('SCAD_QUANTIZE_STEP', 0.001))  # mm, 0 = full precision
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN', '')  # '' = admin features disabled
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', '')  # '' = <OUTPUT_DIR>/.profiles
+app.config['PROFILE_INTERVAL'] = float(os.environ.get('PROFILE_INTERVAL', 0.001))  # seconds between samples
+app.config['TRACE_DIR'] = os.environ.get('TRACE_DIR', '')  # '' = tracing disabled
+app.config['CAPTURE_DIR'] = os.environ.get('CAPTURE_DIR', '')  # '' = request capture disabled
+app.config['CAPTURE_SAMPLE_RATE'] = float(os.environ.get('CAPTURE_SAMPLE_RATE', 0.01))  # share of fast requests kept
+app.config['CAPTURE_SLOW_SECONDS'] = float(os.environ.get('CAPTURE_SLOW_SECONDS', 5))  # always kept above this
+app.config['USE_X_SENDFILE'] = app.config['ARTIFACT_OFFLOAD'] == 'x-sendfile'
 
 # Ensure directories exist
 os.makedirs(app.config['OUTPUT_DIR'], exist_ok=True)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+def artifact_store():
+    """Artifact index for the configured output directory."""
+    return get_artifact_store(app.config['OUTPUT_DIR'], app.config['OUTPUT_QUOTA_BYTES'])
+
+def profiling_requested() -> bool:
+    """Whether the request asks for a profile (``?profile=1`` or ``"profile": true``)."""
+    if request.args.get('profile', '').lower() in ('1', 'true'):
+        return True
+    body = request.get_json(silent=True)
+    return isinstance(body, dict) and body.get('profile') is True
+
+def profiled(view):
+    """Run ``view`` under the sampling profiler when an admin asks for it.
+
+    Requires an ``X-Admin-Token`` header matching ``ADMIN_TOKEN``. The
+    profile (top functions, call tree, collapsed stacks) is added to the
+    JSON response as ``profile`` and stored under ``PROFILE_DIR``.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiling_requested():
+            return view(*args, **kwargs)
+        token = app.config['ADMIN_TOKEN']
+        if not token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+            return jsonify({'success': False, 'error': 'Profiling requires a valid admin token'}), 403
+
+        with SamplingProfiler(app.config['PROFILE_INTERVAL']) as profiler:
+            response = app.make_response(view(*args, **kwargs))
+        profile = profiler.to_dict()
+        profile['name'] = f"{view.__name__}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
+        store_profile(profile, app.config['PROFILE_DIR'] or os.path.join(app.config['OUTPUT_DIR'], '.profiles'),
+                      profile['name'])
+
+        data = response.get_json(silent=True)
+        if isinstance(data, dict):
+            data['profile'] = profile
+            response.set_data(json.dumps(data))
+        return response
+    return wrapper
+
+def traced(view):
+    """Record ``view`` as one trace written to ``TRACE_DIR`` (Chrome trace event JSON)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not app.config['TRACE_DIR']:
+            return view(*args, **kwargs)
+        with trace(view.__name__, FileExporter(app.config['TRACE_DIR']),
+                   endpoint=request.path, method=request.method) as current:
+            response = app.make_response(view(*args, **kwargs))
+            current.attributes['status'] = response.status_code
+        response.headers['X-Trace-Id'] = current.id
+        return response
+    return wrapper
+
+def captured(view):
+    """Append the request, its stage timings and outcome to the capture log in ``CAPTURE_DIR``.
+
+    Requests slower than ``CAPTURE_SLOW_SECONDS`` and failed ones are
+    always captured, the rest with probability ``CAPTURE_SAMPLE_RATE``.
+    Routing runs under a recorded seed (or ``X-Routing-Seed``) so that a
+    capture replays to the same geometry.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not app.config['CAPTURE_DIR']:
+            return view(*args, **kwargs)
+        seed = request.headers.get('X-Routing-Seed', type=int)
+        if seed is None:
+            seed = secrets.randbits(32)
+        start = time.perf_counter()
+        with collect_timings() as timings, routing_seed(seed):
+            response = app.make_response(view(*args, **kwargs))
+        duration = time.perf_counter() - start
+
+        data = response.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        failed = response.status_code >= 400 or data.get('success') is False
+        log = CaptureLog(app.config['CAPTURE_DIR'], app.config['CAPTURE_SAMPLE_RATE'],
+                         app.config['CAPTURE_SLOW_SECONDS'])
+        reason = log.reason(duration, failed)
+        if reason:
+            capture_id = uuid.uuid4().hex[:16]
+            log.write({
+                'id': capture_id,
+                'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                'reason': reason,
+                'endpoint': view.__name__,
+                'method': request.method,
+                'path': request.path,
+                'body': normalize_payload(request.get_json(silent=True)),
+                'routing_seed': seed,
+                'status': response.status_code,
+                'success': not failed,
+                'error': data.get('error'),
+                'duration': round(duration, 4),
+                'timings': rounded(timings),
+            })
+            response.headers['X-Capture-Id'] = capture_id
+        return response
+    return wrapper
+
+def render_stl_artifact(scad_file: str, stl_name: str, keyboard: str, instances=None) -> bool:
+    """Render a SCAD file to STL plus its viewer mesh and record it.
+
+    Parts made only of switch cavities (``instances``) are assembled from
+    the pre-rendered cavity mesh when the cavities do not overlap, and
+    rendered from SCAD importing that mesh when they do, instead of a
+    full CSG render.
+    """
+    from libs.assembler import assemble_part_stl
+
+    stl_file = os.path.join(app.config['OUTPUT_DIR'], stl_name)
+    timeout = app.config['RENDER_TIMEOUT']
+    rendered = instances is not None and (
+        assemble_part_stl(instances, stl_file, timeout=timeout)
+        # Overlapping cavities: union imported cavity meshes instead of their CSG
+        or render_instances_stl(instances, stl_file, timeout=timeout)
+    )
+    if not rendered and not render_stl(scad_file, stl_file, timeout=timeout):
+        return False
+    write_viewer_mesh(stl_file, app.config['VIEWER_QUANTIZE_BITS'])
+    artifact_store().record(stl_name, keyboard=keyboard)
+    return True
+
+def render_preview_mesh(scad_file: str, scad_name: str) -> bool:
+    """Render the decimated preview mesh of a SCAD file next to it and record it.
+
+    The SCAD is rendered with a coarse $fn and simplified to
+    PREVIEW_TRIANGLE_BUDGET triangles, so it is ready long before the
+    print-resolution STL.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stl_file = os.path.join(tmp_dir, 'preview.stl')
+        if not render_stl(scad_file, stl_file,
+                          timeout=app.config['RENDER_TIMEOUT'],
+                          compress=False,
+                          defines={'$fn': app.config['PREVIEW_MESH_FN']}):
+            return False
+        write_viewer_mesh(stl_file,
+                          app.config['VIEWER_QUANTIZE_BITS'],
+                          mesh_path=scad_file + PREVIEW_MESH_SUFFIX,
+                          triangle_budget=app.config['PREVIEW_TRIANGLE_BUDGET'])
+    artifact_store().record(scad_name)
+    return True
+
+# Full-resolution renders left running by generate requests with ``renderAsync``
+_background_renders = set()
+_background_executor = None
+_background_lock = threading.Lock()
+# Markers of this process's renders that are queued or running
+_pending_markers = set()
+
+def render_in_background(stl_name: str, render, *args) -> None:
+    """Run ``render(*args)`` after the response, one render at a time per process.
+
+    ``<stl>.pending`` marks the STL until the render finishes, so that every
+    worker can tell a render in progress from a missing file. Each render
+    that starts refreshes the markers of this process's queued renders, so
+    only a marker orphaned by a dead worker outlives RENDER_TIMEOUT (see
+    ``render_pending``).
+    """
+    global _background_executor
+    marker = os.path.join(app.config['OUTPUT_DIR'], stl_name + PENDING_SUFFIX)
+    open(marker, 'w').close()
+
+    def run():
+        render_queue_depth.dec()
+        with _background_lock:
+            markers = list(_pending_markers)
+        for path in markers:
+            # Recreates a marker that was taken for stale while queued
+            with open(path, 'a'):
+                os.utime(path)
+        try:
+            render(*args)
+        except Exception:
+            app.logger.exception('Background render of %s failed', stl_name)
+        finally:
+            with _background_lock:
+                _pending_markers.discard(marker)
+            try:
+                os.remove(marker)
+            except FileNotFoundError:
+                pass
+
+    with _background_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='background-render')
+        render_queue_depth.inc()
+        _pending_markers.add(marker)
+        future = _background_executor.submit(run)
+    _background_renders.add(future)
+    future.add_done_callback(_background_renders.discard)
+
+def render_pending(stl_path: str) -> bool:
+    """Whether the STL at ``stl_path`` is still being rendered in the background.
+
+    A marker untouched for longer than RENDER_TIMEOUT was left by a worker
+    that died mid-render; it counts as a failed render and is removed, so
+    clients stop polling.
+    """
+    marker = stl_path + PENDING_SUFFIX
+    try:
+        age = time.time() - os.path.getmtime(marker)
+    except OSError:
+        return False
+    if age <= app.config['RENDER_TIMEOUT']:
+        return True
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+    return False
+
+def wait_for_background_renders(timeout=None) -> None:
+    """Block until the background renders started so far have finished."""
+    for future in list(_background_renders):
+        future.result(timeout)
+
+def pending_file_actions(stl_files: list) -> list:
+    """File actions for STL files still rendering: open the viewer on the preview mesh."""
+    return [{
+        'name': stl_file,
+        'type': 'stl',
+        'pending': True,
+        'download_url': f'/api/keyboard/download/{stl_file}',
+        'viewer_url': f'/api/keyboard/viewer/{stl_file}',
+        'preview_mesh_url': f"/api/keyboard/preview-mesh/{stl_file[:-len('.stl')]}.scad",
+        'action_label': 'View 3D'
+    } for stl_file in stl_files]
+
+def render_tiled_artifacts(instances, stl_name: str, keyboard: str,
+                           tile_size: float, mode: str, seam: float) -> list:
+    """Render a part as parallel spatial tiles and record the resulting STL files."""
+    stl_file = os.path.join(app.config['OUTPUT_DIR'], stl_name)
+    names = []
+    for path in render_tiled(instances, stl_file, tile_size, mode=mode, seam=seam,
+                             workers=app.config['RENDER_WORKERS'],
+                             timeout=app.config['RENDER_TIMEOUT']):
+        write_viewer_mesh(path, app.config['VIEWER_QUANTIZE_BITS'])
+        names.append(os.path.basename(path))
+        artifact_store().record(names[-1], keyboard=keyboard)
+    return names
+
 def generate_unique_keyboard_name(base_name: str = "keyboard") -> str:
     """Generate a unique keyboard name with timestamp."""
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -57,17 +343,27 @@ def health_check():
     """Health check endpoint for Docker."""
     return jsonify({
         'status': 'healthy',
-        'openscad_available': subprocess.run(['which', 'openscad'], capture_output=True).returncode == 0
+        'openscad_available': openscad_available()
     })
 
+@app.route('/metrics')
+def metrics():
+    """Pipeline stage timings, cache hit ratios and render outcomes in Prometheus format."""
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/keyboard/preview', methods=['POST'])
+@traced
+@captured
+@profiled
 def preview_keyboard():
     """Generate 2D preview of keyboard layout."""
     try:
-        config = request.get_json()
+        with span('parse_request'):
+            config = request.get_json()
         
         # Create a simplified layout for preview
-        layout_data = generate_layout_data(config)
+        with stage('layout'):
+            layout_data = generate_layout_data(config)
         
         return jsonify({
             'success': True,
@@ -81,63 +377,59 @@ def preview_keyboard():
         }), 400
 
 @app.route('/api/keyboard/generate', methods=['POST'])
+@traced
+@captured
+@profiled
 def generate_keyboard():
     """Generate 3D model files (SCAD and STL)."""
+    from libs import printboard as kb
+
     try:
-        config = request.get_json()
+        with span('parse_request'):
+            config = request.get_json()
+            # Answer with preview meshes and render the full STLs afterwards
+            render_async = bool(config.get('renderAsync')) and openscad_available()
         
         # Build keyboard configuration
-        layout = build_keyboard_config(config)
-        
-        # Generate SCAD file
-        parts = kb.create_keyboard(layout)
-        scad_files = []
-        stl_files = []
+        with span('build_config'):
+            layout = build_keyboard_config(config)
         
-        for part in parts:
-            # Generate SCAD
-            filename = f"{layout['name']}_{part['name']}"
-            scad_file = os.path.join(app.config['OUTPUT_DIR'], f'{filename}.scad')
-            scad_render_to_file(part['shape'], scad_file, file_header='$fn = 50;')
-            scad_files.append(f'{filename}.scad')
+        with collect_timings() as timings:
+            # Generate SCAD file
+            parts = kb.create_keyboard(layout)
+            scad_files = []
+            stl_files = []
+            pending_files = []
+            store = artifact_store()
             
-            # Generate STL if OpenSCAD is available
-            stl_file = os.path.join(app.config['OUTPUT_DIR'], f'{filename}.stl')
-            try:
-                # Use Xvfb for headless OpenSCAD rendering in Docker
-                result = subprocess.run([
-                    'xvfb-run', '-a', 'openscad', 
-                    '-o', stl_file, 
-                    scad_file
-                ], check=True, capture_output=True, text=True, timeout=60)
-                
-                # Verify STL file was created and has content
-                if os.path.exists(stl_file) and os.path.getsize(stl_file) > 0:
-                    stl_files.append(f'{filename}.stl')
-                    print(f"Successfully generated STL: {filename}.stl")
-                else:
-                    print(f"STL generation failed for {filename}: file not created or empty")
+            for part in parts:
+                # Generate SCAD
+                filename = f"{layout['name']}_{part['name']}"
+                scad_file = os.path.join(app.config['OUTPUT_DIR'], f'{filename}.scad')
+                with span('part_files', part=part['name']):
+                    write_scad(part['shape'], scad_file, file_header='$fn = 50;',
+                               quantize_step=app.config['SCAD_QUANTIZE_STEP'])
+                    scad_files.append(f'{filename}.scad')
+                    store.record(f'{filename}.scad', keyboard=layout['name'])
                     
-            except subprocess.TimeoutExpired:
-                print(f"STL generation timed out for {filename}")
-            except subprocess.CalledProcessError as e:
-                print(f"OpenSCAD error for {filename}: {e.stderr}")
-            except FileNotFoundError:
-                print("OpenSCAD not found - STL generation skipped")
-                # Fall back to trying without xvfb
-                try:
-                    subprocess.run([
-                        'openscad', '-o', stl_file, scad_file
-                    ], check=True, capture_output=True, timeout=60)
-                    if os.path.exists(stl_file) and os.path.getsize(stl_file) > 0:
+                    # Generate STL if OpenSCAD is available
+                    if render_async:
+                        render_preview_mesh(scad_file, f'{filename}.scad')
+                        render_in_background(f'{filename}.stl', render_stl_artifact,
+                                             scad_file, f'{filename}.stl', layout['name'])
+                        pending_files.append(f'{filename}.stl')
+                    elif render_stl_artifact(scad_file, f'{filename}.stl', layout['name']):
                         stl_files.append(f'{filename}.stl')
-                except Exception:
-                    pass
+        
+        # Keep the output directory under its disk quota
+        store.evict(protect=scad_files + stl_files + pending_files)
         
         # Generate success message with details
         success_msg = f'Generated {len(scad_files)} SCAD files'
         if stl_files:
             success_msg += f' and {len(stl_files)} STL files successfully'
+        elif pending_files:
+            success_msg += f', rendering {len(pending_files)} STL files'
         else:
             success_msg += ' (STL generation requires OpenSCAD)'
         
@@ -148,6 +440,7 @@ def generate_keyboard():
                 'name': scad_file,
                 'type': 'scad',
                 'download_url': f'/api/keyboard/download/{scad_file}',
+                'preview_mesh_url': f'/api/keyboard/preview-mesh/{scad_file}',
                 'action_label': 'Download SCAD'
             })
         for stl_file in stl_files:
@@ -157,14 +450,17 @@ def generate_keyboard():
                 'download_url': f'/api/keyboard/download/{stl_file}',
                 'action_label': 'Open STL'
             })
+        files_with_actions += pending_file_actions(pending_files)
         
         return jsonify({
             'success': True,
             'scad_files': scad_files,
             'stl_files': stl_files,
+            'pending_stl_files': pending_files,
             'files_with_actions': files_with_actions,
             'keyboard_name': layout['name'],
-            'message': success_msg
+            'message': success_msg,
+            'timings': rounded(timings)
         })
         
     except Exception as e:
@@ -175,16 +471,127 @@ def generate_keyboard():
 
 @app.route('/api/keyboard/download/<filename>')
 def download_file(filename):
-    """Download generated files."""
+    """Download generated files.
+    
+    Generated files are never rewritten (every keyboard gets a unique name),
+    so responses carry ETag/Last-Modified validators, honour Range requests
+    and are cacheable as immutable. With ARTIFACT_OFFLOAD set, the body is
+    handed to the front proxy instead of being streamed by the worker.
+    STL files have a precompressed .gz copy that is sent with
+    Content-Encoding: gzip when the client accepts it. While an STL is
+    still rendering in the background the answer is 202.
+    """
     try:
-        file_path = os.path.join(app.config['OUTPUT_DIR'], filename)
-        if os.path.exists(file_path) and filename.endswith(('.scad', '.stl')):
-            return send_file(file_path, as_attachment=True)
+        file_path = safe_join(app.config['OUTPUT_DIR'], filename)
+        if file_path and filename.endswith('.stl') and render_pending(file_path):
+            return jsonify({'pending': True}), 202, {'Retry-After': '1'}
+        if file_path and os.path.exists(file_path) and filename.endswith(('.scad', '.stl')):
+            artifact_store().touch(filename)
+            
+            if app.config['ARTIFACT_OFFLOAD'] == 'x-accel':
+                # nginx serves the file (with its own Range/conditional handling)
+                # from an internal location mapped onto OUTPUT_DIR
+                response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+                response.headers['X-Accel-Redirect'] = f"{app.config['ARTIFACT_ACCEL_PREFIX'].rstrip('/')}/{filename}"
+                response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            else:
+                # Serve the precompressed copy to clients that accept gzip
+                compressed_path = file_path + COMPRESSED_SUFFIX
+                use_compressed = ('gzip' in request.accept_encodings
+                                  and os.path.exists(compressed_path))
+                
+                # 'x-sendfile' is handled by send_file through USE_X_SENDFILE
+                response = send_file(
+                    compressed_path if use_compressed else file_path,
+                    as_attachment=True,
+                    download_name=filename,
+                    conditional=True,
+                    etag=True,
+                    max_age=app.config['ARTIFACT_MAX_AGE']
+                )
+                if use_compressed:
+                    response.headers['Content-Encoding'] = 'gzip'
+                if os.path.exists(compressed_path):
+                    response.vary.add('Accept-Encoding')
+            response.headers['Cache-Control'] = f"public, max-age={app.config['ARTIFACT_MAX_AGE']}, immutable"
+            return response
         else:
+            artifact_store().remove(filename)
             return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/keyboard/viewer/<filename>')
+def viewer_mesh(filename):
+    """Indexed mesh of a generated STL for the web viewer.
+
+    Meshes are written next to the STL when it is rendered; STL files from
+    before the viewer format existed are converted on first request. While
+    the STL is still rendering in the background the answer is 202 and
+    the viewer polls.
+    """
+    try:
+        file_path = safe_join(app.config['OUTPUT_DIR'], filename)
+        if file_path and filename.endswith('.stl') and render_pending(file_path):
+            return jsonify({'pending': True}), 202, {'Retry-After': '1'}
+        if not (file_path and filename.endswith('.stl') and os.path.exists(file_path)):
+            return jsonify({'error': 'File not found'}), 404
+
+        mesh_path = file_path + VIEWER_SUFFIX
+        record_cache('viewer_mesh', os.path.exists(mesh_path))
+        if not os.path.exists(mesh_path):
+            write_viewer_mesh(file_path, app.config['VIEWER_QUANTIZE_BITS'])
+            artifact_store().record(filename)
+
+        response = send_file(
+            mesh_path,
+            mimetype='application/octet-stream',
+            conditional=True,
+            etag=True,
+            max_age=app.config['ARTIFACT_MAX_AGE']
+        )
+        response.headers['Cache-Control'] = f"public, max-age={app.config['ARTIFACT_MAX_AGE']}, immutable"
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/keyboard/preview-mesh/<filename>')
+def preview_mesh(filename):
+    """Decimated mesh of a generated SCAD file for an instant 3D view.
+
+    Generate requests with ``renderAsync`` write it before the full render
+    starts. Otherwise it is rendered on first request, unless the
+    print-resolution STL already exists: a coarse render would then only
+    delay the full mesh, so the answer is 409.
+    """
+    try:
+        file_path = safe_join(app.config['OUTPUT_DIR'], filename)
+        if not (file_path and filename.endswith('.scad') and os.path.exists(file_path)):
+            return jsonify({'error': 'File not found'}), 404
+
+        mesh_path = file_path + PREVIEW_MESH_SUFFIX
+        record_cache('preview_mesh', os.path.exists(mesh_path))
+        if not os.path.exists(mesh_path):
+            stl_path = file_path[:-len('.scad')] + '.stl'
+            if os.path.exists(stl_path) and not render_pending(stl_path):
+                stl_name = os.path.basename(stl_path)
+                return jsonify({'error': 'Full-resolution mesh available',
+                                'viewer_url': f'/api/keyboard/viewer/{stl_name}'}), 409
+            if not render_preview_mesh(file_path, filename):
+                return jsonify({'error': 'Preview mesh rendering requires OpenSCAD'}), 503
+
+        response = send_file(
+            mesh_path,
+            mimetype='application/octet-stream',
+            conditional=True,
+            etag=True,
+            max_age=app.config['ARTIFACT_MAX_AGE']
+        )
+        response.headers['Cache-Control'] = f"public, max-age={app.config['ARTIFACT_MAX_AGE']}, immutable"
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/keyboard/presets')
 def get_presets():
     """Get available keyboard layout presets."""
@@ -227,16 +634,22 @@ def get_presets():
 # V2 API Endpoints
 
 @app.route('/api/v2/keyboard/preview', methods=['POST'])
+@traced
+@captured
+@profiled
 def preview_keyboard_v2():
     """Generate 2D preview using V2 API."""
     try:
-        request_data = request.get_json()
+        with span('parse_request'):
+            request_data = request.get_json()
         
         # Create configuration using V2 API
-        config = keyboard_builder.create_config_from_web_request(request_data)
+        with span('build_config'):
+            config = keyboard_builder.create_config_from_web_request(request_data)
         
         # Generate preview
-        layout_data = keyboard_builder.generate_preview(config)
+        with stage('layout'):
+            layout_data = keyboard_builder.generate_preview(config)
         
         return jsonify({
             'success': True,
@@ -251,66 +664,158 @@ def preview_keyboard_v2():
             'api_version': '2.0'
         }), 400
 
-@app.route('/api/v2/keyboard/generate', methods=['POST'])  
+@app.route('/api/v2/keyboard/preview/batch', methods=['POST'])
+def preview_keyboard_batch_v2():
+    """Generate 2D previews for many configurations in one request.
+
+    Expects ``{"configs": [...], "switchType": ..., "format": "json"|"binary"}``.
+    The binary format returns little-endian float32 ``(x, y, angle)`` triples
+    for every key, config after config in row-major order; the per-config
+    ``rows x cols`` shapes are listed in the ``X-Batch-Shapes`` header.
+    """
+    try:
+        request_data = request.get_json()
+        configs = request_data.get('configs') or []
+        if not configs:
+            raise ValueError("configs must be a non-empty list")
+        if len(configs) > app.config['PREVIEW_BATCH_LIMIT']:
+            raise ValueError(f"At most {app.config['PREVIEW_BATCH_LIMIT']} configs per batch")
+
+        matrix_configs = []
+        for index, config in enumerate(configs):
+            try:
+                matrix_configs.append(keyboard_builder.create_matrix_config_from_web_request(config))
+            except ValueError as e:
+                raise ValueError(f"configs[{index}]: {e}")
+
+        switch_type = request_data.get('switchType', 'gamdias_lp')
+
+        if request_data.get('format', 'json') == 'binary':
+            switch = keyboard_builder.switch_registry.get(switch_type)
+            grids = LayoutPlanner(switch).plan_matrices_batch(matrix_configs)
+            payload = b''.join(grid.astype('<f4').tobytes() for grid in grids)
+            response = app.response_class(payload, mimetype='application/octet-stream')
+            response.headers['X-Batch-Shapes'] = ','.join(f'{m.rows}x{m.cols}' for m in matrix_configs)
+            response.headers['X-Array-Dtype'] = 'float32'
+            response.headers['X-Key-Size'] = str(switch.specs.key_size[0])
+            return response
+
+        layouts = keyboard_builder.generate_preview_batch(matrix_configs, switch_type)
+
+        return jsonify({
+            'success': True,
+            'layouts': layouts,
+            'count': len(layouts),
+            'message': f'V2 Batch preview generated for {len(layouts)} configs',
+            'api_version': '2.0'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'api_version': '2.0'
+        }), 400
+
+@app.route('/api/v2/keyboard/scene', methods=['POST'])
+def scene_keyboard_v2():
+    """Instanced 3D scene: the switch cavity mesh once, per-key transforms and tubes.
+
+    Takes the same request body as the preview endpoint. Pass
+    ``"includeCavity": false`` when the client already has the cavity mesh.
+    """
+    try:
+        request_data = request.get_json()
+        config = keyboard_builder.create_config_from_web_request(request_data)
+        scene = build_scene(config, include_cavity=request_data.get('includeCavity', True))
+        
+        return jsonify({
+            'success': True,
+            'scene': scene,
+            'message': f"V2 Scene generated with {scene['instances']['count']} key instances",
+            'api_version': '2.0'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'api_version': '2.0'
+        }), 400
+
+@app.route('/api/v2/keyboard/generate', methods=['POST'])
+@traced
+@captured
+@profiled
 def generate_keyboard_v2():
     """Generate 3D model using V2 API."""
     try:
-        request_data = request.get_json()
+        with span('parse_request'):
+            request_data = request.get_json()
         
         # Create configuration using V2 API
-        config = keyboard_builder.create_config_from_web_request(request_data)
+        with span('build_config'):
+            config = keyboard_builder.create_config_from_web_request(request_data)
         
-        # Build keyboard
-        result = keyboard_builder.build_keyboard(config)
+        # Optional spatial tiling for large boards
+        tile_size = float(request_data.get('tileSize') or app.config['RENDER_TILE_SIZE'])
+        tile_mode = request_data.get('tileMode', 'merge')
+        tile_seam = float(request_data.get('tileSeam', app.config['RENDER_TILE_SEAM']))
+        if tile_mode not in TILE_MODES:
+            raise ValueError(f"tileMode must be one of {', '.join(TILE_MODES)}")
+        # Answer with preview meshes and render the full STLs afterwards; tile
+        # pieces have no single STL to view, so they are rendered right away
+        render_async = (bool(request_data.get('renderAsync')) and openscad_available()
+                        and not (tile_size and tile_mode == 'pieces'))
         
-        # Generate files (same file generation as V1 for compatibility)
-        scad_files = []
-        stl_files = []
-        
-        for part in result.parts:
-            # Generate SCAD
-            filename = f"{config.name}_{part.name}"
-            scad_file = os.path.join(app.config['OUTPUT_DIR'], f'{filename}.scad')
-            scad_render_to_file(part.shape, scad_file, file_header='$fn = 50;')
-            scad_files.append(f'{filename}.scad')
+        with collect_timings() as timings:
+            # Build keyboard
+            result = keyboard_builder.build_keyboard(config)
             
-            # Generate STL if OpenSCAD is available
-            stl_file = os.path.join(app.config['OUTPUT_DIR'], f'{filename}.stl')
-            try:
-                # Use Xvfb for headless OpenSCAD rendering in Docker
-                subprocess_result = subprocess.run([
-                    'xvfb-run', '-a', 'openscad', 
-                    '-o', stl_file, 
-                    scad_file
-                ], check=True, capture_output=True, text=True, timeout=60)
-                
-                # Verify STL file was created and has content
-                if os.path.exists(stl_file) and os.path.getsize(stl_file) > 0:
-                    stl_files.append(f'{filename}.stl')
-                    print(f"Successfully generated STL: {filename}.stl")
-                else:
-                    print(f"STL generation failed for {filename}: file not created or empty")
+            # Generate files (same file generation as V1 for compatibility)
+            scad_files = []
+            stl_files = []
+            pending_files = []
+            scad_stats = {}
+            
+            store = artifact_store()
+            
+            for part in result.parts:
+                # Generate SCAD
+                filename = f"{config.name}_{part.name}"
+                scad_file = os.path.join(app.config['OUTPUT_DIR'], f'{filename}.scad')
+                with span('part_files', part=part.name):
+                    stats = write_scad(part.shape, scad_file, file_header='$fn = 50;',
+                                       quantize_step=app.config['SCAD_QUANTIZE_STEP'])
+                    scad_files.append(f'{filename}.scad')
+                    scad_stats[f'{filename}.scad'] = stats.to_dict()
+                    store.record(f'{filename}.scad', keyboard=config.name)
                     
-            except subprocess.TimeoutExpired:
-                print(f"STL generation timed out for {filename}")
-            except subprocess.CalledProcessError as e:
-                print(f"OpenSCAD error for {filename}: {e.stderr}")
-            except FileNotFoundError:
-                print("OpenSCAD not found - STL generation skipped")
-                # Fall back to trying without xvfb
-                try:
-                    subprocess.run([
-                        'openscad', '-o', stl_file, scad_file
-                    ], check=True, capture_output=True, timeout=60)
-                    if os.path.exists(stl_file) and os.path.getsize(stl_file) > 0:
+                    # Generate STL if OpenSCAD is available
+                    if render_async:
+                        render_preview_mesh(scad_file, f'{filename}.scad')
+                        if tile_size and part.instances is not None:
+                            render_in_background(f'{filename}.stl', render_tiled_artifacts, part.instances,
+                                                 f'{filename}.stl', config.name, tile_size, tile_mode, tile_seam)
+                        else:
+                            render_in_background(f'{filename}.stl', render_stl_artifact, scad_file,
+                                                 f'{filename}.stl', config.name, part.instances)
+                        pending_files.append(f'{filename}.stl')
+                    elif tile_size and part.instances is not None:
+                        stl_files += render_tiled_artifacts(part.instances, f'{filename}.stl', config.name,
+                                                            tile_size, tile_mode, tile_seam)
+                    elif render_stl_artifact(scad_file, f'{filename}.stl', config.name, part.instances):
                         stl_files.append(f'{filename}.stl')
-                except Exception:
-                    pass
+        
+        result.metadata['timings'] = rounded(timings)
+        
+        # Keep the output directory under its disk quota
+        store.evict(protect=scad_files + stl_files + pending_files)
         
         # Generate success message with details
         success_msg = f'V2 API: Generated {len(scad_files)} SCAD files'
         if stl_files:
             success_msg += f' and {len(stl_files)} STL files successfully'
+        elif pending_files:
+            success_msg += f', rendering {len(pending_files)} STL files'
         else:
             success_msg += ' (STL generation requires OpenSCAD)'
         
@@ -321,6 +826,7 @@ def generate_keyboard_v2():
                 'name': scad_file,
                 'type': 'scad',
                 'download_url': f'/api/keyboard/download/{scad_file}',
+                'preview_mesh_url': f'/api/keyboard/preview-mesh/{scad_file}',
                 'action_label': 'Download SCAD'
             })
         for stl_file in stl_files:
@@ -330,12 +836,15 @@ def generate_keyboard_v2():
                 'download_url': f'/api/keyboard/download/{stl_file}',
                 'action_label': 'Open STL'
             })
+        files_with_actions += pending_file_actions(pending_files)
         
         return jsonify({
             'success': True,
             'scad_files': scad_files,
             'stl_files': stl_files,
+            'pending_stl_files': pending_files,
             'files_with_actions': files_with_actions,
+            'scad_stats': scad_stats,
             'keyboard_name': config.name,
             'message': success_msg,
             'api_version': '2.0',
@@ -427,25 +936,38 @@ def create_simple_keyboard_v2():
 
 @app.route('/api/keyboard/files')
 def list_files():
-    """List available generated files."""
+    """List available generated files.
+    
+    Supports ``page``/``per_page`` pagination and ``type``, ``q`` (name
+    substring) and ``keyboard`` filters; newest files come first.
+    """
     try:
-        files = []
-        output_dir = app.config['OUTPUT_DIR']
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 100, type=int), 1000)
+        entries, total = artifact_store().list(
+            page=page,
+            per_page=per_page,
+            file_type=request.args.get('type'),
+            query=request.args.get('q'),
+            keyboard=request.args.get('keyboard')
+        )
         
-        for filename in os.listdir(output_dir):
-            if filename.endswith(('.scad', '.stl')):
-                file_path = os.path.join(output_dir, filename)
-                file_info = {
-                    'name': filename,
-                    'size': os.path.getsize(file_path),
-                    'type': filename.split('.')[-1].upper(),
-                    'created': os.path.getctime(file_path)
-                }
-                files.append(file_info)
+        files = []
+        for entry in entries:
+            files.append({
+                'name': entry['name'],
+                'size': entry['size'],
+                'type': entry['type'].upper(),
+                'created': entry['created'],
+                'keyboard': entry['keyboard']
+            })
         
         return jsonify({
             'success': True,
-            'files': files
+            'files': files,
+            'total': total,
+            'page': page,
+            'per_page': per_page
         })
     except Exception as e:
         return jsonify({
@@ -455,63 +977,36 @@ def list_files():
 
 def generate_layout_data(config):
     """Generate 2D layout data for preview with staggering and angles."""
-    import math
-    
     rows = config.get('rows', 5)
     cols = config.get('cols', 5)
     switch_size = 18.5  # Standard key size
     
-    # Get advanced parameters
-    rows_stagger = config.get('rowsStagger', [])
-    columns_stagger = config.get('columnsStagger', [])
-    rows_angle = config.get('rowsAngle', [])
-    columns_angle = config.get('columnsAngle', [])
-    rotation_angle = config.get('rotationAngle', 0)
-    matrix_offset_x = config.get('matrixOffsetX', 0)
-    matrix_offset_y = config.get('matrixOffsetY', 0)
+    # Place keys with the same kernel the 3D model uses
+    placement = place_keys(
+        np.full((rows, cols), switch_size),
+        np.full((rows, cols), switch_size),
+        offset=(config.get('matrixOffsetX', 0), config.get('matrixOffsetY', 0)),
+        rows_stagger=config.get('rowsStagger') or None,
+        columns_stagger=config.get('columnsStagger') or None,
+        rows_angle=config.get('rowsAngle') or None,
+        columns_angle=config.get('columnsAngle') or None,
+        rotation_angle=config.get('rotationAngle', 0),
+        padding_keys=config.get('paddingKeys') or None
+    )
+    xs = placement.corner_x.tolist()
+    ys = placement.corner_y.tolist()
+    angles = placement.angle.tolist()
     
     layout = []
     for row in range(rows):
         row_data = []
         for col in range(cols):
-            # Base position
-            x = col * switch_size
-            y = row * switch_size
-            
-            # Apply row staggering
-            if rows_stagger and row < len(rows_stagger):
-                x -= rows_stagger[row]
-            
-            # Apply column staggering  
-            if columns_stagger and col < len(columns_stagger):
-                y -= columns_stagger[col]
-            
-            # Calculate individual key angle
-            key_angle = 0
-            if rows_angle and row < len(rows_angle):
-                key_angle += rows_angle[row]
-            if columns_angle and col < len(columns_angle):
-                key_angle += columns_angle[col]
-            
-            # Apply matrix rotation
-            if rotation_angle != 0:
-                angle_rad = math.radians(rotation_angle)
-                cos_a = math.cos(angle_rad)
-                sin_a = math.sin(angle_rad)
-                new_x = x * cos_a - y * sin_a
-                new_y = x * sin_a + y * cos_a
-                x, y = new_x, new_y
-            
-            # Apply matrix offset
-            x += matrix_offset_x
-            y += matrix_offset_y
-            
             key = {
-                'x': x,
-                'y': y,
+                'x': xs[row][col],
+                'y': ys[row][col],
                 'width': switch_size,
                 'height': switch_size,
-                'angle': key_angle,
+                'angle': angles[row][col],
                 'label': f'R{row}C{col}'
             }
             row_data.append(key)
@@ -521,6 +1016,11 @@ def generate_layout_data(config):
 
 def build_keyboard_config(config):
     """Build keyboard configuration from user input."""
+    from libs import printboard as kb
+    from libs.switches import gamdias_lp as switch
+    from libs.controllers import tinys2 as controller
+    from libs.layouts import add_unit_switches
+
     rows = config.get('rows', 5)
     cols = config.get('cols', 5)
     base_name = config.get('name', 'custom_keyboard')
@@ -573,14 +1073,7 @@ def build_keyboard_config(config):
     }
     
     # Add variable key sizes
-    for i in range(0, 7):
-        for num in [0, 0.25, 0.5, 0.75]:
-            total_i = i + num
-            if int(total_i) == total_i:
-                total_i = int(total_i)
-            layout[f"{total_i}u"] = kb.empty_sw(switch, body=switch.switch_body, pins=switch.pins, x=18.5*total_i)
-    
-    return layout
+    return add_unit_switches(layout, switch)
 
 if __name__ == '__main__':
     import sys
@@ -0,0 +1 @@
+"""Benchmarks for the keyboard generation pipeline; see ``benchmarks.suite``."""
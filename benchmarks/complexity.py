@@ -0,0 +1,192 @@
+"""
+Geometry complexity tracker for generated artifacts
+
+    python -m benchmarks.complexity                  # compare with complexity_baseline.json
+    python -m benchmarks.complexity --save-baseline  # accept the current numbers
+
+Render time follows the size of the geometry more than the speed of the
+Python that builds it, so this tool tracks the geometry itself. It builds
+every preset served by ``/api/keyboard/presets`` and the layouts of
+``generate.py`` (its 5x5 prototype and the 65% layout) through V1 and V2.
+For each part it records:
+
+- ``scad_bytes``: size of the emitted SCAD, without the header
+- ``nodes`` and ``emitted_nodes``: tree nodes before and after dedup
+- ``depth``: depth of the folded tree
+- ``tube_points``: routed tube points of the whole V1 board, under ``<layout>/v1/routing``
+- ``stl_triangles``: facets of the rendered STL, only when OpenSCAD is available
+
+V1 routing runs with a fixed seed, so every number is deterministic. A
+metric that grows by more than ``--tolerance`` (a fraction) over the
+checked-in baseline fails the run with exit status 1. Metrics missing on
+either side, such as triangles on a machine without OpenSCAD, are not
+compared.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import struct
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.suite import SIZES, v1_layout, v2_config
+from libs import printboard as kb
+from libs.printboard_v2.builder import keyboard_builder
+from libs.printboard_v2.scad import fold_transforms, render_scad, tree_depth
+from libs.printboard_v2.tracing import trace
+from libs.render import openscad_available, render_stl
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'complexity_baseline.json')
+ROUTING_SEED = 0
+
+# generate.py's layouts: the prototype it builds and the 65% layout it defines
+GENERATE_LAYOUTS = {'prototype': '5x5', 'sixty_five_percent': '65%'}
+
+
+def presets() -> Dict[str, Dict[str, Any]]:
+    """The presets exactly as ``/api/keyboard/presets`` serves them."""
+    from app import app
+    with app.test_client() as client:
+        return client.get('/api/keyboard/presets').get_json()['presets']
+
+
+def layouts() -> Iterator[Tuple[str, Dict[str, Any], Any]]:
+    """``(name, V1 layout, V2 config)`` for every preset and ``generate.py`` layout."""
+    from app import build_keyboard_config
+    for name, preset in presets().items():
+        request = {'name': name, 'rows': preset['rows'], 'cols': preset['cols']}
+        yield name, build_keyboard_config(request), keyboard_builder.create_config_from_web_request(request)
+    for name, size in GENERATE_LAYOUTS.items():
+        yield name, v1_layout(SIZES[size]), v2_config(SIZES[size])
+
+
+def stl_triangles(shape) -> Optional[int]:
+    with tempfile.TemporaryDirectory(prefix='printboard-complexity-') as directory:
+        scad_file = os.path.join(directory, 'part.scad')
+        stl_file = os.path.join(directory, 'part.stl')
+        source, _ = render_scad(shape, '$fn = 50;')
+        with open(scad_file, 'w') as f:
+            f.write(source)
+        if not render_stl(scad_file, stl_file, compress=False):
+            return None
+        with open(stl_file, 'rb') as f:
+            f.seek(80)
+            return struct.unpack('<I', f.read(4))[0]
+
+
+def part_metrics(shape, render: bool) -> Dict[str, int]:
+    source, stats = render_scad(shape)
+    metrics = {
+        'scad_bytes': len(source.encode()),
+        'nodes': stats.nodes,
+        'emitted_nodes': stats.emitted_nodes,
+        'depth': tree_depth(fold_transforms(shape)),
+    }
+    if render:
+        triangles = stl_triangles(shape)
+        if triangles is not None:
+            metrics['stl_triangles'] = triangles
+    return metrics
+
+
+def measure(names: Optional[List[str]] = None, render: bool = False, log=None) -> Dict[str, Dict[str, int]]:
+    """``{'<layout>/<v1|v2>/<part>': metrics}`` for the selected layouts."""
+    results = {}
+    for name, layout, config in layouts():
+        if names and name not in names:
+            continue
+        with trace('complexity') as current, kb.routing_seed(ROUTING_SEED):
+            v1_parts = kb.create_keyboard(layout)
+        # Routing covers the whole board, so its size is recorded once per layout
+        results[f'{name}/v1/routing'] = {
+            'tube_points': sum(event['args'].get('tube_points', 0) for event in current.events
+                               if event['name'] == 'routing')
+        }
+        for part in v1_parts:
+            results[f"{name}/v1/{part['name']}"] = part_metrics(part['shape'], render)
+        for part in keyboard_builder.build_keyboard(config).parts:
+            results[f'{name}/v2/{part.name}'] = part_metrics(part.shape, render)
+        if log:
+            log(f'measured {name}')
+    return results
+
+
+def compare(results: Dict[str, Dict[str, int]], baseline: Dict[str, Dict[str, int]],
+            tolerance: float = 0.05) -> List[Dict[str, Any]]:
+    """Every metric that changed against ``baseline``; ``grew`` marks growth beyond ``tolerance``."""
+    changes = []
+    for key, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(key, {}).get(metric)
+            if before is None or value == before:
+                continue
+            changes.append({
+                'part': key,
+                'metric': metric,
+                'baseline': before,
+                'current': value,
+                'change': (value - before) / before if before else float('inf'),
+                'grew': value > before * (1 + tolerance),
+            })
+    return changes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--layouts', help='comma-separated preset or generate.py layout names')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline file (default benchmarks/complexity_baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='allowed growth as a fraction of the baseline (default 0.05)')
+    parser.add_argument('--no-render', action='store_true', help='skip STL triangle counts even with OpenSCAD')
+    parser.add_argument('--output', help='also write the measurements to this file')
+    parser.add_argument('--save-baseline', action='store_true', help='write the measurements to the baseline file')
+    args = parser.parse_args(argv)
+
+    render = not args.no_render and openscad_available()
+    log = lambda line: print(line, file=sys.stderr, flush=True)
+    results = measure(args.layouts.split(',') if args.layouts else None, render, log)
+    document = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'routing_seed': ROUTING_SEED,
+        'rendered': render,
+        'parts': results,
+    }
+    targets = [args.output] if args.output else []
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                document['parts'] = dict(json.load(f)['parts'], **results)
+        targets.append(args.baseline)
+    for path in targets:
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.save_baseline:
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['parts']
+    missing = sorted(set(results) - set(baseline))
+    changes = compare(results, baseline, args.tolerance)
+    for change in changes:
+        flag = '  GREW' if change['grew'] else ''
+        print(f"{change['part']:<44} {change['metric']:<14} {change['baseline']:>10} -> {change['current']:>10} "
+              f"({change['change']:+.1%}){flag}")
+    for key in missing:
+        print(f'{key}: not in the baseline')
+    grown = [change for change in changes if change['grew']]
+    if grown:
+        print(f'{len(grown)} metrics grew by more than {args.tolerance:.0%}')
+        return 1
+    print(f'{len(results)} parts within {args.tolerance:.0%} of the baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
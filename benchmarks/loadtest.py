@@ -0,0 +1,400 @@
+"""
+HTTP load test replaying a JSONL corpus of requests
+
+    python -m benchmarks.loadtest --server gunicorn --workers 4 --concurrency 8 --duration 30
+    python -m benchmarks.loadtest --rate 5 --duration 60 --output report.json
+    python -m benchmarks.loadtest --url http://staging:5000 --corpus my_corpus.jsonl
+
+Starts the app on a free local port (``--server werkzeug`` or
+``gunicorn`` with ``--workers``/``--threads``), or targets ``--url``, and
+replays the corpus in order, round-robin. Each line of the corpus is
+``{"method": "POST", "path": "/api/v2/keyboard/preview", "body": {...}}``.
+A path may name ``{scad}`` or ``{stl}``, which is filled with a file an
+earlier generate response in the run produced; until one exists the entry
+is skipped.
+
+``--concurrency N`` keeps N requests in flight (closed loop). ``--rate R``
+sends R requests per second whatever the latency (open loop, at most
+``--concurrency`` in flight), and latency is measured from the scheduled
+send time so a stalled server shows up in the percentiles.
+
+Without OpenSCAD (``--render auto``) or with ``--render stub`` the server
+runs with ``benchmarks/stub_openscad.py`` first on its PATH. A started
+server writes into a temporary ``OUTPUT_DIR``, so the load test leaves
+``output/`` and its cavity library alone.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_CORPUS = os.path.join(BENCHMARK_DIR, 'corpus.jsonl')
+STUB_OPENSCAD = os.path.join(BENCHMARK_DIR, 'stub_openscad.py')
+SERVERS = ('werkzeug', 'gunicorn')
+
+
+@dataclass
+class Entry:
+    """One corpus request; ``path`` may hold ``{scad}``/``{stl}`` placeholders."""
+    method: str
+    path: str
+    body: Any = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.method} {self.path.split('?', 1)[0]}"
+
+
+def load_corpus(path: str) -> List[Entry]:
+    entries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                entries.append(Entry(data.get('method', 'GET').upper(), data['path'],
+                                     data.get('body'), data.get('headers', {})))
+            except (ValueError, KeyError) as e:
+                raise ValueError(f'{path}:{number}: invalid corpus entry: {e}')
+    if not entries:
+        raise ValueError(f'{path}: corpus is empty')
+    return entries
+
+
+class GeneratedFiles:
+    """Most recent SCAD and STL files named by generate responses during the run."""
+
+    def __init__(self, keep: int = 50):
+        self._files = {'scad': [], 'stl': []}
+        self._keep = keep
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def add(self, response: Dict[str, Any]) -> None:
+        with self._lock:
+            for kind in self._files:
+                names = self._files[kind] + list(response.get(f'{kind}_files') or [])
+                self._files[kind] = names[-self._keep:]
+
+    def fill(self, path: str) -> Optional[str]:
+        """``path`` with its placeholders filled, or None while no such file exists."""
+        with self._lock:
+            values = {}
+            for kind, names in self._files.items():
+                if '{' + kind + '}' in path:
+                    if not names:
+                        return None
+                    values[kind] = urllib.parse.quote(names[next(self._turn) % len(names)])
+        return path.format(**values) if values else path
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: int
+    latency: float
+    error: Optional[str] = None
+
+
+class Client:
+    """Keep-alive HTTP connections, one per thread."""
+
+    def __init__(self, base_url: str, timeout: float):
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.prefix = url.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Any = None,
+                headers: Optional[Dict[str, str]] = None):
+        payload = None
+        headers = dict(headers or {})
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers.setdefault('Content-Type', 'application/json')
+        for attempt in (1, 2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, self.prefix + path, payload, headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self._local.connection = None
+                # A keep-alive connection the server closed fails on reuse; retry once
+                if attempt == 2:
+                    raise
+
+
+def send(client: Client, entry: Entry, files: GeneratedFiles, scheduled: Optional[float] = None) -> Optional[Sample]:
+    path = files.fill(entry.path)
+    if path is None:
+        return None
+    start = time.perf_counter() if scheduled is None else scheduled
+    try:
+        status, data = client.request(entry.method, path, entry.body, entry.headers)
+    except Exception as e:
+        return Sample(entry.endpoint, 0, time.perf_counter() - start, type(e).__name__)
+    latency = time.perf_counter() - start
+    if status >= 400:
+        return Sample(entry.endpoint, status, latency, f'HTTP {status}')
+    if data[:1] == b'{':
+        try:
+            files.add(json.loads(data))
+        except ValueError:
+            pass
+    return Sample(entry.endpoint, status, latency)
+
+
+def replay(client: Client, entries: List[Entry], duration: float, concurrency: int = 4,
+           rate: Optional[float] = None, max_requests: Optional[int] = None) -> Dict[str, Any]:
+    """Replay ``entries`` round-robin for ``duration`` seconds; returns the report."""
+    files = GeneratedFiles()
+    samples: List[Sample] = []
+    skipped = itertools.count()
+    lock = threading.Lock()
+    order = itertools.cycle(entries)
+    sent = itertools.count()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def record(sample: Optional[Sample]) -> None:
+        if sample is None:
+            next(skipped)
+            return
+        with lock:
+            samples.append(sample)
+
+    def next_entry() -> Optional[Entry]:
+        with lock:
+            if time.perf_counter() >= deadline or (max_requests and next(sent) >= max_requests):
+                return None
+            return next(order)
+
+    if rate:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for index in itertools.count():
+                scheduled = start + index / rate
+                if scheduled >= deadline:
+                    break
+                entry = next_entry()
+                if entry is None:
+                    break
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                pool.submit(lambda e=entry, s=scheduled: record(send(client, e, files, s)))
+    else:
+        def worker() -> None:
+            while True:
+                entry = next_entry()
+                if entry is None:
+                    return
+                record(send(client, entry, files))
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed, next(skipped))
+
+
+def _latencies(samples: List[Sample]) -> Dict[str, float]:
+    values = np.array([sample.latency for sample in samples]) * 1000
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {'mean_ms': round(float(values.mean()), 2), 'p50_ms': round(float(p50), 2),
+            'p90_ms': round(float(p90), 2), 'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2), 'max_ms': round(float(values.max()), 2)}
+
+
+def summarize(samples: List[Sample], elapsed: float, skipped: int = 0) -> Dict[str, Any]:
+    """Throughput, latency percentiles and error rates, overall and per endpoint."""
+    def stats(group: List[Sample]) -> Dict[str, Any]:
+        errors = [sample for sample in group if sample.error]
+        result = {
+            'requests': len(group),
+            'throughput': round(len(group) / elapsed, 3) if elapsed else 0.0,
+            'errors': len(errors),
+            'error_rate': round(len(errors) / len(group), 4) if group else 0.0,
+        }
+        if group:
+            result.update(_latencies(group))
+        if errors:
+            kinds: Dict[str, int] = {}
+            for sample in errors:
+                kinds[sample.error] = kinds.get(sample.error, 0) + 1
+            result['error_kinds'] = kinds
+        return result
+
+    endpoints: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        endpoints.setdefault(sample.endpoint, []).append(sample)
+    return dict(stats(samples), elapsed=round(elapsed, 3), skipped=skipped,
+                endpoints={name: stats(group) for name, group in sorted(endpoints.items())})
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def install_stub_renderer(directory: str) -> str:
+    """Write ``openscad`` and ``xvfb-run`` shims into ``directory`` and return it."""
+    shims = {
+        'openscad': f'#!/bin/sh\nexec "{sys.executable}" "{STUB_OPENSCAD}" "$@"\n',
+        'xvfb-run': '#!/bin/sh\n[ "$1" = "-a" ] && shift\nexec "$@"\n',
+    }
+    for name, script in shims.items():
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+    return directory
+
+
+def server_command(server: str, port: int, workers: int = 1, threads: int = 1) -> List[str]:
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--threads', str(threads), '--timeout', '600', 'app:app']
+    if server == 'werkzeug':
+        # The development server forks per request for several processes, else threads
+        options = f'processes={workers}, threaded=False' if workers > 1 else 'threaded=True'
+        return [sys.executable, '-c',
+                f"from app import app; app.run(host='127.0.0.1', port={port}, {options}, use_reloader=False)"]
+    raise ValueError(f"server must be one of {', '.join(SERVERS)}")
+
+
+@contextmanager
+def local_server(server: str = 'werkzeug', workers: int = 1, threads: int = 1, stub_render: bool = False,
+                 stub_delay: float = 0.05, startup_timeout: float = 60.0,
+                 env: Optional[Dict[str, str]] = None) -> Iterator[str]:
+    """Run the app in a subprocess with a temporary OUTPUT_DIR; yields its base URL."""
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix='printboard-loadtest-') as directory:
+        server_env = dict(os.environ, OUTPUT_DIR=os.path.join(directory, 'output'),
+                          CAVITY_LIBRARY_DIR=os.path.join(directory, 'cavities'),
+                          STUB_OPENSCAD_DELAY=str(stub_delay), **(env or {}))
+        if stub_render:
+            bin_dir = os.path.join(directory, 'bin')
+            os.makedirs(bin_dir)
+            install_stub_renderer(bin_dir)
+            server_env['PATH'] = bin_dir + os.pathsep + server_env.get('PATH', '')
+        log = open(os.path.join(directory, 'server.log'), 'wb')
+        process = subprocess.Popen(server_command(server, port, workers, threads), cwd=REPO_DIR,
+                                   env=server_env, stdout=log, stderr=subprocess.STDOUT)
+        url = f'http://127.0.0.1:{port}'
+        try:
+            wait_until_healthy(url, process, startup_timeout, log.name)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            log.close()
+
+
+def wait_until_healthy(url: str, process: subprocess.Popen, timeout: float, log_path: str) -> None:
+    client = Client(url, timeout=5)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path, 'rb') as f:
+                output = f.read().decode(errors='replace')[-2000:]
+            raise RuntimeError(f'server exited with status {process.returncode}:\n{output}')
+        try:
+            if client.request('GET', '/health')[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'server did not become healthy within {timeout} s')
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'endpoint':<44} {'reqs':>6} {'req/s':>8} {'err%':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}"]
+    rows = list(report['endpoints'].items()) + [('total', report)]
+    for name, stats in rows:
+        if not stats['requests']:
+            continue
+        lines.append(f"{name:<44} {stats['requests']:>6} {stats['throughput']:>8.2f} "
+                     f"{100 * stats['error_rate']:>6.1f} {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f} "
+                     f"{stats['p99_ms']:>9.1f}")
+    if report['skipped']:
+        lines.append(f"{report['skipped']} requests skipped: no generated file to fill their path yet")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSONL requests (default benchmarks/corpus.jsonl)')
+    parser.add_argument('--url', help='target a running server instead of starting one')
+    parser.add_argument('--server', choices=SERVERS, default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes (default 2)')
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn worker (default 1)')
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight (default 4)')
+    parser.add_argument('--rate', type=float, help='requests per second (open loop) instead of a fixed concurrency')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run (default 30)')
+    parser.add_argument('--requests', type=int, help='stop after this many requests')
+    parser.add_argument('--timeout', type=float, default=300.0, help='per-request timeout in seconds')
+    parser.add_argument('--render', choices=('auto', 'real', 'stub'), default='auto',
+                        help='stub OpenSCAD out; auto stubs it when it is not installed')
+    parser.add_argument('--stub-delay', type=float, default=0.05, help='seconds per stub render (default 0.05)')
+    parser.add_argument('--output', help='also write the report as JSON')
+    args = parser.parse_args(argv)
+
+    entries = load_corpus(args.corpus)
+    stub = args.render == 'stub' or (args.render == 'auto' and shutil.which('openscad') is None)
+    settings = {'corpus': args.corpus, 'concurrency': args.concurrency, 'rate': args.rate,
+                'duration': args.duration, 'max_requests': args.requests}
+
+    def run(url: str) -> Dict[str, Any]:
+        client = Client(url, args.timeout)
+        return replay(client, entries, args.duration, args.concurrency, args.rate, args.requests)
+
+    if args.url:
+        report = run(args.url)
+        settings['url'] = args.url
+    else:
+        with local_server(args.server, args.workers, args.threads, stub, args.stub_delay) as url:
+            report = run(url)
+        settings.update(server=args.server, workers=args.workers, threads=args.threads, stub_render=stub)
+    report['settings'] = settings
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
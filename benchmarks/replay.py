@@ -0,0 +1,117 @@
+"""
+Re-run captured requests through the pipeline
+
+    python -m benchmarks.replay captures/requests-2026-10-18.jsonl             # list captures
+    python -m benchmarks.replay captures/requests-2026-10-18.jsonl --id 3f2a9c  # replay one
+    python -m benchmarks.replay captures/requests-2026-10-18.jsonl --all --reason slow
+
+A capture is replayed in-process through the same view, with the payload
+and routing seed it was captured with and a temporary ``OUTPUT_DIR``. It
+therefore builds the same geometry, which ``scad_digest`` (a hash of the
+generated SCAD without its timestamp line) confirms. The replay's
+duration and stage timings are printed next to the captured ones.
+Capture files are also valid ``benchmarks.loadtest`` corpora.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from libs.printboard_v2.capture import read_captures
+
+
+def scad_digest(output_dir: str, names: List[str]) -> Optional[str]:
+    """SHA-256 of the SCAD files, skipping their ``// Generated ... on <time>`` line."""
+    if not names:
+        return None
+    digest = hashlib.sha256()
+    for name in names:
+        with open(os.path.join(output_dir, name), 'rb') as f:
+            lines = f.read().split(b'\n')
+        digest.update(b'\n'.join(line for line in lines if not line.startswith(b'// Generated by')))
+    return digest.hexdigest()
+
+
+def replay(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ``record`` again; returns the status, duration, timings and SCAD digest of the replay."""
+    from app import app
+
+    saved = {key: app.config[key] for key in ('OUTPUT_DIR', 'CAPTURE_DIR', 'CAPTURE_SAMPLE_RATE', 'TRACE_DIR')}
+    with tempfile.TemporaryDirectory(prefix='printboard-replay-') as directory:
+        output_dir = os.path.join(directory, 'output')
+        os.makedirs(output_dir)
+        app.config.update(OUTPUT_DIR=output_dir, CAPTURE_DIR=os.path.join(directory, 'captures'),
+                          CAPTURE_SAMPLE_RATE=1.0, TRACE_DIR='')
+        try:
+            with app.test_client() as client:
+                response = client.open(record['path'], method=record['method'], json=record.get('body'),
+                                       headers={'X-Routing-Seed': str(record['routing_seed'])})
+            capture_dir = app.config['CAPTURE_DIR']
+            rerun = [entry for name in sorted(os.listdir(capture_dir))
+                     for entry in read_captures(os.path.join(capture_dir, name))][-1]
+            data = response.get_json(silent=True) or {}
+            return {
+                'status': rerun['status'],
+                'success': rerun['success'],
+                'error': rerun['error'],
+                'duration': rerun['duration'],
+                'timings': rerun['timings'],
+                'scad_digest': scad_digest(output_dir, data.get('scad_files', [])),
+            }
+        finally:
+            app.config.update(saved)
+
+
+def format_comparison(record: Dict[str, Any], result: Dict[str, Any]) -> str:
+    lines = [f"{record['id']}  {record['method']} {record['path']}  ({record['reason']}, {record['time']})",
+             f"  {'':<12} {'captured':>10} {'replayed':>10}",
+             f"  {'status':<12} {record['status']:>10} {result['status']:>10}",
+             f"  {'duration':<12} {record['duration']:>10.3f} {result['duration']:>10.3f}"]
+    for name in sorted(set(record['timings']) | set(result['timings'])):
+        before, after = record['timings'].get(name), result['timings'].get(name)
+        lines.append(f"  {name:<12} {'-' if before is None else f'{before:.3f}':>10} "
+                     f"{'-' if after is None else f'{after:.3f}':>10}")
+    if result['error']:
+        lines.append(f"  error: {result['error']}")
+    if result['scad_digest']:
+        lines.append(f"  scad_digest: {result['scad_digest']}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('captures', help='a capture file from CAPTURE_DIR')
+    parser.add_argument('--id', help='replay the capture with this id (or id prefix)')
+    parser.add_argument('--all', action='store_true', help='replay every capture')
+    parser.add_argument('--reason', choices=('slow', 'error', 'sampled'), help='only captures kept for this reason')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args(argv)
+
+    records = read_captures(args.captures)
+    if args.reason:
+        records = [record for record in records if record['reason'] == args.reason]
+    if args.id:
+        records = [record for record in records if record['id'].startswith(args.id)]
+        if not records:
+            parser.error(f'no capture with id {args.id!r}')
+    elif not args.all:
+        for record in records:
+            print(f"{record['id']}  {record['reason']:<7} {record['duration']:>8.3f} s  "
+                  f"{record['status']}  {record['method']} {record['path']}  {json.dumps(record['body'])}")
+        return 0
+
+    for record in records:
+        result = replay(record)
+        if args.json:
+            print(json.dumps(dict(result, id=record['id'])))
+        else:
+            print(format_comparison(record, result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
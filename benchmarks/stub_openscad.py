@@ -0,0 +1,49 @@
+"""
+Stand-in ``openscad`` for load tests on machines without OpenSCAD
+
+Accepts the command lines ``libs.render`` uses and writes a 12-facet binary
+STL cube to the ``-o`` path after ``STUB_OPENSCAD_DELAY`` seconds (default
+0.05), so render-bound endpoints complete with a plausible delay. Run
+through the shim ``benchmarks.loadtest`` puts first on the server's PATH.
+"""
+
+import os
+import struct
+import sys
+import time
+
+_CUBE = [
+    ((0, 0, 0), (0, 1, 0), (1, 1, 0)), ((0, 0, 0), (1, 1, 0), (1, 0, 0)),
+    ((0, 0, 1), (1, 0, 1), (1, 1, 1)), ((0, 0, 1), (1, 1, 1), (0, 1, 1)),
+    ((0, 0, 0), (1, 0, 0), (1, 0, 1)), ((0, 0, 0), (1, 0, 1), (0, 0, 1)),
+    ((0, 1, 0), (0, 1, 1), (1, 1, 1)), ((0, 1, 0), (1, 1, 1), (1, 1, 0)),
+    ((0, 0, 0), (0, 0, 1), (0, 1, 1)), ((0, 0, 0), (0, 1, 1), (0, 1, 0)),
+    ((1, 0, 0), (1, 1, 0), (1, 1, 1)), ((1, 0, 0), (1, 1, 1), (1, 0, 1)),
+]
+
+
+def write_cube(path: str) -> None:
+    with open(path, 'wb') as f:
+        f.write(b'stub openscad binary STL'.ljust(80, b' '))
+        f.write(struct.pack('<I', len(_CUBE)))
+        for triangle in _CUBE:
+            f.write(struct.pack('<3f', 0, 0, 0))
+            for vertex in triangle:
+                f.write(struct.pack('<3f', *vertex))
+            f.write(struct.pack('<H', 0))
+
+
+def main(argv) -> int:
+    if '--version' in argv:
+        print('OpenSCAD version stub', file=sys.stderr)
+        return 0
+    if '-o' not in argv:
+        print('stub openscad: missing -o', file=sys.stderr)
+        return 1
+    time.sleep(float(os.environ.get('STUB_OPENSCAD_DELAY', 0.05)))
+    write_cube(argv[argv.index('-o') + 1])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
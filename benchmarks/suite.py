@@ -0,0 +1,287 @@
+"""
+Benchmark suite for the keyboard generation pipeline
+
+    python -m benchmarks.suite                          # everything, compared with baseline.json
+    python -m benchmarks.suite --sizes 5x5,4x12 --cases plan_tubes,best_traces
+    python -m benchmarks.suite --save-baseline          # record a new baseline
+
+Every case runs on synthetic layouts: a 5x5 and a 4x12 grid, the 65% layout
+from ``generate.py``, and 100 (5x20) and 500 (20x25) key grids. V2 has no
+key widths, so its cases run the 65% layout as the 5x15 grid it spans.
+Routing picks between near-equal candidates at random, so ``random`` and
+``numpy.random`` are reseeded before every run and each run does the
+same work.
+
+A case runs ``--repeat`` times, or once when a run alone takes longer
+than ``--budget`` seconds; the median is kept. Results are written to
+``--output`` and compared with ``--baseline``. A case regresses when its
+median is more than ``--threshold`` (a fraction) and ``--min-delta``
+seconds slower than the baseline, and the exit status is then 1.
+Baselines are only comparable on the machine that recorded them.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from libs import printboard
+from libs.controllers import tinys2 as controller
+from libs.layouts import add_unit_switches, sixty_five_percent, x
+from libs.printboard_v2 import KeyboardBuilder, KeyboardConfig, LayoutPlanner, MatrixConfig
+from libs.printboard_v2.scad import render_scad
+from libs.printboard_v2.switches import switch_registry
+from libs.switches import gamdias_lp as switch
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results.json')
+
+
+@dataclass(frozen=True)
+class Size:
+    """A benchmark layout: V1 key names plus the rows x cols grid V2 builds."""
+    name: str
+    keys: List[List[str]]
+    rows: int
+    cols: int
+
+
+SIZES = {size.name: size for size in (
+    Size('5x5', [[x] * 5] * 5, 5, 5),
+    Size('4x12', [[x] * 12] * 4, 4, 12),
+    Size('65%', sixty_five_percent, 5, 15),
+    Size('100', [[x] * 20] * 5, 5, 20),
+    Size('500', [[x] * 25] * 20, 20, 25),
+)}
+
+CASES: Dict[str, Callable[[Size], Callable[[], Any]]] = {}
+
+
+def case(name: str):
+    """Register ``setup(size) -> run``; only ``run`` is timed."""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def v1_layout(size: Size) -> Dict[str, Any]:
+    layout = {
+        "name": f"bench_{size.name}",
+        "controller_placement": ("left", "top"),
+        "matrixes": {"main": {"offset": (0, 0), "keys": size.keys}},
+        "switch": switch,
+        "empty_switch": printboard.empty_sw(switch),
+        "controller": controller,
+    }
+    return add_unit_switches(layout, switch)
+
+
+def v1_matrixes(layout: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        name: printboard.fix_rotation_matrix_data(printboard.plan_matrix(layout, matrix_name=name), layout)
+        for name in layout['matrixes']
+    }
+
+
+def v2_config(size: Size) -> KeyboardConfig:
+    return KeyboardConfig(name=f"bench_{size.name}", matrices={"main": MatrixConfig(rows=size.rows, cols=size.cols)})
+
+
+@case('arrange_points_in_matrix')
+def arrange_points_in_matrix(size):
+    points = printboard.extract_points(v1_matrixes(v1_layout(size)))['matrix']
+    return lambda: printboard.arrange_points_in_matrix(points)
+
+
+@case('best_traces')
+def best_traces(size):
+    # plan_tubes scores 100 arrangements; ten distinct ones repeated cost the same
+    points = printboard.extract_points(v1_matrixes(v1_layout(size)))['matrix']
+    arrangements = [printboard.arrange_points_in_matrix(points) for _ in range(10)] * 10
+    rows = [rows for rows, _ in arrangements]
+    columns = [columns for _, columns in arrangements]
+    return lambda: (printboard.best_traces(rows), printboard.best_traces(columns))
+
+
+@case('plan_tubes')
+def plan_tubes(size):
+    layout = v1_layout(size)
+    matrixes = v1_matrixes(layout)
+    return lambda: printboard.plan_tubes(layout, matrixes)
+
+
+@case('create_keyboard')
+def create_keyboard(size):
+    layout = v1_layout(size)
+    return lambda: printboard.create_keyboard(layout)
+
+
+@case('build_keyboard')
+def build_keyboard(size):
+    builder = KeyboardBuilder()
+    config = v2_config(size)
+    return lambda: builder.build_keyboard(config)
+
+
+@case('plan_layout')
+def plan_layout(size):
+    planner = LayoutPlanner(switch_registry.get('gamdias_lp'))
+    config = v2_config(size)
+    return lambda: planner.plan_layout(config)
+
+
+@case('scad_emit')
+def scad_emit(size):
+    # V1 tubes are left out: building them is plan_tubes, which takes minutes at 500 keys
+    layout = v1_layout(size)
+    shapes = [printboard.draw_matrix(matrix, layout) for matrix in v1_matrixes(layout).values()]
+    shapes += [part.shape for part in KeyboardBuilder().build_keyboard(v2_config(size)).parts]
+    return lambda: [render_scad(shape) for shape in shapes]
+
+
+def seed_all(seed: int) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def measure(run: Callable[[], Any], seed: int, repeat: int, budget: float) -> Dict[str, Any]:
+    times: List[float] = []
+    while len(times) < repeat and sum(times) < budget:
+        seed_all(seed)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'min': min(times), 'runs': len(times)}
+
+
+def run_suite(sizes: Optional[List[str]] = None, cases: Optional[List[str]] = None, seed: int = 0,
+              repeat: int = 5, budget: float = 10.0, log=None) -> Dict[str, Dict[str, Any]]:
+    """``{'<case>[<size>]': {'median', 'min', 'runs'}}`` for every case and size."""
+    results = {}
+    for case_name in cases or list(CASES):
+        for size_name in sizes or list(SIZES):
+            seed_all(seed)
+            run = CASES[case_name](SIZES[size_name])
+            name = f'{case_name}[{size_name}]'
+            results[name] = measure(run, seed, repeat, budget)
+            if log:
+                log(f"{name:<36} {results[name]['median']:>10.4f} s  ({results[name]['runs']} runs)")
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float = 0.25, min_delta: float = 0.001) -> List[Dict[str, Any]]:
+    """Per-case change against ``baseline`` for the cases present in both."""
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median'], result['median']
+        rows.append({
+            'name': name,
+            'baseline': before,
+            'current': after,
+            'ratio': after / before if before else float('inf'),
+            'regression': after > before * (1 + threshold) and after - before > min_delta,
+        })
+    return rows
+
+
+def write_results(path: str, results: Dict[str, Dict[str, Any]], settings: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'settings': settings,
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--sizes', help=f"comma-separated subset of {', '.join(SIZES)}")
+    parser.add_argument('--cases', help=f"comma-separated subset of {', '.join(CASES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case (default 5)')
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help='stop repeating a case once its runs took this many seconds (default 10)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='results file (default benchmarks/results.json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (default benchmarks/baseline.json)')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown as a fraction of the baseline (default 0.25)')
+    parser.add_argument('--min-delta', type=float, default=0.001,
+                        help='slowdowns below this many seconds are noise (default 0.001)')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to the baseline file as well')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes.split(',') if args.sizes else None
+    cases = args.cases.split(',') if args.cases else None
+    for name in sizes or []:
+        if name not in SIZES:
+            parser.error(f'unknown size {name!r}')
+    for name in cases or []:
+        if name not in CASES:
+            parser.error(f'unknown case {name!r}')
+
+    log = lambda line: print(line, file=sys.stderr, flush=True)
+    results = run_suite(sizes, cases, seed=args.seed, repeat=args.repeat, budget=args.budget, log=log)
+    settings = {'seed': args.seed, 'repeat': args.repeat, 'budget': args.budget}
+    write_results(args.output, results, settings)
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                results = dict(json.load(f)['results'], **results)
+        write_results(args.baseline, results, settings)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; results written to {args.output}')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    rows = compare(results, baseline, args.threshold, args.min_delta)
+    print(f"{'case':<36} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<36} {row['baseline']:>10.4f} {row['current']:>10.4f} {row['ratio'] - 1:>+8.0%}{flag}")
+    regressions = [row for row in rows if row['regression']]
+    if regressions:
+        print(f'{len(regressions)} of {len(rows)} cases regressed by more than {args.threshold:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
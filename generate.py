@@ -4,32 +4,10 @@ from solid.utils import *
 from libs.switches import gamdias_lp as switch
 from libs.controllers import tinys2 as controller
 from libs import printboard as printboard
+from libs.layouts import x, n, sixty_five_percent, add_unit_switches
 from pprint import pprint
 
 SEGMENTS=50
-x = "switch"
-n = "empty_switch"
-tab = "1.5u"
-cpsk = "1.75u"
-lshift = "2.25u"
-lctrl = "1.25u"
-spc = "6.25u"
-rctrl = "1.25u"
-bksp = "2u"
-backslash = "1.5u"
-enter = "2.25u"
-rshift = "1.75u"
-
-
-sixty_five_percent = [
-    [x] * 13 + [bksp] + [x], 
-    [tab] + [x] * 12 + [backslash] + [x],
-    [cpsk] + [x] * 11+ [enter]+ [x],
-    [lshift] + [x] * 10+ [rshift] + [x] * 2,
-    [lctrl] + [x] * 3+ [spc] + [x] + [rctrl] + [x] * 3,
-]
-
-
 layout = {
     "name": "prototype",
     "controller_placement": ("left", "top"),
@@ -58,12 +36,7 @@ layout = {
 }
 
 
-for i in range(0, 7):
-    for num in [0, 0.25, 0.5, 0.75]:
-        total_i = i+num
-        if int(total_i) == total_i:
-            total_i = int(total_i)
-        layout["{}u".format(total_i)] = printboard.empty_sw(switch, body=switch.switch_body, pins=switch.pins, x=18.5*total_i)
+add_unit_switches(layout, switch)
 # pprint(layout)
 
 
@@ -0,0 +1,218 @@
+"""
+Artifact index for generated files
+
+Keeps a SQLite index next to the output directory so listing generated
+SCAD/STL files never has to scan the directory, and evicts the
+least-recently-downloaded artifacts once the directory exceeds a disk quota.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+INDEX_FILENAME = '.artifacts.sqlite3'
+ARTIFACT_EXTENSIONS = ('.scad', '.stl')
+# Precompressed copies served to clients that accept gzip
+COMPRESSED_SUFFIX = '.gz'
+# Indexed meshes for the web viewer
+VIEWER_SUFFIX = '.mesh'
+# Decimated meshes rendered from a SCAD file for a quick first view
+PREVIEW_MESH_SUFFIX = '.preview.mesh'
+# Marker next to an STL whose full render is still running in the background
+PENDING_SUFFIX = '.pending'
+# Derived files stored next to an artifact as ``<name><suffix>``
+SIBLING_SUFFIXES = (COMPRESSED_SUFFIX, VIEWER_SUFFIX, PREVIEW_MESH_SUFFIX)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    name TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    keyboard TEXT,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts (created);
+CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access);
+CREATE INDEX IF NOT EXISTS artifacts_type ON artifacts (type);
+"""
+
+
+class ArtifactStore:
+    """SQLite-backed index of the files in an output directory."""
+
+    def __init__(self, output_dir: str, quota_bytes: int = 0):
+        self.output_dir = output_dir
+        self.quota_bytes = quota_bytes
+        self.index_path = os.path.join(output_dir, INDEX_FILENAME)
+        self._lock = threading.Lock()
+
+        is_new = not os.path.exists(self.index_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        if is_new:
+            # First use on an existing directory: index what is already there once
+            self.rebuild()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _file_type(filename: str) -> str:
+        return filename.rsplit('.', 1)[-1].lower()
+
+    def _disk_size(self, filename: str, size: int) -> int:
+        """Size of an artifact including its derived sibling files."""
+        for suffix in SIBLING_SUFFIXES:
+            try:
+                size += os.path.getsize(os.path.join(self.output_dir, filename + suffix))
+            except OSError:
+                pass
+        return size
+
+    def record(self, filename: str, keyboard: Optional[str] = None) -> Dict[str, Any]:
+        """Record a file that was just written to the output directory."""
+        stat = os.stat(os.path.join(self.output_dir, filename))
+        now = time.time()
+        entry = {
+            'name': filename,
+            'type': self._file_type(filename),
+            'keyboard': keyboard,
+            'size': self._disk_size(filename, stat.st_size),
+            'created': stat.st_mtime,
+            'last_access': now,
+        }
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (name, type, keyboard, size, created, last_access) "
+                "VALUES (:name, :type, :keyboard, :size, :created, :last_access)",
+                entry
+            )
+        return entry
+
+    def rebuild(self) -> int:
+        """Re-index the output directory from scratch. Returns the file count."""
+        rows = []
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(ARTIFACT_EXTENSIONS):
+                    stat = entry.stat()
+                    rows.append((entry.name, self._file_type(entry.name), None,
+                                 self._disk_size(entry.name, stat.st_size),
+                                 stat.st_mtime, stat.st_mtime))
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM artifacts")
+            conn.executemany(
+                "INSERT INTO artifacts (name, type, keyboard, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Look up a single artifact."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM artifacts WHERE name = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self,
+             page: int = 1,
+             per_page: int = 100,
+             file_type: Optional[str] = None,
+             query: Optional[str] = None,
+             keyboard: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """List artifacts, newest first. Returns ``(files, total_matching)``."""
+        clauses = []
+        params: List[Any] = []
+        if file_type:
+            clauses.append("type = ?")
+            params.append(file_type.lower())
+        if query:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        if keyboard:
+            clauses.append("keyboard = ?")
+            params.append(keyboard)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM artifacts {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM artifacts {where} ORDER BY created DESC, name LIMIT ? OFFSET ?",
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def touch(self, filename: str) -> None:
+        """Mark an artifact as downloaded now."""
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE artifacts SET last_access = ? WHERE name = ?", (time.time(), filename))
+
+    def remove(self, filename: str) -> None:
+        """Forget an artifact without touching the file."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE name = ?", (filename,))
+
+    def total_bytes(self) -> int:
+        """Total size of all indexed artifacts."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def evict(self, protect: Iterable[str] = ()) -> List[str]:
+        """Delete least-recently-downloaded artifacts until under the quota.
+
+        Files in ``protect`` (e.g. the ones just generated) are never evicted.
+        Returns the names of the deleted files.
+        """
+        if not self.quota_bytes:
+            return []
+        protect = set(protect)
+        evicted = []
+        with self._lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total <= self.quota_bytes:
+                return []
+            candidates = conn.execute("SELECT name, size FROM artifacts ORDER BY last_access ASC").fetchall()
+            for row in candidates:
+                if total <= self.quota_bytes:
+                    break
+                if row['name'] in protect:
+                    continue
+                # A marker left by a render that never finished goes with its file
+                for suffix in ('',) + SIBLING_SUFFIXES + (PENDING_SUFFIX,):
+                    path = row['name'] + suffix
+                    try:
+                        os.remove(os.path.join(self.output_dir, path))
+                    except FileNotFoundError:
+                        pass
+                total -= row['size']
+                evicted.append(row['name'])
+            conn.executemany("DELETE FROM artifacts WHERE name = ?", [(name,) for name in evicted])
+        return evicted
+
+
+_stores: Dict[Tuple[str, int], ArtifactStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_artifact_store(output_dir: str, quota_bytes: int = 0) -> ArtifactStore:
+    """Get the shared store for an output directory, creating it on first use."""
+    key = (os.path.abspath(output_dir), quota_bytes)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ArtifactStore(output_dir, quota_bytes)
+        return _stores[key]
@@ -0,0 +1,103 @@
+"""
+NumPy STL assembly for instanced geometry
+
+When the switch cavities of a part do not overlap, their union is just the
+concatenation of the individual meshes. Rather than having OpenSCAD run a
+CGAL union over every cavity, the cavity is rendered once (see
+``libs.scene.cavity_mesh``), transformed per key in NumPy and written
+straight to a binary STL. Layouts whose cavity footprints touch or overlap
+return None so the caller falls back to the CSG render.
+"""
+
+from typing import Optional
+
+import numpy as np
+from shapely.geometry import MultiPoint
+from shapely import affinity
+
+from .render import write_binary_stl, write_gzip_sibling
+from .scene import cavity_mesh
+from .printboard_v2.switches import switch_registry
+
+
+def transform_instances(triangles: np.ndarray,
+                        x: np.ndarray,
+                        y: np.ndarray,
+                        angle: np.ndarray) -> np.ndarray:
+    """Copies of ``triangles`` rotated by ``angle`` degrees about z, then moved to ``(x, y)``.
+
+    Returns a ``(keys * triangles, 3, 3)`` float32 array.
+    """
+    x, y, angle = np.ravel(x), np.ravel(y), np.ravel(angle)
+    radians = np.radians(angle)
+    cos_a, sin_a = np.cos(radians), np.sin(radians)
+    rotation = np.zeros((len(angle), 3, 3))
+    rotation[:, 0, 0] = cos_a
+    rotation[:, 0, 1] = -sin_a
+    rotation[:, 1, 0] = sin_a
+    rotation[:, 1, 1] = cos_a
+    rotation[:, 2, 2] = 1
+    offset = np.stack([x, y, np.zeros_like(x)], axis=-1)
+
+    placed = np.einsum('nij,tvj->ntvi', rotation, triangles) + offset[:, None, None, :]
+    return placed.reshape(-1, 3, 3).astype(np.float32)
+
+
+def footprints_overlap(triangles: np.ndarray,
+                       x: np.ndarray,
+                       y: np.ndarray,
+                       angle: np.ndarray) -> bool:
+    """True if any two placed copies of the mesh touch or overlap in plan view.
+
+    Each copy is approximated by the convex hull of its XY projection, which
+    contains the real footprint, so False is always safe. Pairs whose
+    bounding circles are apart are skipped before the exact polygon test.
+    """
+    x, y, angle = np.ravel(x), np.ravel(y), np.ravel(angle)
+    if len(x) < 2:
+        return False
+    hull = MultiPoint(triangles.reshape(-1, 3)[:, :2].tolist()).convex_hull
+    radius = float(np.max(np.hypot(*np.asarray(hull.exterior.coords).T)))
+
+    distance = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+    first, second = np.nonzero(np.triu(distance <= 2 * radius, k=1))
+    if len(first) == 0:
+        return False
+
+    footprints = [
+        affinity.translate(affinity.rotate(hull, a, origin=(0, 0)), px, py)
+        for px, py, a in zip(x.tolist(), y.tolist(), angle.tolist())
+    ]
+    return any(footprints[i].intersects(footprints[j]) for i, j in zip(first, second))
+
+
+def assemble_stl(triangles: np.ndarray,
+                 x: np.ndarray,
+                 y: np.ndarray,
+                 angle: np.ndarray,
+                 stl_file: str,
+                 compress: bool = True) -> Optional[str]:
+    """Write the placed copies of ``triangles`` as one binary STL.
+
+    Returns the STL path, or None if the copies overlap and need a CSG union.
+    """
+    if footprints_overlap(triangles, x, y, angle):
+        return None
+    write_binary_stl(stl_file, transform_instances(triangles, x, y, angle))
+    if compress:
+        write_gzip_sibling(stl_file)
+    return stl_file
+
+
+def assemble_part_stl(instances, stl_file: str, timeout: int = 60) -> Optional[str]:
+    """Assemble a ``KeyboardPart`` from its ``PartInstances`` without a CSG union.
+
+    Returns None when the fast path does not apply: overlapping cavities, or
+    no OpenSCAD to render the cavity mesh itself.
+    """
+    switch = switch_registry.get(instances.switch_type)
+    mesh = cavity_mesh(switch, timeout=timeout)
+    if mesh['proxy']:
+        return None
+    triangles = mesh['positions'][mesh['indices']].reshape(-1, 3, 3)
+    return assemble_stl(triangles, instances.x, instances.y, instances.angle, stl_file)
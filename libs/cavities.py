@@ -0,0 +1,149 @@
+"""
+Pre-rendered switch cavity library
+
+Every generated SCAD file makes OpenSCAD re-evaluate the switch cavity CSG
+(legs, pin holes, body lock) from primitives for every key. The library
+renders each switch's cavity once per resolution profile (``$fn``) to an
+STL, so parts can be rendered from SCAD that only ``import()``s that mesh
+and unions the copies.
+
+Files are named ``<switch>_fn<segments>_<version>.stl``. The version is a
+hash of the switch ``conf`` and the cavity's SCAD source, so changing
+either renders a fresh mesh instead of reusing a stale one.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from solid import import_stl, rotate, scad_render, translate, union
+
+from .render import render_stl
+from .printboard_v2.metrics import record_cache
+from .printboard_v2.scad import write_scad
+from .printboard_v2.switches import switch_registry
+
+DEFAULT_LIBRARY_DIR = os.environ.get(
+    'CAVITY_LIBRARY_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output', '.cavities')
+)
+
+
+# Version keys by switch name, segments and conf: hashing renders the cavity SCAD
+_versions: Dict[Tuple[str, int, str], str] = {}
+
+
+def cavity_version(switch, segments: int) -> str:
+    """Version key of a switch cavity at a resolution."""
+    conf = getattr(switch, 'conf', {})
+    key = (switch.name, segments, json.dumps(conf, sort_keys=True, default=str))
+    version = _versions.get(key)
+    if version is None:
+        source = {
+            'switch': switch.name,
+            'segments': segments,
+            'conf': conf,
+            'scad': scad_render(switch.get_3d_model()),
+        }
+        version = hashlib.sha256(json.dumps(source, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        _versions[key] = version
+    return version
+
+
+class CavityLibrary:
+    """Directory of rendered switch cavity meshes."""
+
+    def __init__(self, directory: str = DEFAULT_LIBRARY_DIR):
+        self.directory = directory
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def path(self, switch, segments: int) -> str:
+        """Where the cavity mesh for this switch version lives (rendered or not)."""
+        return os.path.join(self.directory,
+                            f'{switch.name}_fn{segments}_{cavity_version(switch, segments)}.stl')
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def ensure(self, switch, segments: int = 50, timeout: int = 60) -> Optional[str]:
+        """Path of the rendered cavity mesh, rendering it on first use.
+
+        Returns None if the cavity could not be rendered (e.g. no OpenSCAD).
+        """
+        path = self.path(switch, segments)
+        record_cache('cavity_library', os.path.exists(path))
+        if os.path.exists(path):
+            return path
+        with self._lock(path):
+            if os.path.exists(path):
+                return path
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=self.directory) as tmp_dir:
+                scad_file = os.path.join(tmp_dir, 'cavity.scad')
+                stl_file = os.path.join(tmp_dir, 'cavity.stl')
+                write_scad(switch.get_3d_model(), scad_file, file_header=f'$fn = {segments};')
+                if not render_stl(scad_file, stl_file, timeout=timeout, compress=False):
+                    return None
+                os.replace(stl_file, path)
+            self._prune(switch, segments, keep=path)
+        return path
+
+    def _prune(self, switch, segments: int, keep: str) -> None:
+        """Remove meshes of older versions of the same switch and resolution."""
+        for stale in glob.glob(os.path.join(self.directory, f'{switch.name}_fn{segments}_*.stl')):
+            if stale != keep:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def import_shape(self, switch, segments: int = 50, timeout: int = 60):
+        """SolidPython ``import()`` of the cavity mesh, or None if it is unavailable."""
+        path = self.ensure(switch, segments, timeout)
+        return import_stl(path) if path else None
+
+
+def instances_shape(cavity, instances, keys=None):
+    """Union of ``cavity`` placed at each key of ``instances`` (optionally a subset)."""
+    shape = union()
+    for index in (range(len(instances.x)) if keys is None else keys):
+        shape.add(translate([float(instances.x[index]), float(instances.y[index]), 0])(
+            rotate([0, 0, float(instances.angle[index])])(cavity)
+        ))
+    return shape
+
+
+def render_instances_stl(instances, stl_file: str, timeout: int = 60, segments: int = 50,
+                         library: Optional['CavityLibrary'] = None) -> Optional[str]:
+    """Render a part from SCAD that imports the pre-rendered cavity for every key.
+
+    Returns None if the cavity mesh is unavailable, so the caller can fall
+    back to rendering the full CSG.
+    """
+    library = library or get_cavity_library()
+    cavity = library.import_shape(switch_registry.get(instances.switch_type), segments, timeout)
+    if cavity is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scad_file = os.path.join(tmp_dir, 'part.scad')
+        write_scad(instances_shape(cavity, instances), scad_file, file_header=f'$fn = {segments};')
+        return render_stl(scad_file, stl_file, timeout=timeout)
+
+
+_libraries: Dict[str, CavityLibrary] = {}
+_libraries_lock = threading.Lock()
+
+
+def get_cavity_library(directory: str = DEFAULT_LIBRARY_DIR) -> CavityLibrary:
+    """Get the shared library for a directory."""
+    key = os.path.abspath(directory)
+    with _libraries_lock:
+        if key not in _libraries:
+            _libraries[key] = CavityLibrary(directory)
+        return _libraries[key]
@@ -0,0 +1,41 @@
+"""
+Named key layouts for the V1 generator
+
+Keys are names looked up in the layout dict: ``"switch"``, ``"empty_switch"``
+or a width such as ``"2.25u"``, which ``add_unit_switches`` registers.
+"""
+
+from libs import printboard
+
+x = "switch"
+n = "empty_switch"
+tab = "1.5u"
+cpsk = "1.75u"
+lshift = "2.25u"
+lctrl = "1.25u"
+spc = "6.25u"
+rctrl = "1.25u"
+bksp = "2u"
+backslash = "1.5u"
+enter = "2.25u"
+rshift = "1.75u"
+
+
+sixty_five_percent = [
+    [x] * 13 + [bksp] + [x],
+    [tab] + [x] * 12 + [backslash] + [x],
+    [cpsk] + [x] * 11 + [enter] + [x],
+    [lshift] + [x] * 10 + [rshift] + [x] * 2,
+    [lctrl] + [x] * 3 + [spc] + [x] + [rctrl] + [x] * 3,
+]
+
+
+def add_unit_switches(layout, switch):
+    """Register ``"0u"`` to ``"6.75u"`` keys in quarter steps on ``layout``."""
+    for i in range(0, 7):
+        for num in [0, 0.25, 0.5, 0.75]:
+            total_i = i + num
+            if int(total_i) == total_i:
+                total_i = int(total_i)
+            layout["{}u".format(total_i)] = printboard.empty_sw(switch, body=switch.switch_body, pins=switch.pins, x=18.5 * total_i)
+    return layout
@@ -0,0 +1,178 @@
+"""
+Indexed mesh format for the web viewer
+
+STL stores three unshared vertices per triangle. For the browser we
+deduplicate vertices once on the server and write a compact indexed mesh:
+
+    magic        4 bytes   b'PBM1'
+    flags        uint32    bit 0: positions are quantized
+    vertex_count uint32
+    index_count  uint32
+    [origin      3 x float32, scale 3 x float32]   only when quantized
+    positions    vertex_count x 3 float32 (or uint16 when quantized),
+                 padded to a multiple of 4 bytes
+    indices      index_count uint32
+
+All values are little-endian. Quantized positions decode as
+``origin + q * scale``.
+"""
+
+import os
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .artifacts import VIEWER_SUFFIX
+from .render import FACET_DTYPE, BINARY_HEADER_SIZE, ascii_stl_to_binary, is_binary_stl
+
+MESH_MAGIC = b'PBM1'
+FLAG_QUANTIZED = 1
+
+_HEADER = struct.Struct('<4sIII')
+_QUANT_HEADER = struct.Struct('<6f')
+
+
+def read_stl(path: str) -> np.ndarray:
+    """Read an STL file into a ``(triangles, 3, 3)`` float32 array."""
+    if not is_binary_stl(path):
+        binary_path = f'{path}.tmp'
+        try:
+            ascii_stl_to_binary(path, binary_path)
+            return read_stl(binary_path)
+        finally:
+            if os.path.exists(binary_path):
+                os.remove(binary_path)
+    facets = np.fromfile(path, dtype=FACET_DTYPE, offset=BINARY_HEADER_SIZE)
+    return np.ascontiguousarray(facets['vertices'])
+
+
+def index_triangles(triangles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Deduplicate bit-identical vertices.
+
+    Returns ``(positions, indices)`` with positions as ``(vertices, 3)``
+    float32 and indices as a flat uint32 array, three per triangle.
+    """
+    corners = np.ascontiguousarray(triangles, dtype=np.float32).reshape(-1, 3)
+    if len(corners) == 0:
+        return np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.uint32)
+    positions, inverse = np.unique(corners, axis=0, return_inverse=True)
+    return positions, inverse.reshape(-1).astype(np.uint32)
+
+
+def decimate_triangles(triangles: np.ndarray, budget: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Simplify a triangle soup to at most ``budget`` triangles by vertex clustering.
+
+    Vertices are snapped to a uniform grid whose cell size grows until the
+    surviving (non-degenerate, non-duplicate) triangles fit the budget.
+    Each cluster is represented by the mean of its vertices. Returns
+    ``(positions, indices)`` like ``index_triangles``.
+    """
+    triangles = np.ascontiguousarray(triangles, dtype=np.float32)
+    if len(triangles) <= budget:
+        return index_triangles(triangles)
+    if budget < 1:
+        raise ValueError("Triangle budget must be at least 1")
+
+    corners = triangles.reshape(-1, 3).astype(np.float64)
+    low = corners.min(axis=0)
+    extent = max(float((corners.max(axis=0) - low).max()), 1e-9)
+    # A closed surface over an n x n x n grid has on the order of n^2 triangles
+    cells = max(int(np.sqrt(budget / 2)), 1)
+    while True:
+        keys = np.floor((corners - low) / (extent / cells)).astype(np.int64)
+        _, clusters = np.unique(keys, axis=0, return_inverse=True)
+        faces = clusters.reshape(-1, 3)
+        faces = faces[(faces[:, 0] != faces[:, 1])
+                      & (faces[:, 1] != faces[:, 2])
+                      & (faces[:, 0] != faces[:, 2])]
+        # Drop triangles collapsed onto the same clusters, keeping first winding
+        _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+        faces = faces[np.sort(first)]
+        if len(faces) <= budget or cells == 1:
+            break
+        cells = max(int(cells / 1.5), 1)
+
+    cluster_ids = clusters.reshape(-1)
+    counts = np.bincount(cluster_ids)
+    centers = np.zeros((len(counts), 3))
+    np.add.at(centers, cluster_ids, corners)
+    centers /= np.maximum(counts, 1)[:, None]
+
+    used, indices = np.unique(faces.reshape(-1), return_inverse=True)
+    return centers[used].astype(np.float32), indices.reshape(-1).astype(np.uint32)
+
+
+def quantize_positions(positions: np.ndarray, bits: int = 16) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Quantize positions to unsigned ``bits``-bit integers over their bounding box.
+
+    Returns ``(quantized, origin, scale)``.
+    """
+    if not 1 <= bits <= 16:
+        raise ValueError("Quantization bits must be between 1 and 16")
+    if len(positions) == 0:
+        return np.zeros((0, 3), dtype=np.uint16), np.zeros(3, dtype=np.float32), np.ones(3, dtype=np.float32)
+    origin = positions.min(axis=0).astype(np.float32)
+    extent = positions.max(axis=0) - origin
+    scale = np.where(extent > 0, extent / ((1 << bits) - 1), 1.0).astype(np.float32)
+    quantized = np.rint((positions - origin) / scale).astype(np.uint16)
+    return quantized, origin, scale
+
+
+def encode_indexed_mesh(positions: np.ndarray, indices: np.ndarray, quantize_bits: int = 0) -> bytes:
+    """Serialize an indexed mesh. ``quantize_bits=0`` keeps float32 positions."""
+    flags = FLAG_QUANTIZED if quantize_bits else 0
+    parts = [_HEADER.pack(MESH_MAGIC, flags, len(positions), len(indices))]
+    if quantize_bits:
+        quantized, origin, scale = quantize_positions(positions, quantize_bits)
+        parts.append(_QUANT_HEADER.pack(*origin, *scale))
+        position_bytes = quantized.astype('<u2').tobytes()
+    else:
+        position_bytes = np.asarray(positions, dtype='<f4').tobytes()
+    parts.append(position_bytes)
+    parts.append(b'\0' * (-len(position_bytes) % 4))
+    parts.append(np.asarray(indices, dtype='<u4').tobytes())
+    return b''.join(parts)
+
+
+def decode_indexed_mesh(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse an indexed mesh back into float32 positions and uint32 indices."""
+    magic, flags, vertex_count, index_count = _HEADER.unpack_from(data)
+    if magic != MESH_MAGIC:
+        raise ValueError("Not an indexed mesh")
+    offset = _HEADER.size
+    if flags & FLAG_QUANTIZED:
+        values = _QUANT_HEADER.unpack_from(data, offset)
+        origin, scale = np.array(values[:3], dtype=np.float32), np.array(values[3:], dtype=np.float32)
+        offset += _QUANT_HEADER.size
+        quantized = np.frombuffer(data, dtype='<u2', count=vertex_count * 3, offset=offset)
+        positions = origin + quantized.reshape(-1, 3).astype(np.float32) * scale
+        offset += quantized.nbytes
+    else:
+        positions = np.frombuffer(data, dtype='<f4', count=vertex_count * 3, offset=offset).reshape(-1, 3)
+        offset += positions.nbytes
+    offset += -offset % 4
+    indices = np.frombuffer(data, dtype='<u4', count=index_count, offset=offset)
+    return positions, indices
+
+
+def write_viewer_mesh(stl_path: str,
+                      quantize_bits: int = 0,
+                      mesh_path: Optional[str] = None,
+                      triangle_budget: Optional[int] = None) -> str:
+    """Convert an STL to an indexed mesh, by default written as ``<stl>.mesh``.
+
+    With ``triangle_budget`` the mesh is decimated to at most that many
+    triangles, for quick previews.
+    """
+    triangles = read_stl(stl_path)
+    if triangle_budget:
+        positions, indices = decimate_triangles(triangles, triangle_budget)
+    else:
+        positions, indices = index_triangles(triangles)
+    mesh_path = mesh_path or stl_path + VIEWER_SUFFIX
+    tmp_path = f'{mesh_path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_indexed_mesh(positions, indices, quantize_bits))
+    os.replace(tmp_path, mesh_path)
+    return mesh_path
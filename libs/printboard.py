@@ -12,22 +12,31 @@ from solid.splines import bezier_polygon, bezier_points
 import random
 from scipy.interpolate import CubicSpline
 
+from libs.printboard_v2.placement import place_keys
+from libs.printboard_v2.scad import flat_union, place
+from libs.printboard_v2.metrics import routing_iterations, stage
+from libs.printboard_v2.tracing import span
+from libs.printboard_v2.capture import routing_random, routing_seed
+
 
 SHAPE_RAD = 15
 SEGMENTS = 50
 
 def create_keyboard(config):
     parts = []
-    build = union()()
+    shapes = []
     matrixes  = {}
     offset_v = 0
     for matrix_name in config['matrixes']:
-        matrixes[matrix_name] =  plan_matrix(config, matrix_name=matrix_name)
-        matrixes[matrix_name] = fix_rotation_matrix_data(matrixes[matrix_name], config)
+        with stage('layout', matrix=matrix_name) as layout_span:
+            matrixes[matrix_name] =  plan_matrix(config, matrix_name=matrix_name)
+            matrixes[matrix_name] = fix_rotation_matrix_data(matrixes[matrix_name], config)
+            layout_span.set(keys=len(matrixes[matrix_name]['switches']))
         # pprint(matrixes[matrix_name])
         # exit()
         # pprint(matrixes[matrix_name])
-        build += draw_matrix(matrixes[matrix_name], config)
+        with stage('geometry', part=matrix_name):
+            shapes.append(draw_matrix(matrixes[matrix_name], config))
         size_x, size_y = matrixes[matrix_name]['sizes']
         offset_v += size_y
     #this should generate the paths to the controller pins, as per the data in the controller class, this should not do the controller jack plug
@@ -35,12 +44,16 @@ def create_keyboard(config):
     # - arrange pins in a matrix based on their position, nearest pin for query so tha tthe matrix looks at least sane if not fully working
     # - should return only points for the tubes, not other type of data, no 3d modelling here, just 2d stuff and some fake contact points to keep the tube to not hit into the other stuff  
     # 
-    tubes = plan_tubes(config, matrixes)
+    with stage('routing') as routing_span:
+        tubes = plan_tubes(config, matrixes)
+        routing_span.set(tubes=len(tubes), tube_points=sum(len(tube) for tube in tubes))
     # tubes = amplify_tubes_curves(tubes)
-    tubes = draw_tubes(tubes, config)
+    with stage('geometry', part='tubes'):
+        tubes = draw_tubes(tubes, config)
     tubes = rotate([180, 0, 0])(tubes)
     # controller_shield = make_controller_points(config, controller_contacts) 
-    build += tubes
+    shapes.append(tubes)
+    build = flat_union(shapes)
     # build = union()()
 
     # best_pins_list = controller_pins(config)
@@ -52,21 +65,12 @@ def create_keyboard(config):
     parts.append({"name": "matrix", "shape": build})
     return parts
 def draw_matrix(matrix_data, config):
-    ret = union()()
-    for switch in matrix_data['switches']:
-        ret += back(switch['y'])(
-                right(switch['x'])(
-                    rotate([0, 0, switch['c_angle']])(
-                        switch['switch'].switch_body
-                    )
-                )
-            )
-    return ret
+    return flat_union(
+        place(switch['switch'].switch_body, switch['x'], -switch['y'], switch['c_angle'])
+        for switch in matrix_data['switches']
+    )
 def draw_tubes(tubes, config):
-    ret = union()()
-    for tube in tubes:
-        ret += build_matrix_tubes(config, tube)
-    return ret
+    return flat_union(build_matrix_tubes(config, tube) for tube in tubes)
 
 def plan_tubes(config, matrixes):
     points = extract_points(matrixes)
@@ -75,11 +79,14 @@ def plan_tubes(config, matrixes):
         "rows": [],
         "columns": []
     }
-    while   runs > 0:
-        rows, columns = arrange_points_in_matrix(points['matrix'])
-        traces['rows'].append(rows)
-        traces['columns'].append(columns)
-        runs -= 1
+    batch = 10
+    for first in range(0, runs, batch):
+        with span('routing_batch', first=first, size=min(batch, runs - first)):
+            for _ in range(min(batch, runs - first)):
+                rows, columns = arrange_points_in_matrix(points['matrix'])
+                traces['rows'].append(rows)
+                traces['columns'].append(columns)
+                routing_iterations.inc()
         
 
     
@@ -238,7 +245,7 @@ def arrange_points_in_matrix(points_list):
                 if len(sorted_points_map) > 1:
                     distance_between_first_two = sorted_points_map[0] - sorted_points_map[1]
                     if abs(distance_between_first_two) < sorted_points_map[0]*0.2:
-                        best_distance = random.choice(sorted_points_map[0:2])
+                        best_distance = routing_random().choice(sorted_points_map[0:2])
                     else:
                         best_distance = min(sorted_points_map)
                 if not best_distance:
@@ -327,26 +334,24 @@ def extract_points(matrixes):
 def fix_rotation_matrix_data(matrix_data, config):
     max_x= max_y = 0
     matrix_config = matrix_data['matrix_config']
-    real_matrix = {}
+    columns_angle = matrix_config.get('columns_angle')
+    rotation = math.radians(matrix_config.get('rotation_angle', 0))
+    lowest_switches = {}
     for switch in matrix_data['switches']:
-        if switch['row'] not in real_matrix:
-            real_matrix[switch['row']] = {}
-        real_matrix[switch['row']][switch['column']] = switch
+        if switch['row'] >= lowest_switches.get(switch['column'], switch)['row']:
+            lowest_switches[switch['column']] = switch
     for switch in matrix_data['switches']:
-        offset_y = offset_x = 0
-        if switch['c_angle'] != 0:
-            lowest_row = max(real_matrix.keys())
-            lowest_switch = real_matrix[lowest_row]
-            if switch['column'] in lowest_switch:
-                lowest_switch = lowest_switch[switch['column']]
-                vertical_leg = (lowest_switch['y'] -  switch['y'])
-            else:
-                vertical_leg = 0
-            if vertical_leg != 0:
-                angle_radians = math.radians(-int(switch['c_angle']))
-                offset_x = -vertical_leg * math.sin(angle_radians)
-        switch['y'] += offset_y
-        switch['x'] += offset_x
+        # plan_matrix positions come from the placement kernel, which rotates the
+        # grid; a column angle also fans the column out from its lowest key
+        column_angle = columns_angle[switch['column'] % len(columns_angle)] if columns_angle else 0
+        if column_angle:
+            lowest_switch = lowest_switches[switch['column']]
+            # Distance to the lowest key along the rotated column
+            vertical_leg = ((lowest_switch['y'] - switch['y']) * math.cos(rotation)
+                            - (lowest_switch['x'] - switch['x']) * math.sin(rotation))
+            offset = vertical_leg * math.sin(math.radians(column_angle))
+            switch['x'] += offset * math.cos(rotation)
+            switch['y'] += offset * math.sin(rotation)
         switch['c_angle'] = -switch['c_angle']
         max_x = max(max_x, switch['x'])
         max_y = max(max_y, switch['y'])
@@ -443,67 +448,64 @@ def plan_matrix(config, matrix_name='main', thumb_cluster=None, offset_y_thumb=0
         "switches": []
     }
     
-    # Initialize counters and offsets
     matrix_config =  config['matrixes'][matrix_name]
     matrix_data['matrix_config'] = matrix_config
-    right_counter = 0 
-    down_counter = 0
-    last_position_x_offset = 0
-    last_position_y_offset = {}
-    last_points = {}
+    keys = matrix_config['keys']
     offset_x, offset_y = matrix_config['offset']
-    max_y = max_x = 0
-    # Loop through each element in the matrix
-    for row in matrix_config['keys']:
-        for element in row:
-            # If the element exists in the configuration file
-            if element in config:
-                # Calculate the x and y position of the switch
-                move_x = last_position_x_offset + offset_x + config[element].conf['switch_sizes_x'] / 2
-                move_y = last_position_y_offset.get(right_counter, 0) + offset_y_thumb + offset_y + config[element].conf['switch_sizes_y'] / 2
-                c_angle = 0
-                r_angle = 0
-                if matrix_config.get('columns_angle', False):
-                    c_angle = matrix_config.get('columns_angle', [])[right_counter % len(matrix_config['columns_angle'])]
-                if matrix_config.get('rows_angle', False):
-                    r_angle = matrix_config.get('rows_angle', [])[down_counter % len(matrix_config['rows_angle'])]
-                # Apply row and column staggering if specified
-                if 'rows_stagger' in matrix_config:
-                    stagger = matrix_config.get('rows_stagger', [])[down_counter % len(matrix_config['rows_stagger'])]
-                    move_x -= stagger
-                if 'columns_stagger' in matrix_config:
-                    stagger = matrix_config.get('columns_stagger', [])[right_counter % len(matrix_config['columns_stagger'])]
-                    move_y -= stagger
-                
-                # Add the switch to the matrix data dictionary
-                matrix_data['switches'].append({
-                    "switch": config[element],
-                    "column": right_counter,
-                    "row": down_counter,
-                    "x": move_x,
-                    "y": move_y,
-                    "c_angle": c_angle,
-                    "r_angle": r_angle
-                })
-                max_x = max(max_x, move_x)
-                max_y = max(max_y, move_y)
-                # Update the position offsets for the next element
-                last_position_x_offset += config[element].conf['switch_sizes_x']
-                if 'padding_keys' in matrix_config:
-                    padding = matrix_config['padding_keys'][right_counter % len(matrix_config['padding_keys'])]
-                    last_position_x_offset += padding
-                if right_counter not in last_position_y_offset:
-                    last_position_y_offset[right_counter] = 0
-                last_position_y_offset[right_counter] += config[element].conf['switch_sizes_y']
-            else:
+
+    # Collect per-key sizes; rows may have different lengths so pad with a mask
+    rows = len(keys)
+    cols = max((len(row) for row in keys), default=0)
+    widths = np.zeros((rows, cols))
+    heights = np.zeros((rows, cols))
+    mask = np.zeros((rows, cols), dtype=bool)
+    for down_counter, row in enumerate(keys):
+        for right_counter, element in enumerate(row):
+            if element not in config:
                 # If the element does not exist in the configuration file, raise an exception
                 raise Exception(f"{element} does not exist ({right_counter},{down_counter})")
-            
-            # Increment counters
-            right_counter += 1
-        last_position_x_offset = 0
-        down_counter += 1
-        right_counter = 0
+            widths[down_counter, right_counter] = config[element].conf['switch_sizes_x']
+            heights[down_counter, right_counter] = config[element].conf['switch_sizes_y']
+            mask[down_counter, right_counter] = True
+
+    if rows == 0 or cols == 0:
+        matrix_data['sizes'] = (0, 0)
+        return matrix_data
+
+    # Place every key with the shared placement kernel (same as V2 and the web preview)
+    placement = place_keys(
+        widths, heights,
+        offset=(offset_x, offset_y + offset_y_thumb),
+        rows_stagger=matrix_config.get('rows_stagger'),
+        columns_stagger=matrix_config.get('columns_stagger'),
+        rows_angle=matrix_config.get('rows_angle'),
+        columns_angle=matrix_config.get('columns_angle'),
+        rotation_angle=matrix_config.get('rotation_angle', 0),
+        padding_keys=matrix_config.get('padding_keys'),
+        mask=mask
+    )
+    xs = placement.x.tolist()
+    ys = placement.y.tolist()
+    angles = placement.angle.tolist()
+    rows_angle = matrix_config.get('rows_angle')
+
+    max_y = max_x = 0
+    for down_counter, row in enumerate(keys):
+        for right_counter, element in enumerate(row):
+            move_x = xs[down_counter][right_counter]
+            move_y = ys[down_counter][right_counter]
+            # Add the switch to the matrix data dictionary
+            matrix_data['switches'].append({
+                "switch": config[element],
+                "column": right_counter,
+                "row": down_counter,
+                "x": move_x,
+                "y": move_y,
+                "c_angle": angles[down_counter][right_counter],
+                "r_angle": rows_angle[down_counter % len(rows_angle)] if rows_angle else 0
+            })
+            max_x = max(max_x, move_x)
+            max_y = max(max_y, move_y)
     matrix_data['sizes'] = (max_x, max_y)
     # Return the matrix data dictionary
     return matrix_data
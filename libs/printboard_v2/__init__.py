@@ -12,14 +12,21 @@ Key improvements:
 - Dependency injection
 """
 
-from .builder import KeyboardBuilder
-from .layout import LayoutPlanner
-from .switches import SwitchRegistry
-from .controllers import ControllerRegistry
-from .config import KeyboardConfig, MatrixConfig
+import importlib
 
 __version__ = "2.0.0"
 
+# Exports are imported on first access, so that light submodules such as
+# metrics, tracing or capture load without the modeling stack (solid)
+_EXPORTS = {
+    "KeyboardBuilder": ".builder",
+    "LayoutPlanner": ".layout",
+    "SwitchRegistry": ".switches",
+    "ControllerRegistry": ".controllers",
+    "KeyboardConfig": ".config",
+    "MatrixConfig": ".config",
+}
+
 __all__ = [
     "KeyboardBuilder",
     "LayoutPlanner", 
@@ -27,4 +34,16 @@ __all__ = [
     "ControllerRegistry",
     "KeyboardConfig",
     "MatrixConfig"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
@@ -13,7 +13,8 @@ from .config import KeyboardConfig, MatrixConfig
 from .switches import SwitchInterface, switch_registry
 from .controllers import ControllerInterface, controller_registry
 from .layout import LayoutPlanner, LayoutPlan
-from .modeling import ModelingEngine
+from .modeling import ModelingEngine, PartInstances
+from .metrics import collect_timings, rounded, stage
 
 
 @dataclass
@@ -22,6 +23,7 @@ class KeyboardPart:
     name: str
     shape: Any  # 3D geometry object
     part_type: str  # "matrix", "controller", "case", etc.
+    instances: Optional[PartInstances] = None  # set when the part is only repeated cavities
 
 
 @dataclass
@@ -76,20 +78,26 @@ class KeyboardBuilder:
         switch = self.switch_registry.get(config.switch_type)
         controller = self.controller_registry.get(config.controller_type)
         
-        # Plan layout
-        planner = LayoutPlanner(switch)
-        layout_plan = planner.plan_layout(config)
-        
-        # Generate 3D parts
-        parts = self._generate_parts(config, layout_plan, switch, controller)
+        with collect_timings() as timings:
+            # Plan layout
+            with stage("layout") as layout_span:
+                planner = LayoutPlanner(switch)
+                layout_plan = planner.plan_layout(config)
+                layout_span.set(keys=len(layout_plan))
+            
+            # Generate 3D parts
+            with stage("geometry") as geometry_span:
+                parts = self._generate_parts(config, layout_plan, switch, controller)
+                geometry_span.set(parts=len(parts))
         
         # Collect metadata
         metadata = {
             "switch_type": config.switch_type,
             "controller_type": config.controller_type,
-            "total_keys": len(layout_plan.keys),
+            "total_keys": len(layout_plan),
             "matrices": list(config.matrices.keys()),
-            "bounds": layout_plan.total_bounds
+            "bounds": layout_plan.total_bounds,
+            "timings": rounded(timings)
         }
         
         return KeyboardResult(
@@ -115,7 +123,8 @@ class KeyboardBuilder:
             v2_parts.append(KeyboardPart(
                 name=part['name'],
                 shape=part['shape'],
-                part_type="matrix"  # Currently only supporting matrix parts
+                part_type="matrix",  # Currently only supporting matrix parts
+                instances=part.get('instances')
             ))
         
         return v2_parts
@@ -126,14 +135,20 @@ class KeyboardBuilder:
         planner = LayoutPlanner(switch)
         return planner.generate_preview_data(config)
     
+    def generate_preview_batch(self, 
+                               matrix_configs: List[MatrixConfig],
+                               switch_type: str = "gamdias_lp") -> List[List[List[Dict[str, Any]]]]:
+        """Generate 2D preview data for many matrix configurations at once."""
+        switch = self.switch_registry.get(switch_type)
+        planner = LayoutPlanner(switch)
+        return planner.generate_preview_batch(matrix_configs)
+    
     def create_config_from_web_request(self, request_data: Dict[str, Any]) -> KeyboardConfig:
         """Create configuration from web API request data."""
         
         # Extract basic parameters
         base_name = request_data.get('name', 'custom_keyboard')
         unique_name = self._generate_unique_name(base_name)
-        rows = request_data.get('rows', 5)
-        cols = request_data.get('cols', 5)
         switch_type = request_data.get('switchType', 'gamdias_lp')
         controller_type = request_data.get('controllerType', 'tinys2')
         
@@ -142,20 +157,7 @@ class KeyboardBuilder:
         controller_tb = request_data.get('controllerPlacementTB', 'top')
         
         # Matrix configuration
-        matrix_config = MatrixConfig(
-            rows=rows,
-            cols=cols,
-            offset=(
-                request_data.get('matrixOffsetX', 0),
-                request_data.get('matrixOffsetY', 0)
-            ),
-            rows_stagger=request_data.get('rowsStagger'),
-            columns_stagger=request_data.get('columnsStagger'),
-            rows_angle=request_data.get('rowsAngle'),
-            columns_angle=request_data.get('columnsAngle'),
-            rotation_angle=request_data.get('rotationAngle', 0),
-            padding_keys=request_data.get('paddingKeys')
-        )
+        matrix_config = self.create_matrix_config_from_web_request(request_data)
         
         # Create keyboard configuration
         config = KeyboardConfig(
@@ -168,6 +170,27 @@ class KeyboardBuilder:
         
         return config
     
+    def create_matrix_config_from_web_request(self, request_data: Dict[str, Any]) -> MatrixConfig:
+        """Create the main matrix configuration from web API request data.
+        
+        Cheaper than ``create_config_from_web_request`` when only the layout
+        is needed, since no unique keyboard name is generated.
+        """
+        return MatrixConfig(
+            rows=request_data.get('rows', 5),
+            cols=request_data.get('cols', 5),
+            offset=(
+                request_data.get('matrixOffsetX', 0),
+                request_data.get('matrixOffsetY', 0)
+            ),
+            rows_stagger=request_data.get('rowsStagger'),
+            columns_stagger=request_data.get('columnsStagger'),
+            rows_angle=request_data.get('rowsAngle'),
+            columns_angle=request_data.get('columnsAngle'),
+            rotation_angle=request_data.get('rotationAngle', 0),
+            padding_keys=request_data.get('paddingKeys')
+        )
+    
     def list_available_switches(self) -> List[str]:
         """List available switch types."""
         return self.switch_registry.list_switches()
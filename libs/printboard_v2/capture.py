@@ -0,0 +1,97 @@
+"""
+Capture of generation requests for later replay
+
+Each captured request becomes one JSON line in
+``<directory>/requests-<date>.jsonl`` holding the normalized payload, the
+routing seed it ran with, per-stage timings and its outcome. Slow and
+failed requests are always captured and the rest are sampled, so the
+configurations that hurt in production can be replayed exactly with
+``python -m benchmarks.replay``.
+"""
+
+import contextvars
+import datetime
+import json
+import os
+import random
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Request fields that change how a request is served, not what it builds
+_TRANSIENT_FIELDS = ('profile',)
+
+# V1 routing breaks near-ties at random; routing_seed() makes a run repeatable
+_routing_random = contextvars.ContextVar('routing_random', default=random)
+
+
+def normalize_payload(body: Any) -> Any:
+    """The request body without transient fields such as ``profile``."""
+    if isinstance(body, dict):
+        return {key: value for key, value in sorted(body.items()) if key not in _TRANSIENT_FIELDS}
+    return body
+
+
+def routing_random():
+    """The random source V1 routing draws from in the current context."""
+    return _routing_random.get()
+
+
+@contextmanager
+def routing_seed(seed: int):
+    """Route with a private ``random.Random(seed)`` inside the block."""
+    token = _routing_random.set(random.Random(seed))
+    try:
+        yield
+    finally:
+        _routing_random.reset(token)
+
+
+class CaptureLog:
+    """Appends captured requests to a daily JSONL file."""
+
+    def __init__(self, directory: str, sample_rate: float = 0.01, slow_seconds: float = 5.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def reason(self, duration: float, failed: bool) -> Optional[str]:
+        """Why a request should be captured (``slow``, ``error``, ``sampled``) or None."""
+        if duration >= self.slow_seconds:
+            return 'slow'
+        if failed:
+            return 'error'
+        if self._random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def path(self, when: Optional[datetime.datetime] = None) -> str:
+        when = when or datetime.datetime.now()
+        return os.path.join(self.directory, f"requests-{when.strftime('%Y-%m-%d')}.jsonl")
+
+    def write(self, record: Dict[str, Any]) -> str:
+        """Append ``record`` as one line; a single O_APPEND write keeps workers' lines whole."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path()
+        line = (json.dumps(record, sort_keys=True, default=str) + '\n').encode()
+        with self._lock:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        return path
+
+
+def read_captures(path: str) -> List[Dict[str, Any]]:
+    """Captured requests in ``path``, skipping a line cut short by a crash."""
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
@@ -5,17 +5,23 @@ Handles the mathematical planning of key positions, staggering, rotation, etc.
 Separated from 3D modeling concerns.
 """
 
-import math
-from typing import List, Tuple, Dict, Any
-from dataclasses import dataclass
+from typing import List, Tuple, Dict, Any, Optional, Sequence
+from dataclasses import dataclass, field
+
+import numpy as np
 
 from .config import KeyboardConfig, MatrixConfig
 from .switches import SwitchInterface
+from .placement import place_matrix, place_matrix_batch
 
 
 @dataclass
 class KeyPosition:
-    """Represents a planned key position."""
+    """Represents a planned key position.
+    
+    ``x``/``y`` are the top-left corner of the unrotated key, as drawn by the
+    preview; the key center is half a key size further in each direction.
+    """
     row: int
     col: int
     x: float
@@ -30,16 +36,109 @@ class KeyPosition:
         return f"R{self.row}C{self.col}"
 
 
-@dataclass  
+@dataclass
 class LayoutPlan:
-    """Complete layout plan for a keyboard."""
-    keys: List[KeyPosition]
+    """Complete layout plan for a keyboard.
+    
+    Keys are stored as parallel NumPy arrays, grouped contiguously by matrix.
+    ``KeyPosition`` objects are only created when ``keys`` or
+    ``get_keys_for_matrix`` is used, and are cached afterwards.
+    """
+    rows: np.ndarray  # (n,) int
+    cols: np.ndarray  # (n,) int
+    x: np.ndarray  # (n,) top-left corners, like KeyPosition.x
+    y: np.ndarray
+    z: np.ndarray
+    angle: np.ndarray
+    matrix_slices: Dict[str, slice]  # matrix_name -> contiguous key range
     matrices: Dict[str, Tuple[float, float]]  # matrix_name -> (width, height)
     total_bounds: Tuple[float, float, float, float]  # min_x, min_y, max_x, max_y
+    _grids: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+    _views: Dict[str, List[KeyPosition]] = field(default_factory=dict, repr=False)
+    
+    @classmethod
+    def from_keys(cls,
+                  keys: List[KeyPosition],
+                  matrices: Dict[str, Tuple[float, float]],
+                  total_bounds: Tuple[float, float, float, float]) -> 'LayoutPlan':
+        """Build a plan from ``KeyPosition`` objects."""
+        grouped: Dict[str, List[KeyPosition]] = {}
+        for key in keys:
+            grouped.setdefault(key.matrix_name, []).append(key)
+        keys = [key for matrix_keys in grouped.values() for key in matrix_keys]
+        slices = {}
+        start = 0
+        for matrix_name, matrix_keys in grouped.items():
+            slices[matrix_name] = slice(start, start + len(matrix_keys))
+            start += len(matrix_keys)
+        plan = cls(
+            rows=np.array([key.row for key in keys], dtype=int),
+            cols=np.array([key.col for key in keys], dtype=int),
+            x=np.array([key.x for key in keys], dtype=float),
+            y=np.array([key.y for key in keys], dtype=float),
+            z=np.array([key.z for key in keys], dtype=float),
+            angle=np.array([key.angle for key in keys], dtype=float),
+            matrix_slices=slices,
+            matrices=matrices,
+            total_bounds=total_bounds
+        )
+        for matrix_name, matrix_slice in slices.items():
+            plan._views[matrix_name] = keys[matrix_slice]
+        return plan
+    
+    def __len__(self) -> int:
+        return len(self.x)
+    
+    @property
+    def keys(self) -> List[KeyPosition]:
+        """All keys as ``KeyPosition`` objects, matrix by matrix."""
+        keys = []
+        for matrix_name in self.matrix_slices:
+            keys.extend(self.get_keys_for_matrix(matrix_name))
+        return keys
     
     def get_keys_for_matrix(self, matrix_name: str) -> List[KeyPosition]:
         """Get all keys belonging to a specific matrix."""
-        return [key for key in self.keys if key.matrix_name == matrix_name]
+        if matrix_name not in self._views:
+            matrix_slice = self.matrix_slices.get(matrix_name)
+            if matrix_slice is None:
+                return []
+            self._views[matrix_name] = [
+                KeyPosition(row=row, col=col, x=x, y=y, z=z, angle=angle, matrix_name=matrix_name)
+                for row, col, x, y, z, angle in zip(
+                    self.rows[matrix_slice].tolist(),
+                    self.cols[matrix_slice].tolist(),
+                    self.x[matrix_slice].tolist(),
+                    self.y[matrix_slice].tolist(),
+                    self.z[matrix_slice].tolist(),
+                    self.angle[matrix_slice].tolist()
+                )
+            ]
+        return list(self._views[matrix_name])
+    
+    def index_of(self, matrix_name: str, row: int, col: int) -> Optional[int]:
+        """Array index of the key at (matrix, row, col), or None."""
+        grid = self._grids.get(matrix_name)
+        if grid is None:
+            matrix_slice = self.matrix_slices.get(matrix_name)
+            if matrix_slice is None:
+                return None
+            rows = self.rows[matrix_slice]
+            cols = self.cols[matrix_slice]
+            grid = np.full((rows.max() + 1, cols.max() + 1), -1, dtype=int)
+            grid[rows, cols] = np.arange(matrix_slice.start, matrix_slice.stop)
+            self._grids[matrix_name] = grid
+        if not (0 <= row < grid.shape[0] and 0 <= col < grid.shape[1]):
+            return None
+        index = int(grid[row, col])
+        return index if index >= 0 else None
+    
+    def key_at(self, matrix_name: str, row: int, col: int) -> Optional[KeyPosition]:
+        """Get the key at (matrix, row, col) in O(1), or None."""
+        index = self.index_of(matrix_name, row, col)
+        if index is None:
+            return None
+        return self.get_keys_for_matrix(matrix_name)[index - self.matrix_slices[matrix_name].start]
 
 
 class LayoutPlanner:
@@ -51,130 +150,135 @@ class LayoutPlanner:
     
     def plan_layout(self, config: KeyboardConfig) -> LayoutPlan:
         """Plan complete keyboard layout from configuration."""
-        all_keys = []
+        columns = {name: [] for name in ("rows", "cols", "x", "y", "angle")}
+        matrix_slices = {}
         matrices = {}
+        bounds = []
+        start = 0
         
         for matrix_name, matrix_config in config.matrices.items():
-            keys = self._plan_matrix(matrix_config, matrix_name)
-            all_keys.extend(keys)
+            placement = place_matrix(matrix_config, self.switch.specs.key_size)
+            row_index, col_index = np.indices((matrix_config.rows, matrix_config.cols))
+            x = placement.corner_x.ravel()
+            y = placement.corner_y.ravel()
+            columns["rows"].append(row_index.ravel())
+            columns["cols"].append(col_index.ravel())
+            columns["x"].append(x)
+            columns["y"].append(y)
+            columns["angle"].append(placement.angle.ravel())
+            matrix_slices[matrix_name] = slice(start, start + len(x))
+            start += len(x)
             
             # Calculate matrix bounds
-            if keys:
-                min_x = min(key.x for key in keys)
-                max_x = max(key.x for key in keys)
-                min_y = min(key.y for key in keys)
-                max_y = max(key.y for key in keys)
-                matrices[matrix_name] = (max_x - min_x + self.key_size, 
-                                       max_y - min_y + self.key_size)
+            min_x, max_x = float(x.min()), float(x.max())
+            min_y, max_y = float(y.min()), float(y.max())
+            bounds.append((min_x, min_y, max_x, max_y))
+            matrices[matrix_name] = (max_x - min_x + self.key_size,
+                                     max_y - min_y + self.key_size)
         
-        # Calculate total bounds
-        if all_keys:
-            min_x = min(key.x for key in all_keys)
-            max_x = max(key.x for key in all_keys)
-            min_y = min(key.y for key in all_keys)
-            max_y = max(key.y for key in all_keys)
-            total_bounds = (min_x, min_y, max_x, max_y)
+        # Calculate total bounds from the per-matrix bounds
+        if bounds:
+            total_bounds = (
+                min(b[0] for b in bounds),
+                min(b[1] for b in bounds),
+                max(b[2] for b in bounds),
+                max(b[3] for b in bounds)
+            )
         else:
             total_bounds = (0, 0, 0, 0)
         
+        def joined(name: str, dtype) -> np.ndarray:
+            return np.concatenate(columns[name]).astype(dtype) if columns[name] else np.zeros(0, dtype=dtype)
+        
+        x = joined("x", float)
         return LayoutPlan(
-            keys=all_keys,
+            rows=joined("rows", int),
+            cols=joined("cols", int),
+            x=x,
+            y=joined("y", float),
+            z=np.zeros_like(x),
+            angle=joined("angle", float),
+            matrix_slices=matrix_slices,
             matrices=matrices,
             total_bounds=total_bounds
         )
     
-    def _plan_matrix(self, matrix_config: MatrixConfig, matrix_name: str) -> List[KeyPosition]:
-        """Plan positions for a single matrix."""
-        keys = []
-        
-        for row in range(matrix_config.rows):
-            for col in range(matrix_config.cols):
-                position = self._calculate_key_position(
-                    row, col, matrix_config, matrix_name
-                )
-                keys.append(position)
-        
-        return keys
-    
-    def _calculate_key_position(self, row: int, col: int, 
-                              matrix_config: MatrixConfig, 
-                              matrix_name: str) -> KeyPosition:
-        """Calculate position for a single key."""
-        # Base position
-        x = col * self.key_size
-        y = row * self.key_size
-        z = 0.0
-        key_angle = 0.0
-        
-        # Apply row staggering
-        if matrix_config.rows_stagger and row < len(matrix_config.rows_stagger):
-            x -= matrix_config.rows_stagger[row]
-        
-        # Apply column staggering
-        if matrix_config.columns_stagger and col < len(matrix_config.columns_stagger):
-            y -= matrix_config.columns_stagger[col]
-        
-        # Calculate individual key angle
-        if matrix_config.rows_angle and row < len(matrix_config.rows_angle):
-            key_angle += matrix_config.rows_angle[row]
-        if matrix_config.columns_angle and col < len(matrix_config.columns_angle):
-            key_angle += matrix_config.columns_angle[col]
-        
-        # Apply matrix rotation
-        if matrix_config.rotation_angle != 0:
-            angle_rad = math.radians(matrix_config.rotation_angle)
-            cos_a = math.cos(angle_rad)
-            sin_a = math.sin(angle_rad)
-            new_x = x * cos_a - y * sin_a
-            new_y = x * sin_a + y * cos_a
-            x, y = new_x, new_y
-        
-        # Apply matrix offset
-        x += matrix_config.offset[0]
-        y += matrix_config.offset[1]
-        
-        return KeyPosition(
-            row=row,
-            col=col,
-            x=x,
-            y=y,
-            z=z,
-            angle=key_angle,
-            matrix_name=matrix_name
-        )
-    
     def generate_preview_data(self, config: KeyboardConfig) -> List[List[Dict[str, Any]]]:
         """Generate 2D preview data compatible with existing UI."""
         layout_plan = self.plan_layout(config)
         
-        # Group keys by matrix and organize by row/col for UI
-        preview_data = []
-        
         # For now, just handle the main matrix for backward compatibility
-        main_keys = layout_plan.get_keys_for_matrix("main")
-        if not main_keys:
+        main_slice = layout_plan.matrix_slices.get("main")
+        if main_slice is None or main_slice.start == main_slice.stop:
             return []
         
-        # Organize keys into row/column structure
-        max_row = max(key.row for key in main_keys)
-        max_col = max(key.col for key in main_keys)
+        xs = layout_plan.x.tolist()
+        ys = layout_plan.y.tolist()
+        angles = layout_plan.angle.tolist()
+        max_row = int(layout_plan.rows[main_slice].max())
+        max_col = int(layout_plan.cols[main_slice].max())
         
+        # Organize keys into row/column structure
+        preview_data = []
         for row in range(max_row + 1):
             row_data = []
             for col in range(max_col + 1):
-                # Find key at this row/col
-                key = next((k for k in main_keys if k.row == row and k.col == col), None)
-                if key:
-                    key_data = {
-                        'x': key.x,
-                        'y': key.y,
+                index = layout_plan.index_of("main", row, col)
+                if index is not None:
+                    row_data.append({
+                        'x': xs[index],
+                        'y': ys[index],
                         'width': self.key_size,
                         'height': self.key_size,
-                        'angle': key.angle,
-                        'label': key.label
-                    }
-                    row_data.append(key_data)
+                        'angle': angles[index],
+                        'label': f"R{row}C{col}"
+                    })
             if row_data:  # Only add non-empty rows
                 preview_data.append(row_data)
         
-        return preview_data
\ No newline at end of file
+        return preview_data
+    
+    def plan_matrices_batch(self, matrix_configs: Sequence[MatrixConfig]) -> List[np.ndarray]:
+        """Plan many matrices in one vectorized pass.
+        
+        Configs with the same (rows, cols) shape are stacked and computed
+        together with NumPy. Returns one ``(rows, cols, 3)`` float array of
+        ``(x, y, angle)`` per config, in input order, with the same values
+        ``plan_layout`` produces for each key.
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(matrix_configs)
+        
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for index, matrix_config in enumerate(matrix_configs):
+            groups.setdefault((matrix_config.rows, matrix_config.cols), []).append(index)
+        
+        for (rows, cols), indices in groups.items():
+            placement = place_matrix_batch([matrix_configs[i] for i in indices],
+                                           self.switch.specs.key_size)
+            planned = np.stack([placement.corner_x, placement.corner_y, placement.angle], axis=-1)
+            for i, grid in zip(indices, planned):
+                results[i] = grid
+        
+        return results
+    
+    def generate_preview_batch(self, matrix_configs: Sequence[MatrixConfig]) -> List[List[List[Dict[str, Any]]]]:
+        """Generate preview data for many matrices, matching ``generate_preview_data``."""
+        previews = []
+        for grid in self.plan_matrices_batch(matrix_configs):
+            rows, cols = grid.shape[:2]
+            values = grid.tolist()
+            previews.append([
+                [
+                    {
+                        'x': values[row][col][0],
+                        'y': values[row][col][1],
+                        'width': self.key_size,
+                        'height': self.key_size,
+                        'angle': values[row][col][2],
+                        'label': f"R{row}C{col}"
+                    }
+                    for col in range(cols)
+                ]
+                for row in range(rows)
+            ])
+        return previews
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Pipeline timings and Prometheus metrics
+
+``stage("layout")`` times a block of the generation pipeline. Each timing
+goes into a process-wide histogram served at ``/metrics`` in the Prometheus
+text format. It is also added to every ``collect_timings()`` block active
+in the current context, which is how build results carry their own
+per-stage timings in ``metadata``, and is a span of the active trace.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from .tracing import Span, span
+
+# Seconds; generation stages run from sub-millisecond to the render timeout
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(ABC):
+    """A named metric family with one value per label combination."""
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines in the Prometheus text format, called under the registry lock."""
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with _lock:
+            lines += self.samples()
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with _lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + ('+Inf' if bound == float('inf') else _number(bound)) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """The metrics served by one process."""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    'printboard_stage_seconds', 'Time spent in each generation pipeline stage.', ['stage']))
+cache_requests = registry.register(Counter(
+    'printboard_cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result']))
+cache_hit_ratio = registry.register(Gauge(
+    'printboard_cache_hit_ratio', 'Fraction of lookups served from each cache.', ['cache']))
+routing_iterations = registry.register(Counter(
+    'printboard_routing_iterations_total', 'Tube routing attempts evaluated.'))
+render_failures = registry.register(Counter(
+    'printboard_render_failures_total', 'OpenSCAD renders that produced no STL, by reason.', ['reason']))
+render_queue_depth = registry.register(Gauge(
+    'printboard_render_queue_depth', 'Renders waiting for a render thread.'))
+renders_in_progress = registry.register(Gauge(
+    'printboard_renders_in_progress', 'OpenSCAD renders running.'))
+
+_collectors: contextvars.ContextVar[Tuple[Dict[str, float], ...]] = contextvars.ContextVar(
+    'printboard_timings', default=())
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and the active timing collectors."""
+    stage_seconds.observe(seconds, stage=name)
+    with _lock:
+        for timings in _collectors.get():
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[Span]:
+    """Time the enclosed block as pipeline stage ``name`` (and a trace span with ``attributes``)."""
+    start = time.perf_counter()
+    with span(name, **attributes) as current:
+        try:
+            yield current
+        finally:
+            record_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect the stages timed inside the block as ``{stage: seconds}`` (repeats are summed)."""
+    timings: Dict[str, float] = {}
+    token = _collectors.set(_collectors.get() + (timings,))
+    try:
+        yield timings
+    finally:
+        _collectors.reset(token)
+
+
+def rounded(timings: Dict[str, float], digits: int = 4) -> Dict[str, float]:
+    """Timings rounded for JSON responses."""
+    return {name: round(seconds, digits) for name, seconds in timings.items()}
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a cache lookup and update that cache's hit ratio."""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+    hits = cache_requests.value(cache=cache, result='hit')
+    cache_hit_ratio.set(hits / (hits + cache_requests.value(cache=cache, result='miss')), cache=cache)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return registry.render()
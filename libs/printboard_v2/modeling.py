@@ -4,7 +4,8 @@
 Handles 3D geometry generation without dependencies on legacy code.
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
 from solid import *
 from solid.utils import *
 from solid.objects import *
@@ -14,6 +15,22 @@ import numpy as np
 
 from .config import KeyboardConfig, MatrixConfig
 from .switches import SwitchInterface
+from .placement import KeyPlacement, place_matrix
+from .scad import flat_union, place
+from .tracing import span
+
+
+@dataclass
+class PartInstances:
+    """A part made of one switch cavity repeated at each key.
+
+    Lets the STL be assembled from a single cavity mesh instead of a CSG
+    union when the cavities do not overlap. Arrays have one entry per key.
+    """
+    switch_type: str
+    x: np.ndarray
+    y: np.ndarray
+    angle: np.ndarray
 
 
 class ModelingEngine:
@@ -23,85 +40,42 @@ class ModelingEngine:
         self.shape_rad = 15
         self.segments = 50
     
-    def generate_matrix_3d(self, matrix_config: MatrixConfig, switch: SwitchInterface, matrix_name: str = "main") -> Any:
-        """Generate 3D cavity geometry for switch mounting holes in a keyboard matrix."""
+    def generate_matrix_3d(self, matrix_config: MatrixConfig, switch: SwitchInterface, matrix_name: str = "main",
+                           placement: Optional[KeyPlacement] = None) -> Any:
+        """Generate 3D cavity geometry for switch mounting holes in a keyboard matrix.
+
+        ``placement`` is the matrix's ``place_matrix`` result when the caller
+        already has it.
+        """
         # Plan the switch positions
-        switch_positions = self._plan_switch_positions(matrix_config, switch)
-        
-        # Create the union of all switch mounting cavities
-        matrix_union = union()()
-        
-        for position in switch_positions:
-            switch_cavity = switch.get_3d_model()  # Now returns mounting cavity
-            
-            # Apply transformations: translation, then rotation
-            transformed_cavity = translate([position['x'], position['y'], 0])(
-                rotate([0, 0, position['rotation']])(
-                    switch_cavity
-                )
-            )
-            
-            matrix_union += transformed_cavity
+        switch_positions = self._plan_switch_positions(matrix_config, switch, placement)
         
-        return matrix_union
+        # One placement per key, collected into a single flat union
+        switch_cavity = switch.get_3d_model()  # Now returns mounting cavity
+        return flat_union(
+            place(switch_cavity, position['x'], position['y'], position['rotation'])
+            for position in switch_positions
+        )
     
-    def _plan_switch_positions(self, matrix_config: MatrixConfig, switch: SwitchInterface) -> List[Dict[str, Any]]:
-        """Plan the positions of switches in the matrix using V1-compatible logic."""
-        positions = []
-        
-        switch_size_x = switch.get_spacing_x()  # 18.5 for gamdias_lp
-        switch_size_y = switch.get_spacing_y()  # 18.5 for gamdias_lp
-        
-        # V1-style position tracking
-        last_position_x_offset = 0
-        last_position_y_offset = {}
-        offset_x, offset_y = matrix_config.offset
+    def _plan_switch_positions(self, matrix_config: MatrixConfig, switch: SwitchInterface,
+                               placement: Optional[KeyPlacement] = None) -> List[Dict[str, Any]]:
+        """Plan the switch center positions in the matrix with the shared placement kernel."""
+        if placement is None:
+            placement = place_matrix(matrix_config, (switch.get_spacing_x(), switch.get_spacing_y()))
+        xs = placement.x.tolist()
+        ys = placement.y.tolist()
+        angles = placement.angle.tolist()
         
+        positions = []
         for row in range(matrix_config.rows):
             for col in range(matrix_config.cols):
-                # V1-style position calculation: accumulate positions + center offset
-                move_x = last_position_x_offset + offset_x + switch_size_x / 2
-                move_y = last_position_y_offset.get(col, 0) + offset_y + switch_size_y / 2
-                
-                # Apply staggering using V1 logic (subtract, not add)
-                if matrix_config.rows_stagger and row < len(matrix_config.rows_stagger):
-                    stagger = matrix_config.rows_stagger[row]
-                    move_x -= stagger
-                
-                if matrix_config.columns_stagger and col < len(matrix_config.columns_stagger):
-                    stagger = matrix_config.columns_stagger[col]
-                    move_y -= stagger
-                
-                # Calculate rotation angles like V1
-                rotation = matrix_config.rotation_angle
-                
-                if matrix_config.rows_angle and row < len(matrix_config.rows_angle):
-                    rotation += matrix_config.rows_angle[row]
-                
-                if matrix_config.columns_angle and col < len(matrix_config.columns_angle):
-                    rotation += matrix_config.columns_angle[col]
-                
                 positions.append({
-                    'x': move_x,
-                    'y': move_y,
-                    'rotation': rotation,
+                    'x': xs[row][col],
+                    'y': ys[row][col],
+                    'rotation': angles[row][col],
                     'row': row,
                     'col': col
                 })
-                
-                # Update position offsets for next element (V1 style)
-                last_position_x_offset += switch_size_x
-                if matrix_config.padding_keys and col < len(matrix_config.padding_keys):
-                    padding = matrix_config.padding_keys[col]
-                    last_position_x_offset += padding
-                
-                # Track column heights
-                if col not in last_position_y_offset:
-                    last_position_y_offset[col] = 0
-                last_position_y_offset[col] += switch_size_y
-            
-            # Reset for next row
-            last_position_x_offset = 0
         
         return positions
     
@@ -124,17 +98,26 @@ class ModelingEngine:
         
         # Generate matrix parts (switch mounting cavities)
         for matrix_name, matrix_config in config.matrices.items():
-            matrix_geometry = self.generate_matrix_3d(matrix_config, switch, matrix_name)
-            
-            # Add routing tubes
-            routing_geometry = self.generate_routing_tubes(matrix_config, switch)
-            
-            # Combine matrix cavities and routing
-            combined_geometry = matrix_geometry + routing_geometry
+            with span("part", matrix=matrix_name, keys=matrix_config.rows * matrix_config.cols):
+                # Placed once for both the cavity geometry and the part's instances
+                placement = place_matrix(matrix_config, (switch.get_spacing_x(), switch.get_spacing_y()))
+                matrix_geometry = self.generate_matrix_3d(matrix_config, switch, matrix_name, placement)
+                
+                # Add routing tubes
+                routing_geometry = self.generate_routing_tubes(matrix_config, switch)
+                
+                # Combine matrix cavities and routing
+                combined_geometry = matrix_geometry + routing_geometry
             
             parts.append({
                 "name": f"{matrix_name}_switch_holes",
-                "shape": combined_geometry
+                "shape": combined_geometry,
+                "instances": PartInstances(
+                    switch_type=switch.name,
+                    x=placement.x.ravel(),
+                    y=placement.y.ravel(),
+                    angle=placement.angle.ravel()
+                )
             })
         
         return parts
\ No newline at end of file
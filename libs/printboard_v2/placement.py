@@ -0,0 +1,169 @@
+"""
+Key placement kernel for V2 API
+
+Computes key centers and angles for a whole matrix as NumPy arrays.
+V1 ``plan_matrix``, the V1 web preview, ``LayoutPlanner`` and
+``ModelingEngine`` all place keys through this module, so the 2D preview
+and the 3D model always agree.
+"""
+
+from typing import Optional, Sequence, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+from .config import MatrixConfig
+
+
+@dataclass
+class KeyPlacement:
+    """Placed keys of one matrix (or a batch of same-shape matrices).
+
+    All arrays have shape ``(..., rows, cols)``; the leading dimension is
+    only present for batches. ``x``/``y`` are key centers, ``angle`` is the
+    key rotation in degrees and ``mask`` marks grid cells that hold a key.
+    """
+    x: np.ndarray
+    y: np.ndarray
+    angle: np.ndarray
+    width: np.ndarray
+    height: np.ndarray
+    mask: np.ndarray
+
+    @property
+    def corner_x(self) -> np.ndarray:
+        """Left edge of the unrotated key, as used by the 2D preview."""
+        return self.x - self.width / 2
+
+    @property
+    def corner_y(self) -> np.ndarray:
+        """Top edge of the unrotated key, as used by the 2D preview."""
+        return self.y - self.height / 2
+
+
+def _per_index(values, length: int, batch_shape: Tuple[int, ...]) -> np.ndarray:
+    """Expand a per-row/per-column parameter to ``batch_shape + (length,)``.
+
+    Lists shorter than ``length`` repeat cyclically, like V1 layouts do.
+    """
+    if values is None:
+        return np.zeros(batch_shape + (length,))
+    values = np.asarray(values, dtype=float)
+    if values.shape[-1] == 0:
+        return np.zeros(batch_shape + (length,))
+    return values[..., np.arange(length) % values.shape[-1]]
+
+
+def place_keys(key_widths: np.ndarray,
+               key_heights: np.ndarray,
+               offset=(0.0, 0.0),
+               rows_stagger=None,
+               columns_stagger=None,
+               rows_angle=None,
+               columns_angle=None,
+               rotation_angle=0.0,
+               padding_keys=None,
+               mask: Optional[np.ndarray] = None) -> KeyPlacement:
+    """Place every key of a matrix in one vectorized pass.
+
+    Keys are laid out left to right with their own widths plus
+    ``padding_keys`` after each column, and top to bottom per column with
+    their own heights. Row stagger shifts rows left, column stagger shifts
+    columns up, the whole grid is rotated by ``rotation_angle`` around the
+    center of key (0, 0) and finally moved by ``offset``. Key angles are the
+    sum of the row angle, the column angle and ``rotation_angle``.
+
+    The per-row/column parameters, ``offset`` and ``rotation_angle`` may
+    carry a leading batch dimension to place many matrices at once.
+    """
+    key_widths = np.asarray(key_widths, dtype=float)
+    key_heights = np.asarray(key_heights, dtype=float)
+    rows, cols = key_widths.shape
+    if mask is None:
+        mask = np.ones((rows, cols), dtype=bool)
+
+    offset = np.asarray(offset, dtype=float)
+    rotation_angle = np.asarray(rotation_angle, dtype=float)
+    batch_shape = np.broadcast_shapes(offset.shape[:-1], rotation_angle.shape)
+    for values in (rows_stagger, columns_stagger, rows_angle, columns_angle, padding_keys):
+        if values is not None:
+            batch_shape = np.broadcast_shapes(batch_shape, np.shape(values)[:-1])
+
+    padding = _per_index(padding_keys, cols, batch_shape)
+    advance_x = (key_widths + padding[..., None, :]) * mask
+    advance_y = key_heights * mask
+
+    # Exclusive running sums: the space taken by the keys before each key
+    x = np.cumsum(advance_x, axis=-1) - advance_x + key_widths / 2
+    y = np.cumsum(advance_y, axis=-2) - advance_y + key_heights / 2
+
+    x = x - _per_index(rows_stagger, rows, batch_shape)[..., :, None]
+    y = y - _per_index(columns_stagger, cols, batch_shape)[..., None, :]
+    x, y = np.broadcast_arrays(x, y)
+
+    pivot_x = key_widths[0, 0] / 2
+    pivot_y = key_heights[0, 0] / 2
+    radians = np.radians(rotation_angle)[..., None, None]
+    cos_a = np.cos(radians)
+    sin_a = np.sin(radians)
+    rel_x = x - pivot_x
+    rel_y = y - pivot_y
+    x = rel_x * cos_a - rel_y * sin_a + pivot_x + offset[..., 0, None, None]
+    y = rel_x * sin_a + rel_y * cos_a + pivot_y + offset[..., 1, None, None]
+
+    angle = (_per_index(rows_angle, rows, batch_shape)[..., :, None]
+             + _per_index(columns_angle, cols, batch_shape)[..., None, :]
+             + rotation_angle[..., None, None])
+    angle = np.broadcast_to(angle, x.shape)
+
+    return KeyPlacement(
+        x=x,
+        y=y,
+        angle=angle,
+        width=np.broadcast_to(key_widths, x.shape),
+        height=np.broadcast_to(key_heights, x.shape),
+        mask=mask
+    )
+
+
+def place_matrix(matrix_config: MatrixConfig, key_size: Tuple[float, float]) -> KeyPlacement:
+    """Place the keys of a uniform-key ``MatrixConfig``."""
+    shape = (matrix_config.rows, matrix_config.cols)
+    return place_keys(
+        np.full(shape, float(key_size[0])),
+        np.full(shape, float(key_size[1])),
+        offset=matrix_config.offset,
+        rows_stagger=matrix_config.rows_stagger,
+        columns_stagger=matrix_config.columns_stagger,
+        rows_angle=matrix_config.rows_angle,
+        columns_angle=matrix_config.columns_angle,
+        rotation_angle=matrix_config.rotation_angle,
+        padding_keys=matrix_config.padding_keys
+    )
+
+
+def place_matrix_batch(matrix_configs: Sequence[MatrixConfig],
+                       key_size: Tuple[float, float]) -> KeyPlacement:
+    """Place many same-shape matrices at once.
+
+    The returned arrays have a leading dimension indexing ``matrix_configs``.
+    """
+    rows, cols = matrix_configs[0].rows, matrix_configs[0].cols
+    if any((c.rows, c.cols) != (rows, cols) for c in matrix_configs):
+        raise ValueError("All matrices in a batch must have the same shape")
+
+    def stacked(attr: str, length: int) -> np.ndarray:
+        return np.stack([_per_index(getattr(c, attr), length, ()) for c in matrix_configs])
+
+    shape = (rows, cols)
+    return place_keys(
+        np.full(shape, float(key_size[0])),
+        np.full(shape, float(key_size[1])),
+        offset=[c.offset for c in matrix_configs],
+        rows_stagger=stacked("rows_stagger", rows),
+        columns_stagger=stacked("columns_stagger", cols),
+        rows_angle=stacked("rows_angle", rows),
+        columns_angle=stacked("columns_angle", cols),
+        rotation_angle=[c.rotation_angle for c in matrix_configs],
+        padding_keys=stacked("padding_keys", cols)
+    )
@@ -0,0 +1,133 @@
+"""
+Sampling profiler for individual generation requests
+
+``SamplingProfiler`` samples the stack of the thread that entered it from a
+background thread, so a slow configuration can be profiled in place
+without reproducing it locally. The samples give the top functions, a
+call tree and collapsed stacks (``a;b;c 12`` per line), which flamegraph.pl,
+speedscope and most other flamegraph tools read directly.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _label(code) -> str:
+    """``function (path:line)`` with paths relative to the repository when inside it."""
+    path = code.co_filename
+    if path.startswith(_ROOT + os.sep):
+        path = os.path.relpath(path, _ROOT)
+    else:
+        path = os.path.join(*path.split(os.sep)[-2:]) if os.sep in path else path
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Context manager sampling the entering thread every ``interval`` seconds.
+
+    Stacks are recorded from the frame that entered the profiler down, so
+    the web framework's frames above it are left out.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self._target = threading.get_ident()
+        self._anchor = sys._getframe(1)
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            codes = []
+            while frame is not None and frame is not self._anchor:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            # Skip samples taken while the profiler itself is stopping
+            if codes and codes[-1].co_filename != __file__:
+                self.stacks[tuple(_label(code) for code in reversed(codes))] += 1
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def folded(self) -> str:
+        """Collapsed stacks, one ``root;...;leaf count`` line per distinct stack."""
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """Functions by samples spent in them (``self``) and under them (``total``)."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        samples = self.samples or 1
+        return [
+            {'function': function, 'self': own[function], 'total': count,
+             'self_pct': round(100 * own[function] / samples, 1),
+             'total_pct': round(100 * count / samples, 1)}
+            for function, count in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:limit]
+        ]
+
+    def call_tree(self, min_fraction: float = 0.01) -> Dict[str, Any]:
+        """Nested ``{'function', 'samples', 'children'}``; branches under ``min_fraction`` are dropped."""
+        root: Dict[str, Any] = {'function': '<root>', 'samples': 0, 'children': {}}
+        for stack, count in self.stacks.items():
+            node = root
+            node['samples'] += count
+            for function in stack:
+                node = node['children'].setdefault(function, {'function': function, 'samples': 0, 'children': {}})
+                node['samples'] += count
+
+        threshold = min_fraction * root['samples']
+
+        def prune(node: Dict[str, Any]) -> Dict[str, Any]:
+            children = sorted((child for child in node['children'].values() if child['samples'] >= threshold),
+                              key=lambda child: -child['samples'])
+            return {'function': node['function'], 'samples': node['samples'],
+                    'children': [prune(child) for child in children]}
+        return prune(root)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'samples': self.samples,
+            'interval': self.interval,
+            'duration': round(self.duration, 4),
+            'top_functions': self.top_functions(),
+            'call_tree': self.call_tree(),
+            'folded': self.folded(),
+        }
+
+
+def store_profile(profile: Dict[str, Any], directory: str, name: str) -> Tuple[str, str]:
+    """Write a profile as ``<name>.json`` plus ``<name>.folded`` for flamegraph tools."""
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f'{name}.json')
+    folded_path = os.path.join(directory, f'{name}.folded')
+    with open(json_path, 'w') as f:
+        json.dump(profile, f)
+    with open(folded_path, 'w') as f:
+        f.write(profile['folded'] + '\n')
+    return json_path, folded_path
@@ -0,0 +1,400 @@
+"""
+SolidPython tree construction helpers
+
+Building a part with ``shape += child`` in a loop copies the union's child
+list on every step (SolidPython's ``union.__add__`` rebuilds the node), and
+nesting ``back(right(rotate(...)))`` adds three transform nodes per key.
+These helpers collect the children first and emit one flat union (or a
+balanced tree of bounded fan-out) with a single placement per key.
+
+At emit time, ``fold_transforms`` collapses chains of nested affine
+transforms (``back(right(rotate(...)))``) into one ``multmatrix`` node and
+``dedupe_modules`` hash-conses identical subtrees (the same pin hole, leg
+or whole cavity) so each is written once as a named module. Numbers are
+snapped to a quantization step and printed in their shortest form.
+"""
+
+import copy
+import datetime
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from solid import multmatrix, rotate, translate, union
+from solid.solidpython import OpenSCADObject, _find_include_strings, _get_version
+
+from .metrics import stage
+
+AFFINE_NODES = ('translate', 'rotate', 'scale', 'mirror', 'multmatrix')
+
+# Matrix entries closer to zero than this are emitted as exact zeros, so
+# 90 degree rotations stay exact like OpenSCAD's own rotate()
+_SNAP = 1e-12
+
+# Default quantization of emitted lengths: 1 micron, far below printer resolution
+DEFAULT_QUANTIZE_STEP = 0.001
+
+# Dimensionless values (rotation/scale factors, angles, directions) are not
+# lengths; they only lose float noise so placements stay exact to ~1e-7 mm
+_RATIO_STEP = 1e-9
+
+
+def place(child, x: float = 0.0, y: float = 0.0, angle: float = 0.0):
+    """``child`` rotated by ``angle`` degrees about z, then moved to ``(x, y)``.
+
+    Identity steps are skipped, so an unrotated key is a single ``translate``.
+    """
+    if angle:
+        child = rotate([0, 0, float(angle)])(child)
+    if x or y:
+        child = translate([float(x), float(y), 0])(child)
+    return child
+
+
+def _flatten(children: Iterable) -> List:
+    """Children with plain (unmodified, transform-free) unions spliced in."""
+    flat = []
+    pending = list(children)[::-1]
+    while pending:
+        child = pending.pop()
+        if child is None:
+            continue
+        if child.name == 'union' and not child.modifier and not child.params:
+            pending.extend(child.children[::-1])
+        else:
+            flat.append(child)
+    return flat
+
+
+def flat_union(children: Iterable):
+    """One ``union()`` holding all ``children``, nested plain unions flattened."""
+    return union().add(_flatten(children))
+
+
+def balanced_union(children: Iterable, max_children: Optional[int] = 64):
+    """Union of ``children`` as a tree with at most ``max_children`` per node.
+
+    The depth grows with ``log(len(children))`` instead of the child count;
+    ``max_children=None`` gives a single flat union.
+    """
+    level = _flatten(children)
+    if max_children is None or len(level) <= max_children:
+        return union().add(level)
+    if max_children < 2:
+        raise ValueError("max_children must be at least 2")
+    while len(level) > max_children:
+        level = [union().add(level[i:i + max_children]) for i in range(0, len(level), max_children)]
+    return union().add(level)
+
+
+def tree_depth(node) -> int:
+    """Depth of a SolidPython tree (a lone node has depth 1)."""
+    depth = 0
+    stack = [(node, 1)]
+    while stack:
+        current, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in current.children)
+    return depth
+
+
+def node_count(node) -> int:
+    """Number of nodes in a SolidPython tree."""
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        count += 1
+        stack.extend(current.children)
+    return count
+
+
+def _vector(value, length: int = 3, fill: float = 0.0) -> List[float]:
+    """A parameter vector padded to ``length`` (a scalar fills every axis)."""
+    if value is None:
+        return [fill] * length
+    if np.isscalar(value):
+        return [float(value)] * length
+    values = [float(v) for v in value]
+    return values + [fill] * (length - len(values))
+
+
+def _rotation(axis: np.ndarray, degrees: float) -> np.ndarray:
+    """3x3 rotation by ``degrees`` about ``axis`` (Rodrigues)."""
+    radians = math.radians(degrees)
+    x, y, z = axis / np.linalg.norm(axis)
+    c, s, t = math.cos(radians), math.sin(radians), 1 - math.cos(radians)
+    return np.array([
+        [t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+        [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+        [t * x * z - s * y, t * y * z + s * x, t * z * z + c],
+    ])
+
+
+def affine_matrix(node) -> np.ndarray:
+    """4x4 matrix of a translate/rotate/scale/mirror/multmatrix node, as OpenSCAD applies it."""
+    matrix = np.eye(4)
+    params = node.params
+    if node.name == 'translate':
+        matrix[:3, 3] = _vector(params.get('v'))
+    elif node.name == 'scale':
+        matrix[:3, :3] = np.diag(_vector(params.get('v'), fill=1.0))
+    elif node.name == 'mirror':
+        normal = np.array(_vector(params.get('v')))
+        if normal.any():
+            matrix[:3, :3] -= 2 * np.outer(normal, normal) / normal.dot(normal)
+    elif node.name == 'rotate':
+        angle, axis = params.get('a'), params.get('v')
+        if angle is None:
+            pass
+        elif np.isscalar(angle):
+            # A bare angle rotates about z; with v it rotates about that axis
+            axis = np.array(_vector(axis)) if axis is not None else np.array([0.0, 0.0, 1.0])
+            if axis.any():
+                matrix[:3, :3] = _rotation(axis, float(angle))
+        else:
+            ax, ay, az = _vector(angle)
+            matrix[:3, :3] = (_rotation(np.array([0.0, 0.0, 1.0]), az)
+                              @ _rotation(np.array([0.0, 1.0, 0.0]), ay)
+                              @ _rotation(np.array([1.0, 0.0, 0.0]), ax))
+    elif node.name == 'multmatrix':
+        rows = np.array(params['m'], dtype=float)
+        matrix[:rows.shape[0], :rows.shape[1]] = rows
+    else:
+        raise ValueError(f"{node.name} is not an affine transform")
+    return matrix
+
+
+def _matrix_rows(matrix: np.ndarray) -> List[List[float]]:
+    """Top three rows of ``matrix`` (OpenSCAD implies the last), integral entries as ints."""
+    matrix = np.where(np.abs(matrix) < _SNAP, 0.0, matrix)
+    return [[int(value) if float(value).is_integer() else float(value) for value in row]
+            for row in matrix[:3]]
+
+
+def _foldable(node) -> bool:
+    return (node.name in AFFINE_NODES and not node.modifier
+            and not node.is_hole and not node.is_part_root)
+
+
+def fold_transforms(node, _folded: Optional[Dict[int, object]] = None):
+    """Copy of a SolidPython tree with nested affine transforms folded.
+
+    A chain of two or more transforms becomes one ``multmatrix``; lone
+    transforms and every other node are kept as they are. Shared subtrees
+    are folded once and stay shared in the result.
+    """
+    folded = {} if _folded is None else _folded
+    if id(node) in folded:
+        return folded[id(node)]
+
+    if _foldable(node) and len(node.children) == 1 and _foldable(node.children[0]):
+        matrix = np.eye(4)
+        current = node
+        while True:
+            matrix = matrix @ affine_matrix(current)
+            if len(current.children) == 1 and _foldable(current.children[0]):
+                current = current.children[0]
+            else:
+                break
+        result = multmatrix(m=_matrix_rows(matrix))
+        children = current.children
+    else:
+        result = copy.copy(node)
+        result.children = []
+        result.parent = None
+        children = node.children
+
+    result.add([fold_transforms(child, folded) for child in children])
+    folded[id(node)] = result
+    return result
+
+
+class _Quantized(float):
+    """A float SolidPython prints as given (``py2openscad`` pads plain floats to 10 decimals)."""
+
+    def __new__(cls, value: float, text: str):
+        number = super().__new__(cls, value)
+        number.text = text
+        return number
+
+    def __str__(self) -> str:
+        return self.text
+
+    __repr__ = __str__
+
+
+def quantize_number(value: float, step: float):
+    """``value`` snapped to a multiple of ``step``, printed with no more digits than ``step`` needs."""
+    decimals = max(0, -math.floor(math.log10(step))) + (0 if math.log10(step).is_integer() else 1)
+    snapped = round(round(float(value) / step) * step, decimals)
+    if snapped == int(snapped):
+        return int(snapped)
+    text = f'{snapped:.{decimals}f}'.rstrip('0').rstrip('.')
+    return _Quantized(snapped, text)
+
+
+def _quantize_value(value, step: float):
+    if isinstance(value, (bool, str, int, np.integer)) or value is None:
+        return value
+    if isinstance(value, (float, np.floating)):
+        return quantize_number(value, step)
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if hasattr(value, '__iter__') and not isinstance(value, OpenSCADObject):
+        return [_quantize_value(item, step) for item in value]
+    return value
+
+
+def _quantize_params(node, step: float) -> Dict:
+    """Quantized copy of a node's params; lengths use ``step``, ratios and angles a fine step."""
+    if node.name in ('rotate', 'scale', 'mirror'):
+        return {key: _quantize_value(value, _RATIO_STEP) for key, value in node.params.items()}
+    if node.name == 'multmatrix':
+        rows = [[_quantize_value(value, step if column == 3 else _RATIO_STEP) for column, value in enumerate(row)]
+                for row in node.params['m']]
+        return dict(node.params, m=rows)
+    return {key: _quantize_value(value, step) for key, value in node.params.items()}
+
+
+def quantize_tree(node, step: float = DEFAULT_QUANTIZE_STEP, _quantized: Optional[Dict[int, object]] = None):
+    """Copy of a SolidPython tree with every number snapped to ``step`` (mm).
+
+    Float noise such as ``1.2246e-16`` becomes ``0``, integral values are
+    written as ints and other values with only the digits ``step`` needs.
+    Shared subtrees stay shared.
+    """
+    quantized = {} if _quantized is None else _quantized
+    if id(node) in quantized:
+        return quantized[id(node)]
+    result = copy.copy(node)
+    result.params = _quantize_params(node, step)
+    result.children = []
+    result.parent = None
+    result.add([quantize_tree(child, step, quantized) for child in node.children])
+    quantized[id(node)] = result
+    return result
+
+
+@dataclass
+class DedupStats:
+    """Size of a tree before and after hash-consing."""
+    nodes: int          # nodes in the fully expanded tree
+    emitted_nodes: int  # nodes written out, module bodies counted once
+    modules: int
+
+    @property
+    def ratio(self) -> float:
+        """Expanded over emitted node count (1.0 means nothing was shared)."""
+        return self.nodes / self.emitted_nodes if self.emitted_nodes else 1.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {'nodes': self.nodes, 'emitted_nodes': self.emitted_nodes,
+                'modules': self.modules, 'ratio': round(self.ratio, 3)}
+
+
+def _structure(root) -> Tuple[Dict[int, tuple], Dict[tuple, object], Dict[tuple, int]]:
+    """Structural key of every node, one representative per key and subtree sizes."""
+    keys: Dict[int, tuple] = {}
+    nodes: Dict[tuple, object] = {}
+    sizes: Dict[tuple, int] = {}
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in keys:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if id(child) not in keys)
+            continue
+        child_keys = tuple(keys[id(child)] for child in node.children)
+        key = (node.modifier, node.is_hole, node._render_str_no_children(), child_keys)
+        keys[id(node)] = key
+        nodes.setdefault(key, node)
+        sizes[key] = 1 + sum(sizes[child] for child in child_keys)
+    return keys, nodes, sizes
+
+
+def dedupe_modules(shape, min_nodes: int = 3) -> Tuple[str, str, DedupStats]:
+    """Hash-cons ``shape`` into SCAD module definitions and a body.
+
+    A subtree of at least ``min_nodes`` nodes that would be written more
+    than once becomes ``module shape_<n>() { ... }`` and every use a call.
+    Returns ``(modules, body, stats)`` as SCAD source.
+    """
+    keys, nodes, sizes = _structure(shape)
+    root = keys[id(shape)]
+
+    # How often each subtree is written: a parent kept inline passes on its
+    # own count, a module body is written once. Parents are always larger
+    # than their children, so visiting by size settles every count in time.
+    emitted = {root: 1}
+    modules: Dict[tuple, str] = {}
+    for key in sorted(sizes, key=sizes.get, reverse=True):
+        count = emitted.get(key, 0)
+        if not count:
+            continue
+        if key != root and count > 1 and sizes[key] >= min_nodes:
+            modules[key] = f'shape_{len(modules) + 1}'
+            count = 1
+        for child in key[3]:
+            emitted[child] = emitted.get(child, 0) + count
+
+    def rebuild(key, as_body: bool = False):
+        if key in modules and not as_body:
+            return OpenSCADObject(modules[key], {})
+        result = copy.copy(nodes[key])
+        result.children = []
+        result.parent = None
+        return result.add([rebuild(child) for child in key[3]])
+
+    definitions = ''.join(
+        f'\nmodule {name}() {{' + indent_scad(rebuild(key, as_body=True)._render()) + '\n}'
+        for key, name in modules.items()
+    )
+    # Inline subtrees are written once per use; a module is one body plus its calls
+    emitted_nodes = sum(count + (key in modules) for key, count in emitted.items())
+    stats = DedupStats(nodes=sizes[root], emitted_nodes=emitted_nodes, modules=len(modules))
+    return definitions, rebuild(root)._render(), stats
+
+
+def indent_scad(source: str) -> str:
+    """SCAD source indented one level, as SolidPython nests child blocks."""
+    return ''.join('\n\t' + line for line in source.strip('\n').split('\n'))
+
+
+def render_scad(shape, file_header: str = '', dedupe: bool = True,
+                quantize_step: Optional[float] = DEFAULT_QUANTIZE_STEP) -> Tuple[str, Optional[DedupStats]]:
+    """SCAD source of ``shape``: transforms folded, numbers quantized and subtrees deduplicated.
+
+    ``quantize_step=None`` keeps full precision.
+    """
+    shape = fold_transforms(shape)
+    if quantize_step:
+        shape = quantize_tree(shape, quantize_step)
+    if file_header and not file_header.endswith('\n'):
+        file_header += '\n'
+    includes = ''.join(_find_include_strings(shape)) + '\n'
+    if not dedupe:
+        return file_header + includes + shape._render(), None
+    modules, body, stats = dedupe_modules(shape)
+    return file_header + includes + modules + ('\n' if modules else '') + body, stats
+
+
+def write_scad(shape, scad_file: str, file_header: str = '$fn = 50;', dedupe: bool = True,
+               quantize_step: Optional[float] = DEFAULT_QUANTIZE_STEP) -> Optional[DedupStats]:
+    """Write ``shape`` to ``scad_file`` through ``render_scad``; returns the dedup stats."""
+    generated = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with stage('scad_emit', file=os.path.basename(scad_file)) as emit_span:
+        source, stats = render_scad(
+            shape, f'// Generated by SolidPython {_get_version()} on {generated}\n{file_header}',
+            dedupe=dedupe, quantize_step=quantize_step
+        )
+        emit_span.set(bytes=len(source), **(stats.to_dict() if stats else {}))
+        tmp_file = f'{scad_file}.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(source)
+        os.replace(tmp_file, scad_file)
+    return stats
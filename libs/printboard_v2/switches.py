@@ -146,6 +146,8 @@ class GamdiasLPSwitch(SwitchInterface):
                 "connection": "matrix"
             }
         ]
+        # Built cavity per conf; serve.py builds it before forking so workers share it
+        self._models: Dict[Tuple, Any] = {}
     
     @property
     def name(self) -> str:
@@ -258,8 +260,13 @@ class GamdiasLPSwitch(SwitchInterface):
         """Get the complete detailed switch body exactly like V1.
         
         Returns the same complex switch body as V1 with all components:
-        legs, pins, body lock, and positioning.
+        legs, pins, body lock, and positioning. The model is built once per
+        conf and shared by every caller, so it must not be modified in place.
         """
+        key = tuple(sorted(self.conf.items()))
+        if key in self._models:
+            return self._models[key]
+
         # Create all components
         switch_footprint = self._create_switch_footprint()
         switch_pin_holes = self._create_switch_pin_holes()
@@ -272,6 +279,7 @@ class GamdiasLPSwitch(SwitchInterface):
             )
         )
         
+        self._models[key] = switch_body
         return switch_body
     
     def get_spacing_x(self) -> float:
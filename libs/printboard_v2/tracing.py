@@ -0,0 +1,124 @@
+"""
+Per-request trace spans in the Chrome trace event format
+
+``trace("generate")`` starts a trace for the current context; ``span(name,
+**attributes)`` inside it records a nested, timed span. When the trace ends
+its spans are handed to an exporter. The default one writes
+``{"traceEvents": [...]}`` JSON files, which chrome://tracing, Perfetto and
+speedscope open directly. Spans outside a trace cost one context lookup.
+
+Spans are complete (``"ph": "X"``) events on the thread that ran them, so
+nesting follows from their timestamps and parallel tile renders show up
+as separate lanes.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class Span:
+    """An open span; ``set`` adds attributes known only once the work is done."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """The spans recorded for one request."""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def add(self, name: str, start: float, end: float, attributes: Dict[str, Any]) -> None:
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': attributes,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'traceEvents': sorted(self.events, key=lambda event: (event['ts'], -event['dur'])),
+            'displayTimeUnit': 'ms',
+            'otherData': dict(self.attributes, trace_id=self.id, name=self.name),
+        }
+
+
+class FileExporter:
+    """Writes each trace to ``<directory>/<name>_<trace id>.json``."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __call__(self, trace: Trace) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{trace.name}_{trace.id}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(trace.to_dict(), f, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('printboard_trace', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def trace(name: str, exporter: Optional[Callable[[Trace], Any]] = None, **attributes) -> Iterator[Trace]:
+    """Record the spans of the enclosed block as one trace, exported on exit.
+
+    The whole block is the trace's root span.
+    """
+    current = Trace(name, attributes)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.add(name, start, time.perf_counter(), current.attributes)
+        _current.reset(token)
+        if exporter is not None:
+            exporter(current)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time the enclosed block as a span of the active trace, if any."""
+    current = _current.get()
+    opened = Span(name, attributes)
+    if current is None:
+        yield opened
+        return
+    start = time.perf_counter()
+    try:
+        yield opened
+    except BaseException as error:
+        opened.set(error=type(error).__name__)
+        raise
+    finally:
+        current.add(name, start, time.perf_counter(), opened.attributes)
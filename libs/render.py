@@ -0,0 +1,230 @@
+"""
+STL rendering for generated SCAD files
+
+Runs OpenSCAD headless, makes sure the result is a binary STL (converting
+ASCII output in a streaming pass when the installed OpenSCAD cannot export
+binary directly) and writes a gzip-compressed sibling that the download
+endpoint serves to clients that accept it.
+"""
+
+import functools
+import gzip
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .printboard_v2.metrics import render_failures, renders_in_progress, stage
+from .printboard_v2.tracing import span
+
+# One binary STL facet: normal, three vertices and the attribute byte count
+FACET_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+BINARY_HEADER_SIZE = 84
+
+logger = logging.getLogger(__name__)
+
+# Facets converted per chunk when streaming ASCII to binary
+_CHUNK_FACETS = 65536
+
+
+def is_binary_stl(path: str) -> bool:
+    """True if the file is laid out as a binary STL.
+
+    ASCII files start with ``solid`` but so do some binary headers, so the
+    facet count in the header is checked against the file size instead.
+    """
+    size = os.path.getsize(path)
+    if size < BINARY_HEADER_SIZE:
+        return False
+    with open(path, 'rb') as f:
+        f.seek(80)
+        count = struct.unpack('<I', f.read(4))[0]
+    return size == BINARY_HEADER_SIZE + count * FACET_DTYPE.itemsize
+
+
+def ascii_stl_to_binary(src: str, dst: str) -> int:
+    """Convert an ASCII STL to binary without loading it whole.
+
+    Returns the number of facets written.
+    """
+    count = 0
+    with open(src, 'r') as fin, open(dst, 'wb') as fout:
+        fout.write(b'printboard binary STL'.ljust(80, b' '))
+        fout.write(struct.pack('<I', 0))
+
+        values: List[str] = []
+        for line in fin:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == 'facet':
+                values.extend(parts[2:5])
+            elif parts[0] == 'vertex':
+                values.extend(parts[1:4])
+            elif parts[0] == 'endfacet' and len(values) >= _CHUNK_FACETS * 12:
+                count += _write_facets(fout, values)
+                values = []
+        count += _write_facets(fout, values)
+
+        fout.seek(80)
+        fout.write(struct.pack('<I', count))
+    return count
+
+
+def _write_facets(fout, values: List[str]) -> int:
+    if not values:
+        return 0
+    floats = np.array(values, dtype='<f4').reshape(-1, 12)
+    facets = np.zeros(len(floats), dtype=FACET_DTYPE)
+    facets['normal'] = floats[:, :3]
+    facets['vertices'] = floats[:, 3:].reshape(-1, 3, 3)
+    fout.write(facets.tobytes())
+    return len(facets)
+
+
+def write_binary_stl(path: str, triangles: np.ndarray) -> int:
+    """Write a ``(triangles, 3, 3)`` array as a binary STL with computed normals.
+
+    Returns the number of facets written.
+    """
+    triangles = np.asarray(triangles, dtype=np.float32)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    facets = np.zeros(len(triangles), dtype=FACET_DTYPE)
+    facets['normal'] = normals
+    facets['vertices'] = triangles
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'printboard binary STL'.ljust(80, b' '))
+        f.write(struct.pack('<I', len(facets)))
+        f.write(facets.tobytes())
+    os.replace(tmp_path, path)
+    return len(facets)
+
+
+def ensure_binary_stl(path: str) -> bool:
+    """Rewrite ``path`` as a binary STL if it is ASCII. Returns True if converted."""
+    if is_binary_stl(path):
+        return False
+    tmp_path = f'{path}.tmp'
+    try:
+        ascii_stl_to_binary(path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def write_gzip_sibling(path: str, level: int = 6) -> str:
+    """Write ``path + '.gz'`` next to the file and return its path."""
+    gz_path = f'{path}.gz'
+    tmp_path = f'{gz_path}.tmp'
+    with open(path, 'rb') as fin, gzip.GzipFile(tmp_path, 'wb', compresslevel=level, mtime=0) as fout:
+        shutil.copyfileobj(fin, fout)
+    os.replace(tmp_path, gz_path)
+    return gz_path
+
+
+@functools.lru_cache(maxsize=1)
+def openscad_available() -> bool:
+    """Whether an ``openscad`` executable is on PATH (looked up once per process)."""
+    return shutil.which('openscad') is not None
+
+
+# Whether the installed OpenSCAD knows --export-format (2021.01 and later),
+# learned from the first render that uses it; None until then
+_export_format_supported: Optional[bool] = None
+
+
+def _rejects_export_format(error: subprocess.CalledProcessError) -> bool:
+    """Whether OpenSCAD failed only because it does not know ``--export-format``."""
+    stderr = (error.stderr or '').lower()
+    return 'export-format' in stderr and any(
+        word in stderr for word in ('unrecognised', 'unrecognized', 'unknown'))
+
+
+def _run_openscad(args: List[str], timeout: int) -> None:
+    """Run OpenSCAD under Xvfb, falling back to plain OpenSCAD without it."""
+    with span('openscad', args=' '.join(args)) as process_span:
+        try:
+            subprocess.run(['xvfb-run', '-a', 'openscad'] + args,
+                           check=True, capture_output=True, text=True, timeout=timeout)
+        except FileNotFoundError:
+            process_span.set(xvfb=False)
+            subprocess.run(['openscad'] + args,
+                           check=True, capture_output=True, text=True, timeout=timeout)
+
+
+def render_stl(scad_file: str, stl_file: str, timeout: int = 60,
+               compress: bool = True,
+               defines: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Render ``scad_file`` to a binary STL (plus ``.gz`` sibling).
+
+    ``defines`` are passed as ``-D name=value`` and override assignments in
+    the file, e.g. ``{'$fn': 8}`` for a coarse preview render.
+    Returns the STL path, or None if OpenSCAD is missing or failed.
+    """
+    global _export_format_supported
+    name = os.path.basename(stl_file)
+    # OpenSCAD writes into a scratch directory next to the target and the
+    # finished STL is moved into place, so a half-written file is never served
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(stl_file)),
+                                     prefix='.render-') as tmp_dir:
+        tmp_file = os.path.join(tmp_dir, name)
+        args = ['-o', tmp_file, scad_file]
+        for key, value in (defines or {}).items():
+            args[:0] = ['-D', f'{key}={value}']
+        renders_in_progress.inc()
+        try:
+            with stage('render', file=name):
+                if _export_format_supported is False:
+                    # OpenSCAD before 2021.01 has no --export-format; convert afterwards
+                    _run_openscad(args, timeout)
+                else:
+                    try:
+                        _run_openscad(['--export-format', 'binstl'] + args, timeout)
+                        _export_format_supported = True
+                    except subprocess.CalledProcessError as e:
+                        # A SCAD file that fails to render is not rendered a second time
+                        if _export_format_supported or not _rejects_export_format(e):
+                            raise
+                        _export_format_supported = False
+                        _run_openscad(args, timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("STL generation timed out for %s", name)
+            render_failures.inc(reason='timeout')
+            return None
+        except subprocess.CalledProcessError as e:
+            logger.warning("OpenSCAD error for %s: %s", name, e.stderr)
+            render_failures.inc(reason='error')
+            return None
+        except FileNotFoundError:
+            logger.warning("OpenSCAD not found - STL generation skipped")
+            render_failures.inc(reason='unavailable')
+            return None
+        finally:
+            renders_in_progress.dec()
+
+        if not os.path.exists(tmp_file) or os.path.getsize(tmp_file) == 0:
+            logger.warning("STL generation failed for %s: file not created or empty", name)
+            render_failures.inc(reason='empty')
+            return None
+
+        ensure_binary_stl(tmp_file)
+        os.replace(tmp_file, stl_file)
+    if compress:
+        write_gzip_sibling(stl_file)
+    logger.info("Successfully generated STL: %s", name)
+    return stl_file
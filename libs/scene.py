@@ -0,0 +1,143 @@
+"""
+Instanced scene description for the 3D viewer
+
+A keyboard is the same switch cavity repeated once per key plus the
+routing tubes. Instead of a monolithic mesh, the viewer gets the cavity
+mesh once, a 4x4 transform per key and the tube polylines, and draws
+them with instanced rendering. The payload size does not depend on the
+key count beyond 16 floats per key, and nothing here needs OpenSCAD on
+the request path: the cavity comes from the cavity library (rendered once
+per switch version) and a box proxy is used when OpenSCAD is unavailable.
+"""
+
+import base64
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .cavities import cavity_version, get_cavity_library
+from .mesh import encode_indexed_mesh, index_triangles, read_stl
+from .printboard_v2.config import KeyboardConfig
+from .printboard_v2.controllers import controller_registry
+from .printboard_v2.layout import LayoutPlanner
+from .printboard_v2.metrics import record_cache, stage
+from .printboard_v2.placement import place_matrix
+from .printboard_v2.routing import RoutePlanner
+from .printboard_v2.switches import SwitchInterface, switch_registry
+
+# Same as the tubes drawn by the V1 pipeline (1.7 mm diameter)
+TUBE_RADIUS = 1.7 / 2
+
+_cavity_cache: Dict[Tuple[str, int, str], Dict[str, Any]] = {}
+_cavity_lock = threading.Lock()
+
+
+def _box_triangles(size: Tuple[float, float, float]) -> np.ndarray:
+    """Triangles of a box centered in x/y and hanging below z = 0."""
+    sx, sy, sz = size
+    xs = (-sx / 2, sx / 2)
+    ys = (-sy / 2, sy / 2)
+    zs = (-sz, 0.0)
+    corners = np.array([[x, y, z] for x in xs for y in ys for z in zs], dtype=np.float32)
+    faces = [
+        (0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+        (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3),
+    ]
+    return corners[np.array(faces)]
+
+
+def cavity_mesh(switch: SwitchInterface, segments: int = 50, timeout: int = 60) -> Dict[str, Any]:
+    """Indexed mesh of one switch cavity from the cavity library.
+
+    Returns ``{'positions', 'indices', 'proxy'}``; ``proxy`` is True when
+    OpenSCAD was unavailable and the switch body box stands in for it.
+    """
+    library = get_cavity_library()
+    key = (switch.name, segments, cavity_version(switch, segments))
+    with _cavity_lock:
+        cached = _cavity_cache.get(key)
+    record_cache('cavity_mesh', cached is not None)
+    if cached is not None:
+        return cached
+
+    path = library.ensure(switch, segments, timeout)
+    proxy = path is None
+    triangles = _box_triangles(switch.specs.body_size) if proxy else read_stl(path)
+    positions, indices = index_triangles(triangles)
+    mesh = {'positions': positions, 'indices': indices, 'proxy': proxy}
+
+    with _cavity_lock:
+        _cavity_cache[key] = mesh
+    return mesh
+
+
+def instance_transforms(x: np.ndarray, y: np.ndarray, angle: np.ndarray) -> np.ndarray:
+    """Column-major 4x4 matrices translating to ``(x, y, 0)`` after rotating by ``angle``.
+
+    This is the ``translate(...)(rotate([0, 0, angle])(cavity))`` used by
+    ``ModelingEngine``, in the layout ``THREE.Matrix4.fromArray`` expects.
+    """
+    radians = np.radians(np.ravel(angle))
+    cos_a, sin_a = np.cos(radians), np.sin(radians)
+    transforms = np.zeros((len(radians), 16))
+    transforms[:, 0] = cos_a
+    transforms[:, 1] = sin_a
+    transforms[:, 4] = -sin_a
+    transforms[:, 5] = cos_a
+    transforms[:, 10] = 1
+    transforms[:, 12] = np.ravel(x)
+    transforms[:, 13] = np.ravel(y)
+    transforms[:, 15] = 1
+    return transforms
+
+
+def build_scene(config: KeyboardConfig, include_cavity: bool = True) -> Dict[str, Any]:
+    """Describe a keyboard as an instanced scene for the web viewer."""
+    switch = switch_registry.get(config.switch_type)
+    controller = controller_registry.get(config.controller_type)
+    key_size = (switch.get_spacing_x(), switch.get_spacing_y())
+
+    transforms = []
+    ranges = {}
+    start = 0
+    for name, matrix_config in config.matrices.items():
+        placement = place_matrix(matrix_config, key_size)
+        transforms.append(instance_transforms(placement.x, placement.y, placement.angle))
+        ranges[name] = [start, start + placement.x.size]
+        start += placement.x.size
+    transforms = np.concatenate(transforms) if transforms else np.zeros((0, 16))
+
+    # Route points are key corners (the LayoutPlan convention); tubes run
+    # through the key centers like the cavities do
+    with stage('layout'):
+        layout_plan = LayoutPlanner(switch).plan_layout(config)
+    with stage('routing'):
+        route_plan = RoutePlanner(controller).plan_routes(layout_plan)
+    tubes: List[Dict[str, Any]] = []
+    for route in route_plan.routes:
+        tubes.append({
+            'name': route.name,
+            'type': route.route_type,
+            'points': [[round(p.x + key_size[0] / 2, 4), round(p.y + key_size[1] / 2, 4), round(p.z, 4)]
+                       for p in route.points]
+        })
+
+    scene = {
+        'instances': {
+            'count': len(transforms),
+            'transforms': np.round(transforms, 4).ravel().tolist(),
+            'matrices': ranges
+        },
+        'tubes': tubes,
+        'tube_radius': TUBE_RADIUS,
+        'bounds': layout_plan.total_bounds
+    }
+    if include_cavity:
+        mesh = cavity_mesh(switch)
+        scene['cavity'] = {
+            'format': 'PBM1',
+            'data': base64.b64encode(encode_indexed_mesh(mesh['positions'], mesh['indices'])).decode('ascii'),
+            'proxy': mesh['proxy']
+        }
+    return scene
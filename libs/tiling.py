@@ -0,0 +1,192 @@
+"""
+Spatial tiling for rendering very large boards
+
+A part made of repeated switch cavities (``PartInstances``) is split into
+a grid of tiles. Each tile is the union of the cavities that reach into it,
+clipped to the tile, so OpenSCAD only ever unions a tile's worth of keys.
+Tiles render in parallel and are either merged into one STL or written as
+separate printable pieces whose edges overlap by the seam width. Merging
+drops the cap faces clipping leaves on both sides of every interior cut,
+so the merged surface has no internal walls.
+"""
+
+import contextvars
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from solid import cube, intersection, translate
+
+from .artifacts import COMPRESSED_SUFFIX
+from .cavities import get_cavity_library, instances_shape
+from .mesh import read_stl
+from .printboard_v2.metrics import render_queue_depth
+from .render import render_stl, write_binary_stl, write_gzip_sibling
+from .printboard_v2.scad import write_scad
+from .printboard_v2.switches import switch_registry
+
+TILE_MODES = ('merge', 'pieces')
+
+# Clip boxes reach this far above and below the board in z
+_CLIP_HEIGHT = 200
+
+# Distance (mm) within which a vertex lies on a cut plane
+_PLANE_TOLERANCE = 1e-3
+
+
+@dataclass
+class Tile:
+    """One tile of a part: its grid cell, clip rectangle and the keys in it."""
+    row: int
+    col: int
+    bounds: Tuple[float, float, float, float]  # min_x, min_y, max_x, max_y
+    keys: np.ndarray  # indices into the part's instances
+
+
+def plan_tiles(x: np.ndarray,
+               y: np.ndarray,
+               tile_size: float,
+               key_radius: float,
+               seam: float = 0.0) -> List[Tile]:
+    """Split keys at ``(x, y)`` into a grid of ``tile_size`` square tiles.
+
+    Clip rectangles are the grid cells grown by ``seam`` on every side, so
+    neighbouring tiles overlap by ``2 * seam``. A key belongs to every tile
+    its footprint circle (``key_radius``) reaches. Empty tiles are dropped.
+    """
+    if tile_size <= 0:
+        raise ValueError("Tile size must be positive")
+    x, y = np.ravel(x), np.ravel(y)
+    min_x, min_y = x.min() - key_radius, y.min() - key_radius
+    cols = max(math.ceil((x.max() + key_radius - min_x) / tile_size), 1)
+    rows = max(math.ceil((y.max() + key_radius - min_y) / tile_size), 1)
+
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            bounds = (
+                min_x + col * tile_size - seam,
+                min_y + row * tile_size - seam,
+                min_x + (col + 1) * tile_size + seam,
+                min_y + (row + 1) * tile_size + seam,
+            )
+            # Distance from each key center to the clip rectangle
+            dx = np.maximum(np.maximum(bounds[0] - x, x - bounds[2]), 0)
+            dy = np.maximum(np.maximum(bounds[1] - y, y - bounds[3]), 0)
+            keys = np.nonzero(np.hypot(dx, dy) < key_radius)[0]
+            if len(keys):
+                tiles.append(Tile(row=row, col=col, bounds=bounds, keys=keys))
+    return tiles
+
+
+def tile_shape(cavity, instances, tile: Tile):
+    """SolidPython geometry of one tile: its keys' cavities clipped to the tile."""
+    min_x, min_y, max_x, max_y = tile.bounds
+    clip = translate([min_x, min_y, -_CLIP_HEIGHT / 2])(
+        cube([max_x - min_x, max_y - min_y, _CLIP_HEIGHT])
+    )
+    return intersection()(clip, instances_shape(cavity, instances, tile.keys))
+
+
+def _cap_faces(triangles: np.ndarray, axis: int, plane: float, direction: int) -> np.ndarray:
+    """Mask of triangles lying in the cut plane ``axis == plane`` and facing ``direction``."""
+    on_plane = np.all(np.abs(triangles[:, :, axis] - plane) < _PLANE_TOLERANCE, axis=1)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    return on_plane & (normals[:, axis] * direction > 0)
+
+
+def _area(triangles: np.ndarray) -> float:
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    return float(np.linalg.norm(normals, axis=1).sum() / 2)
+
+
+def merge_tiles(tiles: List[Tile], tile_triangles: List[np.ndarray]) -> np.ndarray:
+    """Join tiles clipped at shared cell edges into one closed surface.
+
+    Clipping caps each tile where the part crosses a cell edge, so every
+    interior cut holds two coincident caps facing each other. Both are
+    dropped when they cover the same area; a real wall of the part lying
+    exactly on a cut has no matching cap and is kept.
+    """
+    tile_triangles = [np.asarray(triangles, dtype=np.float64) for triangles in tile_triangles]
+    keep = [np.ones(len(triangles), dtype=bool) for triangles in tile_triangles]
+    index = {(tile.row, tile.col): i for i, tile in enumerate(tiles)}
+    for i, tile in enumerate(tiles):
+        # Right neighbour shares x = max_x, the one below shares y = max_y
+        for axis, neighbour in ((0, (tile.row, tile.col + 1)), (1, (tile.row + 1, tile.col))):
+            j = index.get(neighbour)
+            if j is None:
+                continue
+            plane = tile.bounds[axis + 2]
+            own = _cap_faces(tile_triangles[i], axis, plane, 1)
+            other = _cap_faces(tile_triangles[j], axis, plane, -1)
+            own_area = _area(tile_triangles[i][own])
+            other_area = _area(tile_triangles[j][other])
+            if own_area and abs(own_area - other_area) <= 1e-3 * own_area:
+                keep[i] &= ~own
+                keep[j] &= ~other
+    return np.concatenate([triangles[mask] for triangles, mask in zip(tile_triangles, keep)])
+
+
+def render_tiled(instances,
+                 stl_file: str,
+                 tile_size: float,
+                 mode: str = 'merge',
+                 seam: float = 0.0,
+                 workers: Optional[int] = None,
+                 timeout: int = 60,
+                 file_header: str = '$fn = 50;') -> List[str]:
+    """Render a part tile by tile in parallel.
+
+    ``merge`` writes one STL at ``stl_file`` (tiles clipped at the exact
+    cell edges and joined by ``merge_tiles``); ``pieces`` writes
+    ``<stem>_tile_<row>_<col>.stl`` next to it, overlapping by
+    ``2 * seam``. Returns the STL paths written, or an empty list, leaving
+    no files behind, if any tile failed to render.
+    """
+    if mode not in TILE_MODES:
+        raise ValueError(f"Tile mode must be one of {', '.join(TILE_MODES)}")
+    switch = switch_registry.get(instances.switch_type)
+    key_radius = math.hypot(switch.get_spacing_x(), switch.get_spacing_y()) / 2
+    tiles = plan_tiles(instances.x, instances.y, tile_size, key_radius,
+                       seam=seam if mode == 'pieces' else 0.0)
+    # Import the pre-rendered cavity when available instead of its full CSG
+    cavity = get_cavity_library().import_shape(switch, timeout=timeout) or switch.get_3d_model()
+    stem = stl_file[:-len('.stl')] if stl_file.endswith('.stl') else stl_file
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        def render_tile(tile: Tile) -> Optional[str]:
+            render_queue_depth.dec()
+            name = f'tile_{tile.row}_{tile.col}'
+            scad_file = os.path.join(tmp_dir, f'{name}.scad')
+            write_scad(tile_shape(cavity, instances, tile), scad_file, file_header=file_header)
+            if mode == 'pieces':
+                target = f'{stem}_{name}.stl'
+            else:
+                target = os.path.join(tmp_dir, f'{name}.stl')
+            return render_stl(scad_file, target, timeout=timeout, compress=mode == 'pieces')
+
+        # Tiles waiting for a thread count towards the render queue; each runs
+        # in a copy of this context so stage timings reach the caller
+        render_queue_depth.inc(len(tiles))
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            results = list(pool.map(lambda tile: context.copy().run(render_tile, tile), tiles))
+
+        if not results or any(result is None for result in results):
+            if mode == 'pieces':
+                for path in filter(None, results):
+                    for leftover in (path, path + COMPRESSED_SUFFIX):
+                        if os.path.exists(leftover):
+                            os.remove(leftover)
+            return []
+        if mode == 'pieces':
+            return results
+
+        write_binary_stl(stl_file, merge_tiles(tiles, [read_stl(path) for path in results]))
+    write_gzip_sibling(stl_file)
+    return [stl_file]
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+Production entry point: preloaded gunicorn pools for previews and renders
+
+    python serve.py              # preview pool on :5000, render pool on :5001
+    python serve.py --single     # one pool on :5000 serving every route
+
+The app, the V1 and V2 generation stacks and the switch geometry are
+loaded once in this process, and ``gc.freeze()`` moves them out of the
+collector's reach before any fork. Workers then share that memory
+copy-on-write instead of each importing and building it again (the
+collector would otherwise touch and copy every page).
+
+Previews are short and CPU-bound and renders wait minutes on OpenSCAD, so
+they run in separate pools and a slow render never holds a preview
+worker. Both pools serve the whole app; a front proxy sends the routes in
+``RENDER_ROUTES`` to the render pool (see ``deploy/nginx.conf``). Pool
+sizes follow the CPUs available to the container: ``2 * cores + 1``
+preview workers and one render worker per core, each render worker
+tiling with one thread per spare core.
+"""
+
+import argparse
+import gc
+import importlib
+import math
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional
+
+from gunicorn.app.base import BaseApplication
+
+# Served by the render pool behind the proxy (nginx location regexes)
+RENDER_ROUTES = (
+    r'^/api/(v2/)?keyboard/generate$',
+    r'^/api/keyboard/preview-mesh/',
+    r'^/api/v2/keyboard/scene$',
+)
+
+
+def _cgroup_cpu_limit(root: str = '/sys/fs/cgroup') -> Optional[float]:
+    """CPUs allowed by a cgroup v2 ``cpu.max`` or v1 CFS quota, or None without a limit."""
+    try:
+        with open(os.path.join(root, 'cpu.max')) as f:
+            quota, period = f.read().split()
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(root, 'cpu', 'cpu.cfs_quota_us')) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, 'cpu', 'cpu.cfs_period_us')) as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cores(cgroup_root: str = '/sys/fs/cgroup') -> int:
+    """CPUs this process may run on: its affinity mask, capped by a cgroup CPU quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit(cgroup_root)
+    if limit:
+        cores = min(cores, max(1, math.ceil(limit)))
+    return max(1, cores)
+
+
+def pool_sizes(cores: int) -> Dict[str, int]:
+    return {'preview': 2 * cores + 1, 'render': cores}
+
+
+def preload():
+    """Import the app and build the switch and controller geometry once, before forking."""
+    from app import DEFERRED_MODULES, app
+    from libs.printboard_v2.controllers import controller_registry
+    from libs.printboard_v2.switches import switch_registry
+
+    # Workers would otherwise each import these on their first generate
+    for module in DEFERRED_MODULES:
+        importlib.import_module(module)
+    for name in switch_registry.list_switches():
+        switch_registry.get(name).get_3d_model()
+    for name in controller_registry.list_controllers():
+        controller_registry.get(name)
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+class Pool(BaseApplication):
+    """A gunicorn arbiter serving an already loaded WSGI app."""
+
+    def __init__(self, application, options: Dict[str, Any]):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            # Settings the installed gunicorn predates, such as control_socket, are left out
+            if key in self.cfg.settings:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def pool_options(name: str, bind: str, workers: int, timeout: int, max_requests: int) -> Dict[str, Any]:
+    return {
+        'bind': bind,
+        'workers': workers,
+        'worker_class': 'sync',
+        'timeout': timeout,
+        'graceful_timeout': min(timeout, 60),
+        'preload_app': True,
+        'max_requests': max_requests,
+        'max_requests_jitter': max(1, max_requests // 10),
+        'proc_name': f'printboard-{name}',
+        'accesslog': '-',
+        # gunicorn's default control socket path is shared; give each pool its own
+        'control_socket': os.path.join(os.environ.get('XDG_RUNTIME_DIR') or os.path.expanduser('~/.gunicorn'),
+                                       f'printboard-{name}.ctl'),
+    }
+
+
+def run_pools(application, pools: List[Dict[str, Any]]) -> int:
+    """Run each pool's arbiter in a forked child; stop all of them when one exits."""
+    if len(pools) == 1:
+        Pool(application, pools[0]).run()
+        return 0
+
+    children = {}
+    for options in pools:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                Pool(application, options).run()
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            finally:
+                os._exit(code)
+        children[pid] = options['proc_name']
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, forward)
+
+    pid, status = os.wait()
+    name = children.pop(pid)
+    code = os.waitstatus_to_exitcode(status)
+    if children:
+        print(f'{name} exited with status {code}; stopping the other pools', file=sys.stderr)
+        forward(signal.SIGTERM, None)
+        for pid in list(children):
+            os.waitpid(pid, 0)
+    return code
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    cores = available_cores()
+    sizes = pool_sizes(cores)
+    env = os.environ
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--host', default=env.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(env.get('PORT', 5000)), help='preview pool port')
+    parser.add_argument('--render-port', type=int, default=int(env.get('RENDER_PORT', 5001)), help='render pool port')
+    parser.add_argument('--preview-workers', type=int, default=int(env.get('PREVIEW_POOL_WORKERS', sizes['preview'])))
+    parser.add_argument('--render-workers', type=int, default=int(env.get('RENDER_POOL_WORKERS', sizes['render'])))
+    parser.add_argument('--preview-timeout', type=int, default=int(env.get('PREVIEW_POOL_TIMEOUT', 60)))
+    parser.add_argument('--render-timeout', type=int, default=int(env.get('RENDER_POOL_TIMEOUT', 900)))
+    parser.add_argument('--single', action='store_true', default=env.get('SERVE_SINGLE_POOL', '') == '1',
+                        help='one pool of --preview-workers serving every route on --port')
+    args = parser.parse_args(argv)
+
+    # Tile renders of concurrent requests share the cores instead of each taking all of them
+    env.setdefault('RENDER_WORKERS', str(max(1, cores // max(1, args.render_workers))))
+    application = preload()
+
+    if args.single:
+        pools = [pool_options('web', f'{args.host}:{args.port}', args.preview_workers,
+                              args.render_timeout, 1000)]
+    else:
+        pools = [
+            pool_options('preview', f'{args.host}:{args.port}', args.preview_workers, args.preview_timeout, 1000),
+            pool_options('render', f'{args.host}:{args.render_port}', args.render_workers, args.render_timeout, 100),
+        ]
+    print(f"{cores} cores: " + ', '.join(f"{pool['proc_name']} on {pool['bind']} with {pool['workers']} workers"
+                                         for pool in pools), file=sys.stderr, flush=True)
+    return run_pools(application, pools)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,9 @@ class STLViewer {
         this.renderer = null;
         this.controls = null;
         this.mesh = null;
+        this.meshBox = null;
+        this.loadRequest = 0;
+        this.fullLoaded = false;
         this.init();
     }
     
@@ -64,32 +67,8 @@ class STLViewer {
         loader.load(
             url,
             (geometry) => {
-                // Remove previous mesh
-                if (this.mesh) {
-                    this.scene.remove(this.mesh);
-                }
-                
-                // Create material
-                const material = new THREE.MeshPhongMaterial({
-                    color: 0x667eea,
-                    shininess: 100
-                });
-                
-                // Create mesh
-                this.mesh = new THREE.Mesh(geometry, material);
-                this.mesh.castShadow = true;
-                this.mesh.receiveShadow = true;
-                
-                // Center the geometry
-                geometry.computeBoundingBox();
-                const center = geometry.boundingBox.getCenter(new THREE.Vector3());
-                geometry.translate(-center.x, -center.y, -center.z);
-                
-                // Add to scene
-                this.scene.add(this.mesh);
-                
-                // Adjust camera to fit model
-                this.fitCameraToMesh();
+                this.fullLoaded = true;
+                this.showGeometry(geometry);
             },
             (progress) => {
                 console.log('Loading progress:', (progress.loaded / progress.total * 100) + '%');
@@ -101,11 +80,214 @@ class STLViewer {
         );
     }
     
+    // Load the indexed mesh served by /api/keyboard/viewer/, falling back to
+    // the print STL if it is not available
+    loadMesh(url, fallbackUrl) {
+        const request = ++this.loadRequest;
+        STLViewer.fetchIndexedMesh(url)
+            .then((geometry) => {
+                if (request === this.loadRequest) {
+                    this.fullLoaded = true;
+                    this.showGeometry(geometry);
+                }
+            })
+            .catch((error) => {
+                if (request !== this.loadRequest) {
+                    return;
+                }
+                console.warn('Indexed mesh unavailable, loading STL:', error);
+                if (fallbackUrl) {
+                    this.loadSTL(fallbackUrl);
+                } else {
+                    this.showError('Failed to load 3D model');
+                }
+            });
+    }
+    
+    // Show the decimated preview mesh first, then replace it with the
+    // full-resolution mesh once that has loaded
+    loadProgressive(previewUrl, meshUrl, stlUrl) {
+        this.fullLoaded = false;
+        this.loadMesh(meshUrl, stlUrl);
+        const request = this.loadRequest;
+        STLViewer.fetchIndexedMesh(previewUrl)
+            .then((geometry) => {
+                if (request === this.loadRequest && !this.fullLoaded) {
+                    this.showGeometry(geometry);
+                }
+            })
+            .catch((error) => console.warn('Preview mesh unavailable:', error));
+    }
+    
+    // Fetch an indexed mesh, polling while the server answers 202 because
+    // the STL is still rendering in the background
+    static fetchIndexedMesh(url, retries = 600) {
+        return fetch(url)
+            .then((response) => {
+                if (response.status === 202 && retries > 0) {
+                    const delay = (parseFloat(response.headers.get('Retry-After')) || 1) * 1000;
+                    return new Promise((resolve) => setTimeout(resolve, delay))
+                        .then(() => STLViewer.fetchIndexedMesh(url, retries - 1));
+                }
+                if (response.status !== 200) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.arrayBuffer()
+                    .then((buffer) => STLViewer.parseIndexedMesh(buffer));
+            });
+    }
+    
+    // Draw the instanced scene from /api/v2/keyboard/scene: one cavity
+    // geometry shared by every key, plus the routing tubes
+    loadScene(url, config) {
+        const request = ++this.loadRequest;
+        fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(config)
+        })
+            .then((response) => response.json())
+            .then((result) => {
+                if (!result.success) {
+                    throw new Error(result.error);
+                }
+                if (request === this.loadRequest) {
+                    this.showScene(result.scene);
+                }
+            })
+            .catch((error) => {
+                console.error('Error loading scene:', error);
+                this.showError('Failed to load 3D scene');
+            });
+    }
+    
+    showScene(scene) {
+        const binary = atob(scene.cavity.data);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        const cavity = STLViewer.parseIndexedMesh(bytes.buffer);
+        cavity.computeVertexNormals();
+        
+        const group = new THREE.Group();
+        const material = new THREE.MeshPhongMaterial({
+            color: scene.cavity.proxy ? 0x9aa5d6 : 0x667eea,
+            shininess: 100,
+            flatShading: true
+        });
+        const keys = new THREE.InstancedMesh(cavity, material, scene.instances.count);
+        const matrix = new THREE.Matrix4();
+        const box = new THREE.Box3();
+        cavity.computeBoundingBox();
+        for (let i = 0; i < scene.instances.count; i++) {
+            matrix.fromArray(scene.instances.transforms, i * 16);
+            keys.setMatrixAt(i, matrix);
+            box.union(cavity.boundingBox.clone().applyMatrix4(matrix));
+        }
+        keys.instanceMatrix.needsUpdate = true;
+        group.add(keys);
+        
+        const tubeMaterial = new THREE.MeshPhongMaterial({ color: 0xe0a040 });
+        scene.tubes.forEach((tube) => {
+            const points = tube.points.map((p) => new THREE.Vector3(p[0], p[1], p[2]));
+            const path = new THREE.CurvePath();
+            for (let i = 1; i < points.length; i++) {
+                path.add(new THREE.LineCurve3(points[i - 1], points[i]));
+            }
+            const geometry = new THREE.TubeGeometry(path, 8 * points.length, scene.tube_radius, 8, false);
+            group.add(new THREE.Mesh(geometry, tubeMaterial));
+        });
+        
+        this.showObject(group, box);
+    }
+    
+    // Decode the PBM1 format written by libs/mesh.py
+    static parseIndexedMesh(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(
+            view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+        );
+        if (magic !== 'PBM1') {
+            throw new Error('Not an indexed mesh');
+        }
+        const quantized = (view.getUint32(4, true) & 1) !== 0;
+        const vertexCount = view.getUint32(8, true);
+        const indexCount = view.getUint32(12, true);
+        let offset = 16;
+        
+        let positions;
+        if (quantized) {
+            const origin = [0, 1, 2].map((i) => view.getFloat32(offset + i * 4, true));
+            const scale = [0, 1, 2].map((i) => view.getFloat32(offset + 12 + i * 4, true));
+            offset += 24;
+            const q = new Uint16Array(buffer.slice(offset, offset + vertexCount * 6));
+            positions = new Float32Array(vertexCount * 3);
+            for (let i = 0; i < q.length; i++) {
+                positions[i] = origin[i % 3] + q[i] * scale[i % 3];
+            }
+            offset += vertexCount * 6;
+        } else {
+            positions = new Float32Array(buffer, offset, vertexCount * 3);
+            offset += vertexCount * 12;
+        }
+        offset += (4 - offset % 4) % 4;
+        const indices = new Uint32Array(buffer, offset, indexCount);
+        
+        const geometry = new THREE.BufferGeometry();
+        geometry.setAttribute('position', new THREE.BufferAttribute(positions, 3));
+        geometry.setIndex(new THREE.BufferAttribute(indices, 1));
+        return geometry;
+    }
+    
+    showGeometry(geometry) {
+        // Create material; flat shading keeps the faceted look of shared vertices
+        const material = new THREE.MeshPhongMaterial({
+            color: 0x667eea,
+            shininess: 100,
+            flatShading: true
+        });
+        if (!geometry.getAttribute('normal')) {
+            geometry.computeVertexNormals();
+        }
+        
+        // Create mesh
+        const mesh = new THREE.Mesh(geometry, material);
+        mesh.castShadow = true;
+        mesh.receiveShadow = true;
+        this.showObject(mesh);
+    }
+    
+    // ``box`` overrides the bounding box of ``object`` (three.js r128 does
+    // not include instance transforms in it)
+    showObject(object, box = null) {
+        // Remove previous model
+        if (this.mesh) {
+            this.scene.remove(this.mesh);
+            this.mesh.traverse((child) => {
+                if (child.geometry) {
+                    child.geometry.dispose();
+                }
+            });
+        }
+        
+        // Center the model
+        this.mesh = object;
+        this.meshBox = box || new THREE.Box3().setFromObject(object);
+        const center = this.meshBox.getCenter(new THREE.Vector3());
+        object.position.sub(center);
+        
+        // Add to scene
+        this.scene.add(object);
+        
+        // Adjust camera to fit model
+        this.fitCameraToMesh();
+    }
+    
     fitCameraToMesh() {
         if (!this.mesh) return;
         
-        const box = new THREE.Box3().setFromObject(this.mesh);
-        const size = box.getSize(new THREE.Vector3());
+        const size = this.meshBox.getSize(new THREE.Vector3());
         const maxDim = Math.max(size.x, size.y, size.z);
         
         const distance = maxDim * 2;
@@ -0,0 +1,135 @@
+"""Tests for the artifact index and quota eviction."""
+import json
+import os
+import tempfile
+import time
+
+import pytest
+
+from libs.artifacts import ArtifactStore
+from app import app
+
+
+def write_file(directory, name, size):
+    with open(os.path.join(directory, name), 'wb') as f:
+        f.write(b'x' * size)
+
+
+@pytest.fixture
+def output_dir():
+    return tempfile.mkdtemp()
+
+
+def test_existing_files_are_indexed_on_first_use(output_dir):
+    """Test that a new index picks up files already in the directory."""
+    write_file(output_dir, 'a_matrix.scad', 10)
+    write_file(output_dir, 'a_matrix.stl', 20)
+    write_file(output_dir, 'notes.txt', 5)
+
+    store = ArtifactStore(output_dir)
+    files, total = store.list()
+
+    assert total == 2
+    assert {f['name'] for f in files} == {'a_matrix.scad', 'a_matrix.stl'}
+    assert store.total_bytes() == 30
+
+
+def test_list_pagination_and_filters(output_dir):
+    """Test paginated, filtered listing."""
+    store = ArtifactStore(output_dir)
+    for i in range(5):
+        name = f'kb{i}_matrix.scad'
+        write_file(output_dir, name, 1)
+        store.record(name, keyboard=f'kb{i}')
+    write_file(output_dir, 'kb0_matrix.stl', 1)
+    store.record('kb0_matrix.stl', keyboard='kb0')
+
+    files, total = store.list(page=1, per_page=2, file_type='scad')
+    assert total == 5
+    assert len(files) == 2
+
+    files, total = store.list(page=3, per_page=2, file_type='scad')
+    assert len(files) == 1
+
+    files, total = store.list(keyboard='kb0')
+    assert total == 2
+
+    files, total = store.list(query='kb3')
+    assert [f['name'] for f in files] == ['kb3_matrix.scad']
+
+    files, total = store.list(query='%')
+    assert total == 0
+
+
+def test_evicts_least_recently_downloaded(output_dir):
+    """Test quota eviction order and protection of fresh files."""
+    store = ArtifactStore(output_dir, quota_bytes=250)
+    for name in ('old.stl', 'downloaded.stl', 'new.stl'):
+        write_file(output_dir, name, 100)
+        store.record(name)
+        time.sleep(0.01)
+    store.touch('old.stl')
+
+    evicted = store.evict(protect=['new.stl'])
+
+    assert evicted == ['downloaded.stl']
+    assert not os.path.exists(os.path.join(output_dir, 'downloaded.stl'))
+    assert os.path.exists(os.path.join(output_dir, 'old.stl'))
+    assert store.total_bytes() == 200
+
+
+def test_no_quota_never_evicts(output_dir):
+    """Test that a zero quota means unlimited."""
+    store = ArtifactStore(output_dir)
+    write_file(output_dir, 'a.stl', 1000)
+    store.record('a.stl')
+    assert store.evict() == []
+
+
+def test_files_api_lists_generated_files():
+    """Test that generated files show up in the paginated files API."""
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+
+    with app.test_client() as client:
+        response = client.post('/api/keyboard/generate',
+                               data=json.dumps({'name': 'indexed', 'rows': 2, 'cols': 2}),
+                               content_type='application/json')
+        assert response.status_code == 200
+        scad_file = json.loads(response.data)['scad_files'][0]
+
+        data = json.loads(client.get('/api/keyboard/files?type=scad&per_page=10').data)
+        assert data['success'] is True
+        assert data['total'] == 1
+        assert data['files'][0]['name'] == scad_file
+        assert data['files'][0]['type'] == 'SCAD'
+
+        data = json.loads(client.get('/api/keyboard/files?type=stl').data)
+        assert data['files'] == []
+
+
+def test_compressed_copy_counts_and_is_evicted(output_dir):
+    """Test that the .gz sibling counts toward the quota and is removed with its file."""
+    store = ArtifactStore(output_dir, quota_bytes=50)
+    write_file(output_dir, 'old.stl', 30)
+    write_file(output_dir, 'old.stl.gz', 10)
+    store.record('old.stl')
+    write_file(output_dir, 'new.stl', 30)
+    store.record('new.stl')
+
+    assert store.get('old.stl')['size'] == 40
+    assert store.evict(protect=['new.stl']) == ['old.stl']
+    assert not os.path.exists(os.path.join(output_dir, 'old.stl.gz'))
+
+
+def test_pending_marker_is_evicted(output_dir):
+    """Test that a leftover render marker is removed with its file."""
+    store = ArtifactStore(output_dir, quota_bytes=50)
+    write_file(output_dir, 'old.stl', 30)
+    store.record('old.stl')
+    write_file(output_dir, 'old.stl.pending', 0)
+    write_file(output_dir, 'new.stl', 30)
+    store.record('new.stl')
+
+    assert store.evict(protect=['new.stl']) == ['old.stl']
+    assert not os.path.exists(os.path.join(output_dir, 'old.stl.pending'))
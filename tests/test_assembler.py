@@ -0,0 +1,70 @@
+"""Tests for the NumPy STL assembly fast path."""
+import os
+import tempfile
+
+import numpy as np
+
+from libs.assembler import assemble_stl, footprints_overlap, transform_instances
+from libs.mesh import read_stl
+from libs.printboard_v2 import KeyboardConfig, MatrixConfig
+from libs.printboard_v2.builder import keyboard_builder
+from libs.printboard_v2.placement import place_matrix
+from libs.scene import _box_triangles
+
+# Stand-in for a rendered switch cavity: the 14.5 mm switch body box
+CAVITY = _box_triangles((14.5, 14.5, 8))
+
+
+def test_transform_instances_rotates_then_translates():
+    """Test that copies are rotated about the origin and then moved."""
+    triangle = np.array([[[1, 0, 0], [0, 1, 0], [0, 0, 1]]], dtype=np.float32)
+    placed = transform_instances(triangle, [10, 0], [0, 5], [0, 90])
+
+    assert placed.shape == (2, 3, 3)
+    assert np.allclose(placed[0], triangle[0] + [10, 0, 0])
+    assert np.allclose(placed[1], [[0, 6, 0], [-1, 5, 0], [0, 5, 1]], atol=1e-6)
+
+
+def test_grid_footprints_do_not_overlap():
+    """Test that a plain grid takes the fast path."""
+    placement = place_matrix(MatrixConfig(rows=4, cols=6), (18.5, 18.5))
+    assert not footprints_overlap(CAVITY, placement.x, placement.y, placement.angle)
+
+
+def test_overlapping_footprints_detected():
+    """Test that overlapping and rotated-into-neighbour cavities are caught."""
+    assert footprints_overlap(CAVITY, [0, 10], [0, 0], [0, 0])
+    # At 45 degrees the box reaches 10.25 mm from its center, into a neighbour 16 mm away
+    assert footprints_overlap(CAVITY, [0, 16], [0, 0], [45, 0])
+    assert not footprints_overlap(CAVITY, [0, 16], [0, 0], [0, 0])
+
+
+def test_assemble_stl_matches_instances():
+    """Test that the assembled STL holds one transformed cavity per key."""
+    placement = place_matrix(MatrixConfig(rows=2, cols=3, rotation_angle=15), (18.5, 18.5))
+    stl_file = os.path.join(tempfile.mkdtemp(), 'part.stl')
+
+    assert assemble_stl(CAVITY, placement.x, placement.y, placement.angle, stl_file) == stl_file
+    assert os.path.exists(stl_file + '.gz')
+    triangles = read_stl(stl_file)
+    assert triangles.shape == (6 * len(CAVITY), 3, 3)
+    expected = transform_instances(CAVITY, placement.x, placement.y, placement.angle)
+    assert np.allclose(triangles, expected, atol=1e-5)
+
+
+def test_assemble_stl_falls_back_on_overlap():
+    """Test that overlapping layouts are left to the CSG render."""
+    stl_file = os.path.join(tempfile.mkdtemp(), 'part.stl')
+    assert assemble_stl(CAVITY, [0, 5], [0, 0], [0, 0], stl_file) is None
+    assert not os.path.exists(stl_file)
+
+
+def test_v2_parts_carry_instances():
+    """Test that V2 matrix parts describe their cavities as instances."""
+    config = KeyboardConfig(name='instances_test', matrices={'main': MatrixConfig(rows=3, cols=4)})
+    result = keyboard_builder.build_keyboard(config)
+
+    instances = result.parts[0].instances
+    assert instances.switch_type == 'gamdias_lp'
+    assert len(instances.x) == len(instances.y) == len(instances.angle) == 12
+    assert instances.x[0] == 18.5 / 2
@@ -0,0 +1,55 @@
+"""Tests for the benchmark suite runner and baseline comparison."""
+import json
+import os
+import tempfile
+
+from benchmarks.suite import CASES, SIZES, compare, main, run_suite
+
+
+def test_every_case_runs_on_the_smallest_layout():
+    """Test that each case runs once on the 5x5 layout."""
+    results = run_suite(sizes=['5x5'], repeat=1)
+    assert set(results) == {f'{name}[5x5]' for name in CASES}
+    assert all(result['runs'] == 1 and result['median'] > 0 for result in results.values())
+
+
+def test_sizes_cover_the_requested_layouts():
+    """Test the key counts of the synthetic layouts."""
+    counts = {name: sum(len(row) for row in size.keys) for name, size in SIZES.items()}
+    assert counts == {'5x5': 25, '4x12': 48, '65%': 68, '100': 100, '500': 500}
+
+
+def test_compare_flags_slowdowns_beyond_threshold():
+    """Test the regression threshold, the noise floor and unmatched cases."""
+    baseline = {'a[5x5]': {'median': 1.0}, 'b[5x5]': {'median': 1.0},
+                'tiny[5x5]': {'median': 0.0001}, 'gone[5x5]': {'median': 1.0}}
+    results = {'a[5x5]': {'median': 1.2}, 'b[5x5]': {'median': 1.3},
+               'tiny[5x5]': {'median': 0.0005}, 'new[5x5]': {'median': 1.0}}
+
+    rows = {row['name']: row for row in compare(results, baseline, threshold=0.25, min_delta=0.001)}
+    assert set(rows) == {'a[5x5]', 'b[5x5]', 'tiny[5x5]'}
+    assert not rows['a[5x5]']['regression']
+    assert rows['b[5x5]']['regression']
+    assert not rows['tiny[5x5]']['regression']
+
+
+def test_main_writes_results_and_fails_on_regression(capsys):
+    """Test the results file and the exit status against a faster baseline."""
+    directory = tempfile.mkdtemp()
+    output = os.path.join(directory, 'results.json')
+    baseline = os.path.join(directory, 'baseline.json')
+    args = ['--sizes', '5x5', '--cases', 'plan_tubes', '--repeat', '1', '--output', output, '--baseline', baseline]
+
+    assert main(args + ['--save-baseline']) == 0
+    with open(output) as f:
+        data = json.load(f)
+    assert set(data['results']) == {'plan_tubes[5x5]'}
+    assert data['settings']['seed'] == 0
+
+    with open(baseline) as f:
+        stored = json.load(f)
+    stored['results']['plan_tubes[5x5]']['median'] /= 10
+    with open(baseline, 'w') as f:
+        json.dump(stored, f)
+    assert main(args) == 1
+    assert 'REGRESSION' in capsys.readouterr().out
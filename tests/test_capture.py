@@ -0,0 +1,114 @@
+"""Tests for request capture and replay."""
+import json
+import os
+import tempfile
+
+import pytest
+
+from app import app
+from benchmarks.replay import main as replay_main, replay
+from libs import printboard as kb
+from libs.switches import gamdias_lp as switch
+from libs.printboard_v2.capture import CaptureLog, read_captures
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    app.config['CAPTURE_DIR'] = tempfile.mkdtemp()
+    app.config['CAPTURE_SAMPLE_RATE'] = 0.0
+    app.config['CAPTURE_SLOW_SECONDS'] = 60.0
+    with app.test_client() as client:
+        yield client
+    app.config['CAPTURE_DIR'] = ''
+
+
+def captures():
+    directory = app.config['CAPTURE_DIR']
+    return [record for name in sorted(os.listdir(directory))
+            for record in read_captures(os.path.join(directory, name))]
+
+
+def post(client, endpoint, body, **kwargs):
+    return client.post(endpoint, data=json.dumps(body), content_type='application/json', **kwargs)
+
+
+def test_capture_reasons():
+    """Test that slow and failed requests are always kept and fast ones sampled."""
+    log = CaptureLog(tempfile.mkdtemp(), sample_rate=0.0, slow_seconds=1.0)
+    assert log.reason(2.0, failed=False) == 'slow'
+    assert log.reason(0.1, failed=True) == 'error'
+    assert log.reason(0.1, failed=False) is None
+    log.sample_rate = 1.0
+    assert log.reason(0.1, failed=False) == 'sampled'
+
+
+def test_slow_requests_are_captured_with_timings(client):
+    """Test the captured payload, seed, stage timings and outcome of a slow request."""
+    app.config['CAPTURE_SLOW_SECONDS'] = 0.0
+    response = post(client, '/api/keyboard/generate?profile=0',
+                    {'name': 'captured', 'rows': 2, 'cols': 3, 'profile': False},
+                    headers={'X-Routing-Seed': '7'})
+
+    (record,) = captures()
+    assert response.headers['X-Capture-Id'] == record['id']
+    assert record['reason'] == 'slow'
+    assert record['endpoint'] == 'generate_keyboard'
+    assert (record['method'], record['path'], record['status']) == ('POST', '/api/keyboard/generate', 200)
+    assert record['body'] == {'cols': 3, 'name': 'captured', 'rows': 2}
+    assert record['routing_seed'] == 7
+    assert {'layout', 'routing', 'geometry', 'scad_emit'} <= set(record['timings'])
+
+
+def test_fast_requests_are_sampled_and_errors_kept(client):
+    """Test that unsampled fast requests leave no capture but failures do."""
+    post(client, '/api/v2/keyboard/preview', {'name': 'fast', 'rows': 2, 'cols': 2})
+    assert captures() == []
+
+    response = post(client, '/api/v2/keyboard/preview', {'name': 'broken', 'rows': 0, 'cols': 2})
+    (record,) = captures()
+    assert response.status_code == 400
+    assert record['reason'] == 'error' and record['success'] is False and record['error']
+
+
+def test_capture_disabled_by_default(client):
+    """Test that nothing is captured without CAPTURE_DIR."""
+    app.config['CAPTURE_DIR'] = ''
+    response = post(client, '/api/v2/keyboard/preview', {'name': 'plain', 'rows': 0, 'cols': 2})
+    assert 'X-Capture-Id' not in response.headers
+
+
+def test_routing_seed_makes_routing_repeatable():
+    """Test that a seeded routing run picks the same traces every time."""
+    layout = {
+        "name": "seeded",
+        "controller_placement": ("left", "top"),
+        "matrixes": {"main": {"offset": (0, 0), "keys": [["switch"] * 4] * 3}},
+        "switch": switch,
+        "empty_switch": kb.empty_sw(switch),
+    }
+    matrixes = {'main': kb.fix_rotation_matrix_data(kb.plan_matrix(layout), layout)}
+    runs = []
+    for _ in range(2):
+        with kb.routing_seed(3):
+            runs.append(kb.plan_tubes(layout, matrixes))
+    assert runs[0] == runs[1]
+
+
+def test_replay_reproduces_captured_generation(client, capsys):
+    """Test that replaying a capture rebuilds identical SCAD and reports both timings."""
+    app.config['CAPTURE_SLOW_SECONDS'] = 0.0
+    post(client, '/api/keyboard/generate', {'name': 'replayed', 'rows': 2, 'cols': 4})
+    (record,) = captures()
+
+    first, second = replay(record), replay(record)
+    assert first['status'] == 200 and first['success']
+    assert first['scad_digest'] and first['scad_digest'] == second['scad_digest']
+    assert set(first['timings']) == set(record['timings'])
+    assert app.config['CAPTURE_DIR'] and len(captures()) == 1
+
+    path = os.path.join(app.config['CAPTURE_DIR'], os.listdir(app.config['CAPTURE_DIR'])[0])
+    assert replay_main([path, '--id', record['id'][:6]]) == 0
+    out = capsys.readouterr().out
+    assert 'captured' in out and 'replayed' in out and 'routing' in out
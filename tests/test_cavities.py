@@ -0,0 +1,74 @@
+"""Tests for the pre-rendered switch cavity library."""
+import os
+import tempfile
+
+from solid import import_stl, scad_render
+
+from libs.cavities import CavityLibrary, cavity_version, instances_shape
+from libs.printboard_v2 import KeyboardConfig, MatrixConfig
+from libs.printboard_v2.builder import keyboard_builder
+from libs.printboard_v2.switches import GamdiasLPSwitch
+
+
+def test_version_tracks_conf_and_resolution():
+    """Test that the version key changes with the switch conf and $fn."""
+    switch = GamdiasLPSwitch()
+    changed = GamdiasLPSwitch()
+    changed.conf = dict(changed.conf, switch_body_x=15)
+
+    assert cavity_version(switch, 50) == cavity_version(GamdiasLPSwitch(), 50)
+    assert cavity_version(switch, 50) != cavity_version(changed, 50)
+    assert cavity_version(switch, 50) != cavity_version(switch, 12)
+
+
+def test_version_is_computed_once(monkeypatch):
+    """Test that repeat lookups do not render the cavity SCAD again."""
+    import libs.cavities as cavities
+
+    rendered = []
+    monkeypatch.setattr(cavities, 'scad_render', lambda shape: rendered.append(shape) or 'cavity')
+    switch = GamdiasLPSwitch()
+    switch.conf = dict(switch.conf, switch_body_x=16.5)
+
+    version = cavity_version(switch, 50)
+    assert CavityLibrary(tempfile.mkdtemp()).path(switch, 50).endswith(f'_{version}.stl')
+    assert cavity_version(switch, 50) == version
+    assert len(rendered) == 1
+
+
+def test_library_paths_and_pruning():
+    """Test file naming and that a new version replaces stale meshes."""
+    library = CavityLibrary(tempfile.mkdtemp())
+    switch = GamdiasLPSwitch()
+    path = library.path(switch, 50)
+    assert os.path.basename(path) == f'gamdias_lp_fn50_{cavity_version(switch, 50)}.stl'
+
+    stale = os.path.join(library.directory, 'gamdias_lp_fn50_0123456789abcdef.stl')
+    other_resolution = os.path.join(library.directory, 'gamdias_lp_fn12_0123456789abcdef.stl')
+    for name in (stale, other_resolution, path):
+        open(name, 'wb').close()
+    library._prune(switch, 50, keep=path)
+
+    assert not os.path.exists(stale)
+    assert os.path.exists(other_resolution)
+    assert library.ensure(switch, 50) == path
+
+
+def test_missing_openscad_leaves_library_empty():
+    """Test that a failed render is reported and nothing is cached."""
+    library = CavityLibrary(tempfile.mkdtemp())
+    switch = GamdiasLPSwitch()
+
+    assert library.ensure(switch, 50, timeout=5) is None
+    assert library.import_shape(switch, 50, timeout=5) is None
+    assert os.listdir(library.directory) == []
+
+
+def test_instances_shape_imports_cavity_per_key():
+    """Test that parts reference the cavity mesh instead of its CSG."""
+    config = KeyboardConfig(name='cavity_test', matrices={'main': MatrixConfig(rows=2, cols=3)})
+    instances = keyboard_builder.build_keyboard(config).parts[0].instances
+
+    scad = scad_render(instances_shape(import_stl('/lib/gamdias_lp.stl'), instances))
+    assert scad.count('import(file = "/lib/gamdias_lp.stl"') == 6
+    assert 'cylinder' not in scad
@@ -0,0 +1,33 @@
+"""Tests for the geometry complexity tracker."""
+import json
+
+from benchmarks.complexity import DEFAULT_BASELINE, compare, main, measure
+
+
+def test_compare_flags_growth_beyond_tolerance():
+    """Test growth, shrinkage and metrics only one side has."""
+    baseline = {'a/v1/matrix': {'scad_bytes': 1000, 'nodes': 100, 'tube_points': 10}}
+    results = {'a/v1/matrix': {'scad_bytes': 1040, 'nodes': 120, 'tube_points': 8, 'stl_triangles': 500},
+               'b/v2/part': {'scad_bytes': 10}}
+
+    changes = {change['metric']: change for change in compare(results, baseline, tolerance=0.05)}
+    assert set(changes) == {'scad_bytes', 'nodes', 'tube_points'}
+    assert not changes['scad_bytes']['grew']
+    assert changes['nodes']['grew'] and changes['nodes']['change'] == 0.2
+    assert not changes['tube_points']['grew']
+
+
+def test_measurements_are_deterministic():
+    """Test that routing is seeded so repeated measurements agree."""
+    first = measure(['basic_5x5'])
+    assert set(first) == {'basic_5x5/v1/routing', 'basic_5x5/v1/matrix', 'basic_5x5/v2/main_switch_holes'}
+    assert first['basic_5x5/v1/routing']['tube_points'] > 0
+    assert 'tube_points' not in first['basic_5x5/v1/matrix']
+    assert measure(['basic_5x5']) == first
+
+
+def test_checked_in_baseline_holds(capsys):
+    """Test the current tree against benchmarks/complexity_baseline.json."""
+    with open(DEFAULT_BASELINE) as f:
+        assert not json.load(f)['rendered']
+    assert main(['--no-render']) == 0, capsys.readouterr().out
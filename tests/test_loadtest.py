@@ -0,0 +1,77 @@
+"""Tests for the HTTP load-test harness."""
+import json
+import os
+import tempfile
+
+import pytest
+
+from benchmarks import stub_openscad
+from benchmarks.loadtest import (Client, Entry, GeneratedFiles, Sample, load_corpus, local_server,
+                                 replay, summarize)
+from libs.render import is_binary_stl
+
+
+def test_load_corpus_rejects_invalid_lines():
+    """Test corpus parsing and its error on entries without a path."""
+    path = os.path.join(tempfile.mkdtemp(), 'corpus.jsonl')
+    with open(path, 'w') as f:
+        f.write('{"method": "post", "path": "/api/v2/keyboard/preview", "body": {"rows": 2}}\n\n')
+        f.write('{"path": "/health"}\n')
+    entries = load_corpus(path)
+    assert [(entry.method, entry.path) for entry in entries] == [
+        ('POST', '/api/v2/keyboard/preview'), ('GET', '/health')]
+
+    with open(path, 'a') as f:
+        f.write('{"method": "GET"}\n')
+    with pytest.raises(ValueError, match='corpus.jsonl:4'):
+        load_corpus(path)
+
+
+def test_generated_files_fill_placeholders():
+    """Test that download paths wait for a generate response naming a file."""
+    files = GeneratedFiles()
+    assert files.fill('/api/keyboard/download/{stl}') is None
+    assert files.fill('/api/keyboard/presets') == '/api/keyboard/presets'
+
+    files.add({'scad_files': ['a b.scad'], 'stl_files': []})
+    assert files.fill('/api/keyboard/download/{scad}') == '/api/keyboard/download/a%20b.scad'
+    assert files.fill('/api/keyboard/download/{stl}') is None
+
+
+def test_summarize_percentiles_and_error_rates():
+    """Test per-endpoint throughput, percentiles and error kinds."""
+    samples = [Sample('GET /a', 200, latency / 1000) for latency in range(1, 101)]
+    samples += [Sample('POST /b', 500, 0.5, 'HTTP 500'), Sample('POST /b', 200, 0.1)]
+    report = summarize(samples, elapsed=2.0, skipped=3)
+
+    assert report['requests'] == 102 and report['skipped'] == 3
+    a, b = report['endpoints']['GET /a'], report['endpoints']['POST /b']
+    assert a['throughput'] == 50.0 and a['errors'] == 0
+    assert a['p50_ms'] == pytest.approx(50.5) and a['max_ms'] == 100.0
+    assert b['error_rate'] == 0.5 and b['error_kinds'] == {'HTTP 500': 1}
+
+
+def test_stub_openscad_writes_binary_stl(monkeypatch):
+    """Test that the stub renderer produces a valid binary STL."""
+    monkeypatch.setenv('STUB_OPENSCAD_DELAY', '0')
+    path = os.path.join(tempfile.mkdtemp(), 'out.stl')
+    assert stub_openscad.main(['--export-format', 'binstl', '-o', path, 'in.scad']) == 0
+    assert is_binary_stl(path)
+
+
+def test_replay_against_local_server_with_stub_renderer():
+    """Test a short closed-loop run of generate and download against a started server."""
+    entries = [
+        Entry('POST', '/api/v2/keyboard/generate', {'name': 'load', 'rows': 2, 'cols': 2}),
+        Entry('GET', '/api/keyboard/download/{stl}'),
+        Entry('POST', '/api/v2/keyboard/preview', {'name': 'load', 'rows': 0, 'cols': 2}),
+    ]
+    with local_server('werkzeug', stub_render=True, stub_delay=0) as url:
+        report = replay(Client(url, timeout=60), entries, duration=60, concurrency=1, max_requests=6)
+
+    endpoints = report['endpoints']
+    assert report['requests'] == 6
+    assert endpoints['POST /api/v2/keyboard/generate']['errors'] == 0
+    assert endpoints['GET /api/keyboard/download/{stl}']['errors'] == 0
+    assert endpoints['POST /api/v2/keyboard/preview']['error_rate'] == 1.0
+    json.dumps(report)
@@ -0,0 +1,219 @@
+"""Tests for the indexed viewer mesh format."""
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from libs.mesh import (
+    decimate_triangles, decode_indexed_mesh, encode_indexed_mesh, index_triangles,
+    read_stl, write_viewer_mesh
+)
+from libs.render import FACET_DTYPE
+
+
+def cube_triangles(size=10.0):
+    """The 12 triangles of an axis-aligned cube."""
+    corners = np.array([[x, y, z] for x in (0, size) for y in (0, size) for z in (0, size)],
+                       dtype=np.float32)
+    faces = [
+        (0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+        (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3),
+    ]
+    return corners[np.array(faces)]
+
+
+def write_binary_stl(path, triangles):
+    facets = np.zeros(len(triangles), dtype=FACET_DTYPE)
+    facets['vertices'] = triangles
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 80)
+        f.write(np.uint32(len(triangles)).tobytes())
+        f.write(facets.tobytes())
+
+
+def test_index_triangles_shares_vertices():
+    """Test that a cube's 36 corners collapse to 8 shared vertices."""
+    triangles = cube_triangles()
+    positions, indices = index_triangles(triangles)
+
+    assert positions.shape == (8, 3)
+    assert indices.dtype == np.uint32
+    assert len(indices) == 36
+    assert np.array_equal(positions[indices].reshape(-1, 3, 3), triangles)
+
+
+def test_lossless_round_trip():
+    """Test that the float32 format reproduces every triangle exactly."""
+    triangles = cube_triangles(7.3)
+    data = encode_indexed_mesh(*index_triangles(triangles))
+    positions, indices = decode_indexed_mesh(data)
+
+    assert np.array_equal(positions[indices].reshape(-1, 3, 3), triangles)
+    assert len(data) < triangles.nbytes
+
+
+def test_quantized_round_trip():
+    """Test that 16-bit quantization stays within one quantization step."""
+    triangles = cube_triangles(120.0) + np.float32(-35.5)
+    data = encode_indexed_mesh(*index_triangles(triangles), quantize_bits=16)
+    positions, indices = decode_indexed_mesh(data)
+
+    assert np.allclose(positions[indices].reshape(-1, 3, 3), triangles, atol=120.0 / 65535)
+
+
+def test_write_viewer_mesh_from_stl():
+    """Test converting an STL file written next to the print STL."""
+    stl_path = os.path.join(tempfile.mkdtemp(), 'part.stl')
+    write_binary_stl(stl_path, cube_triangles())
+
+    assert np.array_equal(read_stl(stl_path), cube_triangles())
+    mesh_path = write_viewer_mesh(stl_path)
+    assert mesh_path == stl_path + '.mesh'
+    with open(mesh_path, 'rb') as f:
+        positions, indices = decode_indexed_mesh(f.read())
+    assert len(positions) == 8
+
+
+def sphere_triangles(segments=64):
+    """A UV sphere with ``2 * segments * (segments - 1)`` triangles."""
+    theta = np.linspace(0, np.pi, segments + 1)
+    phi = np.linspace(0, 2 * np.pi, segments + 1)
+    grid = np.stack([
+        np.outer(np.sin(theta), np.cos(phi)),
+        np.outer(np.sin(theta), np.sin(phi)),
+        np.outer(np.cos(theta), np.ones_like(phi)),
+    ], axis=-1) * 20
+    a, b = grid[:-1, :-1], grid[:-1, 1:]
+    c, d = grid[1:, :-1], grid[1:, 1:]
+    quads = np.concatenate([np.stack([a, c, d], axis=-2), np.stack([a, d, b], axis=-2)])
+    return quads.reshape(-1, 3, 3).astype(np.float32)
+
+
+def test_decimate_within_budget():
+    """Test that decimation meets the triangle budget and keeps the shape."""
+    triangles = sphere_triangles()
+    positions, indices = decimate_triangles(triangles, 1000)
+
+    assert 0 < len(indices) // 3 <= 1000
+    assert indices.max() < len(positions)
+    radii = np.linalg.norm(positions, axis=1)
+    assert np.all(np.abs(radii - 20) < 3)
+    assert np.allclose(positions.min(axis=0), -20, atol=3)
+
+
+def test_decimate_under_budget_is_lossless():
+    """Test that meshes already within budget are only indexed."""
+    positions, indices = decimate_triangles(cube_triangles(), 100)
+    assert np.array_equal(positions[indices].reshape(-1, 3, 3), cube_triangles())
+
+
+def test_write_preview_mesh_with_budget():
+    """Test writing a decimated preview mesh to a custom path."""
+    directory = tempfile.mkdtemp()
+    stl_path = os.path.join(directory, 'part.stl')
+    write_binary_stl(stl_path, sphere_triangles())
+
+    mesh_path = write_viewer_mesh(stl_path, mesh_path=os.path.join(directory, 'part.scad.preview.mesh'),
+                                  triangle_budget=500)
+    with open(mesh_path, 'rb') as f:
+        positions, indices = decode_indexed_mesh(f.read())
+    assert len(indices) // 3 <= 500
+
+
+def test_viewer_endpoint_converts_existing_stl():
+    """Test that the viewer endpoint serves the indexed mesh of an STL."""
+    from app import app
+
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    write_binary_stl(os.path.join(app.config['OUTPUT_DIR'], 'board_matrix.stl'), cube_triangles())
+
+    with app.test_client() as client:
+        response = client.get('/api/keyboard/viewer/board_matrix.stl')
+        assert response.status_code == 200
+        positions, indices = decode_indexed_mesh(response.data)
+        assert len(positions) == 8 and len(indices) == 36
+
+        assert client.get('/api/keyboard/viewer/missing.stl').status_code == 404
+        assert client.get('/api/keyboard/viewer/board_matrix.scad').status_code == 404
+
+
+def test_preview_mesh_endpoint_requires_scad():
+    """Test the preview mesh endpoint for missing files and non-SCAD names."""
+    from app import app
+
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    with app.test_client() as client:
+        assert client.get('/api/keyboard/preview-mesh/missing.scad').status_code == 404
+        assert client.get('/api/keyboard/preview-mesh/board.stl').status_code == 404
+
+
+def test_preview_mesh_skipped_once_full_stl_exists():
+    """Test that no coarse render starts for a part whose STL is already rendered."""
+    from app import app
+
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    with open(os.path.join(app.config['OUTPUT_DIR'], 'board.scad'), 'w') as f:
+        f.write('cube(1);\n')
+    write_binary_stl(os.path.join(app.config['OUTPUT_DIR'], 'board.stl'), cube_triangles())
+    with app.test_client() as client:
+        response = client.get('/api/keyboard/preview-mesh/board.scad')
+        assert response.status_code == 409
+        assert response.get_json()['viewer_url'] == '/api/keyboard/viewer/board.stl'
+
+
+def test_orphaned_pending_marker_expires():
+    """Test that a marker older than RENDER_TIMEOUT counts as a failed render."""
+    from app import app
+
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    fresh = os.path.join(app.config['OUTPUT_DIR'], 'fresh.stl.pending')
+    orphan = os.path.join(app.config['OUTPUT_DIR'], 'orphan.stl.pending')
+    for marker in (fresh, orphan):
+        open(marker, 'w').close()
+    age = app.config['RENDER_TIMEOUT'] + 1
+    os.utime(orphan, (os.path.getmtime(orphan) - age,) * 2)
+
+    with app.test_client() as client:
+        assert client.get('/api/keyboard/download/fresh.stl').status_code == 202
+        assert client.get('/api/keyboard/viewer/fresh.stl').status_code == 202
+        assert client.get('/api/keyboard/viewer/orphan.stl').status_code == 404
+        assert client.get('/api/keyboard/download/orphan.stl').status_code == 404
+    assert os.path.exists(fresh)
+    assert not os.path.exists(orphan)
+
+
+@pytest.mark.parametrize('endpoint', ['/api/keyboard/generate', '/api/v2/keyboard/generate'])
+def test_async_generate_serves_preview_before_full_mesh(endpoint, monkeypatch):
+    """Test that renderAsync answers with preview meshes and renders the STLs afterwards."""
+    from app import app, wait_for_background_renders
+    from benchmarks.loadtest import install_stub_renderer
+    from libs.render import openscad_available
+
+    stub_dir = install_stub_renderer(tempfile.mkdtemp())
+    monkeypatch.setenv('PATH', stub_dir + os.pathsep + os.environ['PATH'])
+    # Hold the full renders until the pending state has been checked
+    monkeypatch.setenv('STUB_OPENSCAD_DELAY', '1')
+    openscad_available.cache_clear()
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    try:
+        with app.test_client() as client:
+            result = client.post(endpoint, json={'name': 'async', 'rows': 2, 'cols': 2,
+                                                 'renderAsync': True}).get_json()
+            assert result['success'] and result['stl_files'] == []
+            (stl_file,) = result['pending_stl_files']
+            action = next(a for a in result['files_with_actions'] if a.get('pending'))
+            assert client.get(action['preview_mesh_url']).status_code == 200
+            assert client.get(action['viewer_url']).status_code == 202
+            assert client.get(action['download_url']).status_code == 202
+
+            wait_for_background_renders(timeout=60)
+            assert client.get(action['viewer_url']).status_code == 200
+            assert not os.path.exists(os.path.join(app.config['OUTPUT_DIR'], stl_file + '.pending'))
+    finally:
+        openscad_available.cache_clear()
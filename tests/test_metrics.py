@@ -0,0 +1,106 @@
+"""Tests for pipeline timings and the Prometheus metrics endpoint."""
+import json
+import subprocess
+import tempfile
+
+import pytest
+
+from app import app
+from libs.printboard_v2 import KeyboardConfig, MatrixConfig
+from libs.printboard_v2.builder import keyboard_builder
+from libs.printboard_v2.metrics import Counter, Histogram, collect_timings, record_cache, cache_hit_ratio, stage
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    with app.test_client() as client:
+        yield client
+
+
+def test_histogram_and_counter_exposition():
+    """Test the Prometheus text format of histograms and labelled counters."""
+    histogram = Histogram('test_seconds', 'Test durations.', ['stage'], buckets=(0.1, 1))
+    histogram.observe(0.05, stage='a')
+    histogram.observe(0.5, stage='a')
+    histogram.observe(5, stage='a')
+    counter = Counter('test_total', 'Test events.', ['reason'])
+    counter.inc(reason='timeout')
+    counter.inc(2, reason='timeout')
+
+    assert histogram.render().split('\n') == [
+        '# HELP test_seconds Test durations.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_seconds_sum{stage="a"} 5.55',
+        'test_seconds_count{stage="a"} 3',
+    ]
+    assert counter.render().endswith('test_total{reason="timeout"} 3')
+
+
+def test_nested_collectors_sum_repeated_stages():
+    """Test that every active collector sees a stage and repeats are summed."""
+    with collect_timings() as outer:
+        with stage('emit'):
+            pass
+        with collect_timings() as inner:
+            with stage('emit'):
+                pass
+            with stage('render'):
+                pass
+    with stage('render'):
+        pass
+
+    assert set(inner) == {'emit', 'render'}
+    assert set(outer) == {'emit', 'render'}
+    assert outer['emit'] >= inner['emit']
+
+
+def test_cache_hit_ratio():
+    """Test that the hit ratio gauge follows hits and misses."""
+    for hit in (True, True, False, True):
+        record_cache('test_cache', hit)
+    assert cache_hit_ratio.value(cache='test_cache') == 0.75
+
+
+def test_build_result_metadata_has_stage_timings():
+    """Test that V2 build results carry layout and geometry timings."""
+    config = KeyboardConfig(name='timed', matrices={'main': MatrixConfig(rows=2, cols=3)})
+    timings = keyboard_builder.build_keyboard(config).metadata['timings']
+    assert set(timings) == {'layout', 'geometry'}
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_generate_timings_and_metrics_endpoint(client):
+    """Test response timings and that generation shows up in /metrics."""
+    response = client.post('/api/v2/keyboard/generate',
+                           data=json.dumps({'name': 'metrics', 'rows': 2, 'cols': 2}),
+                           content_type='application/json')
+    timings = json.loads(response.data)['metadata']['timings']
+    assert {'layout', 'geometry', 'scad_emit'} <= set(timings)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE printboard_stage_seconds histogram' in body
+    assert 'printboard_stage_seconds_count{stage="scad_emit"}' in body
+    assert 'printboard_render_queue_depth 0' in body
+    assert 'printboard_renders_in_progress 0' in body
+    assert '# TYPE printboard_render_failures_total counter' in body
+
+
+def test_health_does_not_spawn_processes(client, monkeypatch):
+    """Test that health probes answer without running `which openscad`."""
+    client.get('/health')
+
+    def no_subprocess(*args, **kwargs):
+        raise AssertionError('health check spawned a process')
+    monkeypatch.setattr(subprocess, 'run', no_subprocess)
+
+    data = json.loads(client.get('/health').data)
+    assert data['status'] == 'healthy'
+    assert isinstance(data['openscad_available'], bool)
@@ -0,0 +1,104 @@
+"""Tests for on-demand request profiling."""
+import json
+import os
+import tempfile
+import time
+
+import pytest
+
+from app import app
+from libs.printboard_v2.profiling import SamplingProfiler, store_profile
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    app.config['ADMIN_TOKEN'] = 'secret'
+    with app.test_client() as client:
+        yield client
+    app.config['ADMIN_TOKEN'] = ''
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+def test_sampling_profiler_outputs():
+    """Test top functions, call tree and collapsed stacks of a busy function."""
+    with SamplingProfiler(interval=0.001) as profiler:
+        busy_loop(0.1)
+
+    assert profiler.samples > 0
+    top = profiler.top_functions()
+    assert top[0]['function'].startswith('busy_loop (tests/test_profiling.py:')
+    assert top[0]['total_pct'] == 100.0
+
+    tree = profiler.call_tree()
+    assert tree['samples'] == profiler.samples
+    assert tree['children'][0]['function'] == top[0]['function']
+
+    lines = profiler.folded().split('\n')
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) == profiler.samples
+    assert all(line.startswith('busy_loop (') for line in lines)
+
+
+def test_store_profile_writes_json_and_folded():
+    """Test that stored profiles can be fed to flamegraph tools."""
+    with SamplingProfiler() as profiler:
+        busy_loop(0.02)
+    json_path, folded_path = store_profile(profiler.to_dict(), tempfile.mkdtemp(), 'run')
+
+    with open(json_path) as f:
+        assert json.load(f)['samples'] == profiler.samples
+    with open(folded_path) as f:
+        assert f.read().strip() == profiler.folded()
+
+
+def test_profiling_requires_admin_token(client):
+    """Test that the profile flag is refused without the admin token."""
+    body = json.dumps({'name': 'profiled', 'rows': 2, 'cols': 2, 'profile': True})
+    response = client.post('/api/v2/keyboard/preview', data=body, content_type='application/json')
+    assert response.status_code == 403
+
+    response = client.post('/api/v2/keyboard/preview', data=body, content_type='application/json',
+                           headers={'X-Admin-Token': 'wrong'})
+    assert response.status_code == 403
+
+    app.config['ADMIN_TOKEN'] = ''
+    response = client.post('/api/v2/keyboard/preview', data=body, content_type='application/json',
+                           headers={'X-Admin-Token': ''})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize('endpoint', [
+    '/api/keyboard/preview',
+    '/api/keyboard/generate',
+    '/api/v2/keyboard/preview',
+    '/api/v2/keyboard/generate',
+])
+def test_profiled_endpoints_return_and_store_profile(client, endpoint):
+    """Test that V1 and V2 generate/preview attach and store a profile."""
+    response = client.post(f'{endpoint}?profile=1',
+                           data=json.dumps({'name': 'profiled', 'rows': 2, 'cols': 2}),
+                           content_type='application/json',
+                           headers={'X-Admin-Token': 'secret'})
+    data = json.loads(response.data)
+    assert data['success'] is True
+    profile = data['profile']
+    assert {'samples', 'duration', 'top_functions', 'call_tree', 'folded'} <= set(profile)
+
+    profile_dir = os.path.join(app.config['OUTPUT_DIR'], '.profiles')
+    assert sorted(os.listdir(profile_dir)) == [f"{profile['name']}.folded", f"{profile['name']}.json"]
+
+
+def test_unprofiled_requests_are_unchanged(client):
+    """Test that requests without the flag get no profile."""
+    response = client.post('/api/v2/keyboard/preview',
+                           data=json.dumps({'name': 'plain', 'rows': 2, 'cols': 2}),
+                           content_type='application/json')
+    assert 'profile' not in json.loads(response.data)
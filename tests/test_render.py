@@ -0,0 +1,122 @@
+"""Tests for STL conversion and compression."""
+import gzip
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from libs.render import (
+    FACET_DTYPE, ascii_stl_to_binary, ensure_binary_stl, is_binary_stl, write_gzip_sibling
+)
+
+ASCII_STL = """solid OpenSCAD_Model
+  facet normal 0 0 1
+    outer loop
+      vertex 0 0 0
+      vertex 1 0 0
+      vertex 0 1 0
+    endloop
+  endfacet
+  facet normal 0 0 -1
+    outer loop
+      vertex 0 0 0
+      vertex 0 1 0
+      vertex 1.5 -2.25 3
+    endloop
+  endfacet
+endsolid OpenSCAD_Model
+"""
+
+
+@pytest.fixture
+def ascii_stl():
+    path = os.path.join(tempfile.mkdtemp(), 'part.stl')
+    with open(path, 'w') as f:
+        f.write(ASCII_STL)
+    return path
+
+
+def test_ascii_to_binary_conversion(ascii_stl):
+    """Test that facets survive the ASCII to binary conversion."""
+    binary_path = ascii_stl + '.bin'
+    assert ascii_stl_to_binary(ascii_stl, binary_path) == 2
+    assert is_binary_stl(binary_path)
+
+    with open(binary_path, 'rb') as f:
+        f.seek(84)
+        facets = np.frombuffer(f.read(), dtype=FACET_DTYPE)
+    assert facets['normal'].tolist() == [[0, 0, 1], [0, 0, -1]]
+    assert facets['vertices'][1].tolist() == [[0, 0, 0], [0, 1, 0], [1.5, -2.25, 3]]
+
+
+def test_ensure_binary_stl_in_place(ascii_stl):
+    """Test converting in place, and that binary files are left alone."""
+    assert not is_binary_stl(ascii_stl)
+    assert ensure_binary_stl(ascii_stl)
+    assert is_binary_stl(ascii_stl)
+    assert os.path.getsize(ascii_stl) == 84 + 2 * 50
+    assert not ensure_binary_stl(ascii_stl)
+
+
+def test_gzip_sibling(ascii_stl):
+    """Test the precompressed copy decompresses to the original."""
+    gz_path = write_gzip_sibling(ascii_stl)
+    assert gz_path == ascii_stl + '.gz'
+    with gzip.open(gz_path, 'rb') as f, open(ascii_stl, 'rb') as original:
+        assert f.read() == original.read()
+
+
+def install_openscad(directory, script):
+    """Write an ``openscad`` shell script that logs its arguments to ``calls``."""
+    path = os.path.join(directory, 'openscad')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\necho "$@" >> "{directory}/calls"\n{script}')
+    os.chmod(path, 0o755)
+    return os.path.join(directory, 'calls')
+
+
+@pytest.fixture
+def fake_openscad(monkeypatch):
+    import libs.render as render
+
+    directory = tempfile.mkdtemp()
+    xvfb_run = os.path.join(directory, 'xvfb-run')
+    with open(xvfb_run, 'w') as f:
+        f.write('#!/bin/sh\n[ "$1" = "-a" ] && shift\nexec "$@"\n')
+    os.chmod(xvfb_run, 0o755)
+    monkeypatch.setenv('PATH', directory + os.pathsep + os.environ['PATH'])
+    monkeypatch.setattr(render, '_export_format_supported', None)
+    return directory
+
+
+def calls(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_failing_scad_renders_once(fake_openscad, caplog):
+    """Test that a SCAD error is logged and not retried without --export-format."""
+    from libs.render import render_stl
+
+    # A failed render may leave a partial file behind
+    log = install_openscad(fake_openscad, 'echo "ERROR: Parser error in line 1" >&2\n'
+                                          'echo "solid" > "$4"\nexit 1\n')
+    assert render_stl('part.scad', os.path.join(fake_openscad, 'part.stl')) is None
+    assert len(calls(log)) == 1
+    assert sorted(os.listdir(fake_openscad)) == ['calls', 'openscad', 'xvfb-run']
+    assert 'OpenSCAD error for part.stl: ERROR: Parser error' in caplog.text
+
+
+def test_old_openscad_falls_back_once(fake_openscad, ascii_stl):
+    """Test the plain export after an unknown --export-format, remembered afterwards."""
+    from libs.render import render_stl
+
+    log = install_openscad(fake_openscad, (
+        'case "$1" in --export-format) echo "unrecognised option \'--export-format\'" >&2; exit 1;; esac\n'
+        f'cp "{ascii_stl}" "$2"\n'))
+    for name in ('first.stl', 'second.stl'):
+        stl_file = os.path.join(fake_openscad, name)
+        assert render_stl('part.scad', stl_file, compress=False) == stl_file
+        assert is_binary_stl(stl_file)
+    assert [call.split()[0] for call in calls(log)] == ['--export-format', '-o', '-o']
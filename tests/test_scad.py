@@ -0,0 +1,249 @@
+"""Tests for SCAD generation: unions, transform folding, module dedup and quantization."""
+import json
+import re
+import tempfile
+
+import numpy as np
+import pytest
+from solid import cube, mirror, rotate, scad_render, scale, translate, union
+from solid.utils import back, down, right
+
+from libs import printboard as kb
+from libs.controllers import tinys2
+from libs.printboard_v2 import MatrixConfig
+from libs.printboard_v2.modeling import ModelingEngine
+from libs.printboard_v2.scad import (
+    AFFINE_NODES, affine_matrix, balanced_union, dedupe_modules, flat_union, fold_transforms, node_count, place,
+    quantize_number, quantize_tree, render_scad, tree_depth
+)
+from libs.printboard_v2.switches import GamdiasLPSwitch
+from libs.switches import gamdias_lp
+
+
+def _leaves(node, matrix=None):
+    """(world matrix, leaf SCAD) for every non-transform leaf of a tree."""
+    matrix = np.eye(4) if matrix is None else matrix
+    if node.name in AFFINE_NODES:
+        matrix = matrix @ affine_matrix(node)
+    if not node.children:
+        return [(matrix, scad_render(node))]
+    return [leaf for child in node.children for leaf in _leaves(child, matrix)]
+
+
+def _assert_same_geometry(original, folded):
+    before, after = _leaves(original), _leaves(folded)
+    assert [scad for _, scad in before] == [scad for _, scad in after]
+    for (expected, _), (actual, _) in zip(before, after):
+        np.testing.assert_allclose(actual, expected, atol=1e-9)
+
+
+def _expand_modules(source):
+    """Inline every ``shape_<n>();`` call of deduplicated SCAD source."""
+    pattern = re.compile(r'^module (shape_\d+)\(\) \{\n(.*?)\n\}$\n?', re.MULTILINE | re.DOTALL)
+    bodies = {name: [line[1:] for line in body.split('\n')] for name, body in pattern.findall(source)}
+    lines = pattern.sub('', source).split('\n')
+    while True:
+        expanded = []
+        for line in lines:
+            call = re.fullmatch(r'(\t*)(shape_\d+)\(\);', line)
+            expanded += [call.group(1) + body for body in bodies[call.group(2)]] if call else [line]
+        if expanded == lines:
+            return '\n'.join(lines)
+        lines = expanded
+
+
+def v1_board(rows=4, cols=6):
+    layout = {
+        "name": "quantize",
+        "controller_placement": ("left", "top"),
+        "matrixes": {"main": {"offset": (0, 0), "keys": [["switch"] * cols] * rows}},
+        "switch": gamdias_lp,
+        "empty_switch": kb.empty_sw(gamdias_lp),
+        "controller": tinys2,
+    }
+    for i in range(0, 3):
+        layout[f"{i}u"] = kb.empty_sw(gamdias_lp, x=18.5 * i if i > 0 else 18.5)
+    return kb.create_keyboard(layout)[0]['shape']
+
+
+def test_place_skips_identity_transforms():
+    """Test that unrotated keys get a single translate and the origin none."""
+    body = cube(1)
+    assert place(body) is body
+    assert place(body, 3, 4).name == 'translate'
+    assert place(body, angle=15).name == 'rotate'
+    assert scad_render(place(body, 3, 4, 15)) == scad_render(translate([3.0, 4.0, 0])(rotate([0, 0, 15.0])(body)))
+
+
+def test_flat_union_splices_plain_unions():
+    """Test that nested plain unions are flattened but transforms are kept."""
+    nested = union()(cube(1), union()(cube(2), cube(3)))
+    moved = translate([1, 0, 0])(union()(cube(4), cube(5)))
+    shape = flat_union([nested, moved, None])
+
+    assert [child.name for child in shape.children] == ['cube', 'cube', 'cube', 'translate']
+    assert tree_depth(shape) == 4
+
+
+def test_balanced_union_bounds_fan_out():
+    """Test that balanced unions keep every node under the fan-out limit."""
+    children = [cube(i + 1) for i in range(1000)]
+    shape = balanced_union(children, max_children=10)
+
+    assert tree_depth(shape) == 4  # 1000 cubes -> 100 -> 10 -> root
+    assert node_count(shape) == 1000 + 100 + 10 + 1
+    assert len(balanced_union(children, max_children=None).children) == 1000
+    with pytest.raises(ValueError):
+        balanced_union(children, max_children=1)
+
+
+def test_v2_matrix_is_flat_on_large_layouts():
+    """Test that a 10x20 matrix is one union with one placement per key."""
+    switch = GamdiasLPSwitch()
+    shape = ModelingEngine().generate_matrix_3d(MatrixConfig(rows=10, cols=20), switch)
+    cavity_depth = tree_depth(switch.get_3d_model())
+
+    assert shape.name == 'union'
+    assert len(shape.children) == 200
+    assert tree_depth(shape) <= cavity_depth + 2
+    # Each key costs one cavity plus at most one translate and one rotate
+    per_key = len(scad_render(switch.get_3d_model())) + 200
+    assert len(scad_render(shape)) < 200 * per_key
+
+
+def test_v1_matrix_uses_one_placement_per_key():
+    """Test that V1 matrices no longer nest back/right/rotate per key."""
+    body = cube(1)
+    matrix = {'switches': [{'switch': type('S', (), {'switch_body': body}), 'x': i * 19.0, 'y': 5.0, 'c_angle': 0}
+                           for i in range(500)]}
+    shape = kb.draw_matrix(matrix, {})
+
+    assert len(shape.children) == 500
+    assert tree_depth(shape) == 3
+    assert node_count(shape) == 1 + 500 * 2
+
+
+def test_affine_matrix_matches_openscad_conventions():
+    """Test rotate order (x, then y, then z), axis-angle, mirror and scale."""
+    point = np.array([0, 1, 0, 1])
+    np.testing.assert_allclose(affine_matrix(rotate([90, 0, 0])) @ point, [0, 0, 1, 1], atol=1e-12)
+    np.testing.assert_allclose(affine_matrix(rotate([90, 0, 90])) @ np.array([1, 0, 0, 1]), [0, 1, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(affine_matrix(rotate(90)) @ point, [-1, 0, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(affine_matrix(rotate(a=180, v=[1, 0, 0])) @ point, [0, -1, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(affine_matrix(mirror([0, 1, 0])) @ point, [0, -1, 0, 1])
+    np.testing.assert_allclose(affine_matrix(scale([2, 3, 4])) @ point, [0, 3, 0, 1])
+    np.testing.assert_allclose(affine_matrix(back(2)) @ point, [0, -1, 0, 1])
+
+
+def test_fold_transforms_collapses_chains():
+    """Test that a transform chain becomes one multmatrix with the same placement."""
+    body = cube([3, 2, 1], center=True)
+    chain = down(5)(right(2)(back(1)(rotate([-90, 180, 0])(body))))
+    folded = fold_transforms(chain)
+
+    assert folded.name == 'multmatrix'
+    assert folded.children[0].name == 'cube'
+    assert len(folded.params['m']) == 3
+    _assert_same_geometry(chain, folded)
+    # Lone transforms and the source tree are left alone
+    assert fold_transforms(translate([1, 2, 3])(body)).name == 'translate'
+    assert chain.name == 'translate'
+
+
+def test_fold_transforms_keeps_geometry_of_switch_and_matrix():
+    """Test that folding a 10x20 matrix drops nodes without moving any leaf."""
+    switch = GamdiasLPSwitch()
+    shape = ModelingEngine().generate_matrix_3d(MatrixConfig(rows=10, cols=20), switch)
+    folded = fold_transforms(shape)
+
+    _assert_same_geometry(switch.get_3d_model(), fold_transforms(switch.get_3d_model()))
+    _assert_same_geometry(shape, folded)
+    assert node_count(folded) < node_count(shape)
+    assert len(scad_render(folded)) < len(scad_render(shape))
+    # The cavity shared by every key is folded once and stays shared
+    assert len({id(child.children[0]) for child in folded.children}) == 1
+
+
+def test_dedupe_modules_writes_shared_subtrees_once():
+    """Test that a 10x20 matrix writes its cavity once and expands back unchanged."""
+    shape = ModelingEngine().generate_matrix_3d(MatrixConfig(rows=10, cols=20), GamdiasLPSwitch())
+    plain, _ = render_scad(shape, dedupe=False)
+    source, stats = render_scad(shape)
+
+    assert stats.nodes == node_count(fold_transforms(shape))
+    assert stats.ratio > 10
+    assert len(source) * 10 < len(plain)
+    assert _expand_modules(source).strip() == plain.strip()
+
+
+def test_dedupe_modules_applies_to_registered_switches():
+    """Test that any switch's repeated parts become modules, not just the built-in one."""
+    class TwinPinSwitch(GamdiasLPSwitch):
+        name = 'twin_pin'
+
+        def get_3d_model(self):
+            pin = union()(cube([1, 1, 3]), translate([0, 0, 3])(cube([2, 2, 1])))
+            return union()(translate([-3, 0, 0])(pin), translate([3, 0, 0])(pin))
+
+    modules, body, stats = dedupe_modules(TwinPinSwitch().get_3d_model())
+    assert stats.modules == 1
+    assert modules.count('module shape_1()') == 1
+    assert body.count('shape_1();') == 2
+    # Subtrees smaller than min_nodes stay inline
+    assert dedupe_modules(union()(cube(1), translate([1, 0, 0])(cube(1))))[2].modules == 0
+
+
+def test_generate_api_reports_dedup_stats():
+    """Test that V2 generate writes deduplicated SCAD and reports the ratio."""
+    from app import app
+
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    with app.test_client() as client:
+        response = client.post('/api/v2/keyboard/generate',
+                               data=json.dumps({'name': 'dedup', 'rows': 3, 'cols': 4}),
+                               content_type='application/json')
+    data = json.loads(response.data)
+    scad_file = data['scad_files'][0]
+
+    assert data['scad_stats'][scad_file]['ratio'] > 1
+    with open(f"{app.config['OUTPUT_DIR']}/{scad_file}") as f:
+        assert 'module shape_1()' in f.read()
+
+
+def test_quantize_number_prints_shortest_form():
+    """Test snapping, noise removal and digit count."""
+    assert str(quantize_number(3.6999999999999997, 0.001)) == '3.7'
+    assert quantize_number(1.2246e-16, 0.001) == 0
+    assert isinstance(quantize_number(-0.0004, 0.001), int)
+    assert str(quantize_number(5.40869558743183, 0.001)) == '5.409'
+    assert str(quantize_number(12.3456, 0.01)) == '12.35'
+    assert quantize_number(7.0, 0.001) == 7
+
+
+def test_quantized_geometry_is_unchanged_within_tolerance():
+    """Test that tube points, primitives and placements move by at most the step."""
+    step = 0.001
+    shape = fold_transforms(v1_board())
+    quantized = quantize_tree(shape, step)
+    number = re.compile(r'-?\d+(?:\.\d+)?(?:e-?\d+)?')
+
+    before, after = _leaves(shape), _leaves(quantized)
+    assert len(before) == len(after)
+    for (expected_matrix, expected), (actual_matrix, actual) in zip(before, after):
+        np.testing.assert_allclose(actual_matrix, expected_matrix, atol=2 * step)
+        expected_numbers = [float(n) for n in number.findall(expected)]
+        actual_numbers = [float(n) for n in number.findall(actual)]
+        assert len(actual_numbers) == len(expected_numbers)
+        np.testing.assert_allclose(actual_numbers, expected_numbers, atol=step / 2 + 1e-12)
+
+
+def test_quantized_scad_is_smaller():
+    """Test that tube-heavy V1 SCAD shrinks and carries no float noise."""
+    shape = v1_board()
+    full, _ = render_scad(shape, quantize_step=None)
+    quantized, _ = render_scad(shape)
+
+    assert len(quantized) < 0.8 * len(full)
+    assert 'e-1' not in quantized
+    assert not re.search(r'\.\d{4,}', quantized)
@@ -0,0 +1,90 @@
+"""Tests for the production entry point."""
+import gc
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from benchmarks.loadtest import Client, free_port
+from libs.printboard_v2.switches import switch_registry
+from serve import _cgroup_cpu_limit, available_cores, pool_sizes, preload
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_cgroup_cpu_limits():
+    """Test cgroup v2 and v1 CPU quotas and their absence."""
+    v2 = tempfile.mkdtemp()
+    write(os.path.join(v2, 'cpu.max'), '150000 100000\n')
+    assert _cgroup_cpu_limit(v2) == 1.5
+
+    write(os.path.join(v2, 'cpu.max'), 'max 100000\n')
+    assert _cgroup_cpu_limit(v2) is None
+
+    v1 = tempfile.mkdtemp()
+    write(os.path.join(v1, 'cpu', 'cpu.cfs_quota_us'), '200000\n')
+    write(os.path.join(v1, 'cpu', 'cpu.cfs_period_us'), '100000\n')
+    assert _cgroup_cpu_limit(v1) == 2.0
+    assert _cgroup_cpu_limit(tempfile.mkdtemp()) is None
+
+
+def test_available_cores_respects_quota():
+    """Test that a fractional quota rounds up and never exceeds the affinity mask."""
+    root = tempfile.mkdtemp()
+    write(os.path.join(root, 'cpu.max'), '50000 100000\n')
+    assert available_cores(root) == 1
+    write(os.path.join(root, 'cpu.max'), '100000000 100000\n')
+    assert available_cores(root) == len(os.sched_getaffinity(0))
+    assert pool_sizes(4) == {'preview': 9, 'render': 4}
+
+
+def wait_healthy(port, timeout=60):
+    client = Client(f'http://127.0.0.1:{port}', timeout=5)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return client.request('GET', '/health')[0]
+        except OSError:
+            time.sleep(0.2)
+    pytest.fail(f'nothing answered on port {port}')
+
+
+def test_preload_keeps_switch_models():
+    """Test that the switch cavities built by preload are the ones workers get."""
+    try:
+        preload()
+    finally:
+        gc.unfreeze()
+    switch = switch_registry.get('gamdias_lp')
+    model = switch.get_3d_model()
+    assert switch.get_3d_model() is model
+    assert switch._models[tuple(sorted(switch.conf.items()))] is model
+
+
+def test_split_pools_serve_and_stop_together():
+    """Test that both pools answer and SIGTERM stops the whole tree."""
+    preview_port, render_port = free_port(), free_port()
+    env = dict(os.environ, XDG_RUNTIME_DIR=tempfile.mkdtemp())
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(preview_port),
+         '--render-port', str(render_port), '--preview-workers', '1', '--render-workers', '1'],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        assert wait_healthy(preview_port) == 200
+        assert wait_healthy(render_port) == 200
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
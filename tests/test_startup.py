@@ -0,0 +1,63 @@
+"""Tests for web app startup cost."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds `import app` may take in a fresh interpreter. Wall-clock time depends
+# on the machine's load, so the budget is only checked when it is set.
+IMPORT_BUDGET = os.environ.get('IMPORT_TIME_BUDGET')
+
+
+def run_python(code):
+    env = dict(os.environ, OUTPUT_DIR=tempfile.mkdtemp())
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env,
+                            capture_output=True, text=True, timeout=120, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_app_leaves_heavy_modules_unloaded():
+    """Test that `import app` loads neither scipy, shapely nor the V1 printboard and switch."""
+    heavy = ['scipy', 'shapely', 'libs.printboard', 'libs.switches.gamdias_lp']
+    loaded = run_python(
+        "import json, sys\n"
+        "import app\n"
+        f"print(json.dumps([m for m in {heavy!r} if m in sys.modules]))")
+    assert loaded == []
+
+
+def test_heavy_modules_load_on_first_use():
+    """Test that importing the app leaves the V1 stack, scipy and shapely unloaded."""
+    loaded = run_python(
+        "import json, sys\n"
+        "import libs.printboard_v2.capture\n"
+        "light = 'solid' in sys.modules\n"
+        "import app\n"
+        "print(json.dumps({'light': light, 'deferred': list(app.DEFERRED_MODULES),\n"
+        "                  'loaded': sorted(m for m in sys.modules if m.split('.')[0] in ('scipy', 'shapely'))\n"
+        "                  + [m for m in app.DEFERRED_MODULES if m in sys.modules]}))")
+    assert not loaded['light']
+    assert loaded['loaded'] == []
+
+    used = run_python(
+        "import json, sys\n"
+        "from app import app, DEFERRED_MODULES\n"
+        "app.test_client().post('/api/keyboard/generate', json={'name': 'startup', 'rows': 1, 'cols': 2})\n"
+        "print(json.dumps([m for m in DEFERRED_MODULES if m not in sys.modules]))")
+    assert used == []
+
+
+@pytest.mark.skipif(not IMPORT_BUDGET, reason='set IMPORT_TIME_BUDGET (seconds) to check import time')
+def test_import_time_budget():
+    """Test that `import app` stays within IMPORT_TIME_BUDGET seconds (best of three)."""
+    timings = [run_python("import json, time\n"
+                          "start = time.perf_counter()\n"
+                          "import app\n"
+                          "print(json.dumps(time.perf_counter() - start))")
+               for _ in range(3)]
+    assert min(timings) < float(IMPORT_BUDGET), f'import app took {min(timings):.2f}s'
@@ -0,0 +1,137 @@
+"""Tests for spatial tiling of large boards."""
+import json
+import math
+import os
+import tempfile
+
+import numpy as np
+import pytest
+from solid import scad_render
+
+from libs.printboard_v2 import KeyboardConfig, MatrixConfig
+from libs.printboard_v2.builder import keyboard_builder
+from libs.printboard_v2.switches import switch_registry
+from libs.tiling import Tile, merge_tiles, plan_tiles, render_tiled, tile_shape
+
+KEY_RADIUS = math.hypot(18.5, 18.5) / 2
+
+
+def box_triangles(min_corner, max_corner):
+    """The 12 outward-facing triangles of an axis-aligned box."""
+    corners = np.array([[x, y, z] for x in (min_corner[0], max_corner[0])
+                        for y in (min_corner[1], max_corner[1])
+                        for z in (min_corner[2], max_corner[2])], dtype=np.float32)
+    faces = [
+        (0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+        (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3),
+    ]
+    return corners[np.array(faces)]
+
+
+def board_instances(rows=6, cols=18):
+    config = KeyboardConfig(name='tiling_test', matrices={'main': MatrixConfig(rows=rows, cols=cols)})
+    return keyboard_builder.build_keyboard(config).parts[0].instances
+
+
+def test_every_key_lands_in_a_tile():
+    """Test that tiles cover the whole board and drop nothing."""
+    instances = board_instances()
+    tiles = plan_tiles(instances.x, instances.y, 100, KEY_RADIUS)
+
+    covered = np.unique(np.concatenate([tile.keys for tile in tiles]))
+    assert np.array_equal(covered, np.arange(len(instances.x)))
+    assert len(tiles) > 1
+    # Tiles are far smaller than the board
+    assert max(len(tile.keys) for tile in tiles) < len(instances.x) / 2
+
+
+def test_seams_overlap_neighbouring_tiles():
+    """Test that clip rectangles grow by the seam on every side."""
+    instances = board_instances()
+    plain = {(t.row, t.col): t for t in plan_tiles(instances.x, instances.y, 100, KEY_RADIUS)}
+    seamed = {(t.row, t.col): t for t in plan_tiles(instances.x, instances.y, 100, KEY_RADIUS, seam=5)}
+
+    assert plain.keys() == seamed.keys()
+    tile, grown = plain[(0, 0)], seamed[(0, 0)]
+    assert grown.bounds == pytest.approx(np.array(tile.bounds) + [-5, -5, 5, 5])
+    assert set(tile.keys) <= set(grown.keys)
+
+
+def test_tile_shape_is_clipped_union_of_its_keys():
+    """Test the SCAD of one tile."""
+    instances = board_instances(rows=2, cols=8)
+    tile = plan_tiles(instances.x, instances.y, 60, KEY_RADIUS)[0]
+    scad = scad_render(tile_shape(switch_registry.get('gamdias_lp').get_3d_model(), instances, tile))
+
+    assert scad.lstrip().startswith('intersection()')
+    assert scad.count('rotate(a = [0, 0, 0.0000000000])') == len(tile.keys)
+
+
+def test_render_tiled_validation_and_missing_openscad():
+    """Test bad modes, and that a failed tile render yields no files."""
+    instances = board_instances(rows=2, cols=4)
+    stl_file = os.path.join(tempfile.mkdtemp(), 'part.stl')
+
+    with pytest.raises(ValueError):
+        render_tiled(instances, stl_file, 50, mode='mosaic')
+    # OpenSCAD is not available in the test environment
+    assert render_tiled(instances, stl_file, 50, timeout=5) == []
+    assert not os.path.exists(stl_file)
+
+
+def test_merge_drops_internal_seam_faces():
+    """Test that merged tiles form one closed surface without caps on the cuts."""
+    # A 30 x 20 slab clipped into a 2 x 2 grid of tiles at x = 10 and y = 10
+    tiles, triangles = [], []
+    for row, (y0, y1) in enumerate([(0, 10), (10, 20)]):
+        for col, (x0, x1) in enumerate([(0, 10), (10, 30)]):
+            tiles.append(Tile(row=row, col=col, bounds=(x0, y0, x1, y1), keys=np.arange(1)))
+            triangles.append(box_triangles((x0, y0, 0), (x1, y1, 5)))
+    merged = merge_tiles(tiles, triangles)
+
+    on_cut = [np.all(np.isclose(merged[:, :, axis], 10), axis=1) for axis in (0, 1)]
+    assert not np.any(on_cut[0] | on_cut[1])
+    # Closed: every edge is shared by exactly two triangles
+    edges = {}
+    for triangle in merged.tolist():
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            key = tuple(sorted((tuple(triangle[a]), tuple(triangle[b]))))
+            edges[key] = edges.get(key, 0) + 1
+    assert set(edges.values()) == {2}
+    # A wall of the part lying on a cut without a matching cap is kept
+    wall = [box_triangles((0, 0, 0), (10, 10, 5)), box_triangles((10, 0, 0), (20, 10, 2))]
+    kept = merge_tiles(tiles[:2], wall)
+    assert np.any(np.all(np.isclose(kept[:, :, 0], 10), axis=1))
+
+
+def test_failed_pieces_leave_no_files(monkeypatch):
+    """Test that pieces already rendered are removed when another tile fails."""
+    import libs.tiling as tiling
+
+    def render_first_tile(scad_file, target, timeout=60, compress=True):
+        if not target.endswith('_tile_0_0.stl'):
+            return None
+        for path in (target, target + '.gz'):
+            with open(path, 'wb') as f:
+                f.write(b'stl')
+        return target
+
+    monkeypatch.setattr(tiling, 'render_stl', render_first_tile)
+    directory = tempfile.mkdtemp()
+    assert render_tiled(board_instances(rows=2, cols=6), os.path.join(directory, 'part.stl'), 50,
+                        mode='pieces', workers=1) == []
+    assert os.listdir(directory) == []
+
+
+def test_generate_api_rejects_unknown_tile_mode():
+    """Test request validation of tile options on the V2 generate endpoint."""
+    from app import app
+
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    with app.test_client() as client:
+        response = client.post('/api/v2/keyboard/generate',
+                               data=json.dumps({'rows': 2, 'cols': 2, 'tileSize': 50, 'tileMode': 'mosaic'}),
+                               content_type='application/json')
+    assert response.status_code == 400
+    assert 'tileMode' in json.loads(response.data)['error']
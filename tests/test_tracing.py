@@ -0,0 +1,109 @@
+"""Tests for per-request trace spans."""
+import json
+import os
+import tempfile
+
+import pytest
+
+from app import app
+from libs.printboard_v2.tracing import FileExporter, current_trace, span, trace
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['OUTPUT_DIR'] = tempfile.mkdtemp()
+    app.config['TRACE_DIR'] = tempfile.mkdtemp()
+    with app.test_client() as client:
+        yield client
+    app.config['TRACE_DIR'] = ''
+
+
+def spans_by_name(trace_data):
+    spans = {}
+    for event in trace_data['traceEvents']:
+        spans.setdefault(event['name'], []).append(event)
+    return spans
+
+
+def test_spans_nest_inside_trace():
+    """Test that spans record timing, attributes and errors within their trace."""
+    with span('outside'):
+        assert current_trace() is None
+
+    with trace('job', size=3) as current:
+        with span('parent', keys=4) as parent:
+            with span('child'):
+                pass
+            parent.set(bytes=10)
+        with pytest.raises(ValueError):
+            with span('failing'):
+                raise ValueError('boom')
+
+    spans = spans_by_name(current.to_dict())
+    parent, child, job = spans['parent'][0], spans['child'][0], spans['job'][0]
+    assert parent['args'] == {'keys': 4, 'bytes': 10}
+    assert spans['failing'][0]['args'] == {'error': 'ValueError'}
+    assert parent['ts'] <= child['ts'] and child['ts'] + child['dur'] <= parent['ts'] + parent['dur']
+    assert job['ts'] <= parent['ts'] and job['args'] == {'size': 3}
+    assert all(event['ph'] == 'X' for event in current.events)
+
+
+def test_file_exporter_writes_chrome_trace_json():
+    """Test that exported traces are Chrome trace event JSON files."""
+    directory = tempfile.mkdtemp()
+    with trace('job', FileExporter(directory)) as current:
+        with span('work'):
+            pass
+
+    path = os.path.join(directory, f'job_{current.id}.json')
+    with open(path) as f:
+        data = json.load(f)
+    assert data['otherData']['trace_id'] == current.id
+    assert [event['name'] for event in data['traceEvents']] == ['job', 'work']
+
+
+def read_trace(response):
+    trace_id = response.headers['X-Trace-Id']
+    (name,) = [name for name in os.listdir(app.config['TRACE_DIR']) if trace_id in name]
+    with open(os.path.join(app.config['TRACE_DIR'], name)) as f:
+        return json.load(f)
+
+
+def test_v1_generate_trace(client):
+    """Test the V1 pipeline spans and their attributes."""
+    response = client.post('/api/keyboard/generate',
+                           data=json.dumps({'name': 'traced', 'rows': 2, 'cols': 3}),
+                           content_type='application/json')
+    data = read_trace(response)
+    spans = spans_by_name(data)
+
+    assert data['otherData']['status'] == 200
+    for name in ('generate_keyboard', 'parse_request', 'build_config', 'layout', 'routing',
+                 'geometry', 'part_files', 'scad_emit', 'render', 'openscad'):
+        assert name in spans, name
+    assert spans['layout'][0]['args']['keys'] == 6
+    assert spans['routing'][0]['args']['tube_points'] > 0
+    assert len(spans['routing_batch']) == 10
+    assert spans['scad_emit'][0]['args']['bytes'] > 0
+
+
+def test_v2_generate_trace(client):
+    """Test the V2 pipeline spans and their attributes."""
+    response = client.post('/api/v2/keyboard/generate',
+                           data=json.dumps({'name': 'traced', 'rows': 2, 'cols': 2}),
+                           content_type='application/json')
+    spans = spans_by_name(read_trace(response))
+
+    assert spans['layout'][0]['args']['keys'] == 4
+    assert spans['part'][0]['args'] == {'matrix': 'main', 'keys': 4}
+    assert spans['scad_emit'][0]['args']['ratio'] >= 1
+
+
+def test_tracing_disabled_by_default(client):
+    """Test that no trace is written without TRACE_DIR."""
+    app.config['TRACE_DIR'] = ''
+    response = client.post('/api/v2/keyboard/preview',
+                           data=json.dumps({'name': 'untraced', 'rows': 2, 'cols': 2}),
+                           content_type='application/json')
+    assert 'X-Trace-Id' not in response.headers
@@ -196,6 +196,207 @@ class TestV2LayoutPlanner:
         assert 'angle' in first_key
         assert 'label' in first_key
 
+    
+    def test_layout_plan_indexing(self):
+        """Test array-backed plan lookups across multiple matrices."""
+        switch = switch_registry.get("gamdias_lp")
+        planner = LayoutPlanner(switch)
+        
+        config = KeyboardConfig(name="indexed", matrices={
+            "main": MatrixConfig(rows=3, cols=4),
+            "thumb": MatrixConfig(rows=1, cols=3, offset=(50, 70))
+        })
+        layout_plan = planner.plan_layout(config)
+        
+        assert len(layout_plan) == 15
+        assert len(layout_plan.get_keys_for_matrix("main")) == 12
+        assert len(layout_plan.get_keys_for_matrix("thumb")) == 3
+        assert layout_plan.get_keys_for_matrix("missing") == []
+        
+        key = layout_plan.key_at("thumb", 0, 2)
+        assert key.matrix_name == "thumb"
+        assert (key.x, key.y) == (50 + 2 * 18.5, 70)
+        assert layout_plan.key_at("main", 3, 0) is None
+        assert layout_plan.key_at("thumb", 1, 0) is None
+        
+        assert layout_plan.total_bounds == (0, 0, 87.0, 70)
+        assert layout_plan.matrices["main"] == (4 * 18.5, 3 * 18.5)
+    
+    def test_layout_plan_from_keys(self):
+        """Test building a plan from KeyPosition objects."""
+        from libs.printboard_v2.layout import LayoutPlan, KeyPosition
+        
+        keys = [
+            KeyPosition(row=0, col=0, x=0, y=0),
+            KeyPosition(row=0, col=0, x=5, y=5, matrix_name="thumb"),
+            KeyPosition(row=0, col=1, x=18.5, y=0)
+        ]
+        layout_plan = LayoutPlan.from_keys(keys, {"main": (37, 18.5)}, (0, 0, 18.5, 5))
+        
+        assert [k.matrix_name for k in layout_plan.keys] == ["main", "main", "thumb"]
+        assert layout_plan.key_at("main", 0, 1).x == 18.5
+        assert layout_plan.key_at("thumb", 0, 0).y == 5
+
+
+class TestV2Placement:
+    """Test the shared key placement kernel and its callers."""
+    
+    def test_place_matrix_centers(self):
+        """Test key centers, staggering and padding."""
+        from libs.printboard_v2.placement import place_matrix
+        
+        matrix_config = MatrixConfig(
+            rows=2,
+            cols=3,
+            offset=(10, 20),
+            rows_stagger=[0, 5],
+            columns_stagger=[0, 3, 0],
+            padding_keys=[1, 2, 3]
+        )
+        placement = place_matrix(matrix_config, (18.5, 18.5))
+        
+        assert placement.x.shape == (2, 3)
+        assert placement.x[0].tolist() == [19.25, 38.75, 59.25]
+        assert placement.x[1][0] == 14.25
+        assert placement.y[:, 0].tolist() == [29.25, 47.75]
+        assert placement.y[0][1] == 26.25
+    
+    def test_place_matrix_rotation_and_angles(self):
+        """Test matrix rotation around the first key and summed key angles."""
+        from libs.printboard_v2.placement import place_matrix
+        
+        matrix_config = MatrixConfig(
+            rows=2,
+            cols=2,
+            rows_angle=[0, 5],
+            columns_angle=[0, 10],
+            rotation_angle=90
+        )
+        placement = place_matrix(matrix_config, (18.5, 18.5))
+        
+        assert abs(placement.x[0][0] - 9.25) < 1e-9
+        assert abs(placement.y[0][0] - 9.25) < 1e-9
+        assert abs(placement.x[0][1] - 9.25) < 1e-9
+        assert abs(placement.y[0][1] - 27.75) < 1e-9
+        assert placement.angle.tolist() == [[90, 100], [95, 105]]
+    
+    def test_all_callers_agree(self):
+        """Test that V1, V1 preview, V2 preview and V2 modeling place keys identically."""
+        from app import generate_layout_data
+        from libs import printboard as kb
+        from libs.switches import gamdias_lp as legacy_switch
+        from libs.printboard_v2.modeling import ModelingEngine
+        
+        web_config = {
+            'rows': 3,
+            'cols': 4,
+            'rowsStagger': [0, 3, 6],
+            'columnsStagger': [0, 1, 2, 3],
+            'rowsAngle': [0, 2, 4],
+            'columnsAngle': [0, 5, 10, 15],
+            'rotationAngle': 12,
+            'paddingKeys': [1, 0, 2, 0],
+            'matrixOffsetX': 7,
+            'matrixOffsetY': -3
+        }
+        matrix_config = keyboard_builder.create_matrix_config_from_web_request(web_config)
+        switch = switch_registry.get("gamdias_lp")
+        half = switch.get_spacing_x() / 2
+        
+        v1_preview = generate_layout_data(web_config)
+        v2_preview = LayoutPlanner(switch).generate_preview_data(
+            KeyboardConfig(name="agree", matrices={"main": matrix_config})
+        )
+        v2_model = ModelingEngine()._plan_switch_positions(matrix_config, switch)
+        v1_model = kb.plan_matrix({
+            "matrixes": {"main": {
+                "offset": (7, -3),
+                "keys": [["switch"] * 4] * 3,
+                "rows_stagger": [0, 3, 6],
+                "columns_stagger": [0, 1, 2, 3],
+                "rows_angle": [0, 2, 4],
+                "columns_angle": [0, 5, 10, 15],
+                "rotation_angle": 12,
+                "padding_keys": [1, 0, 2, 0]
+            }},
+            "switch": legacy_switch
+        })['switches']
+        
+        for v1_key, v2_position in zip(v1_model, v2_model):
+            row, col = v1_key['row'], v1_key['column']
+            for preview in (v1_preview, v2_preview):
+                assert abs(preview[row][col]['x'] + half - v2_position['x']) < 1e-9
+                assert abs(preview[row][col]['y'] + half - v2_position['y']) < 1e-9
+                assert abs(preview[row][col]['angle'] - v2_position['rotation']) < 1e-9
+            assert abs(v1_key['x'] - v2_position['x']) < 1e-9
+            assert abs(v1_key['y'] - v2_position['y']) < 1e-9
+            assert abs(v1_key['c_angle'] - v2_position['rotation']) < 1e-9
+    
+    def test_v1_model_keeps_kernel_positions(self, monkeypatch):
+        """Test that the keys V1 draws for a rotated matrix sit where V2 places them."""
+        import copy
+        from app import build_keyboard_config
+        from libs import printboard as kb
+        from libs.switches import gamdias_lp as legacy_switch
+        from libs.printboard_v2.modeling import ModelingEngine
+        
+        # fix_rotation_matrix_data rotates the shared switch's pins in place
+        monkeypatch.setattr(legacy_switch, 'pins', copy.deepcopy(legacy_switch.pins))
+        drawn = []
+        draw_matrix = kb.draw_matrix
+        monkeypatch.setattr(kb, 'draw_matrix', lambda matrix, config: drawn.append(matrix) or draw_matrix(matrix, config))
+        
+        web_config = {'name': 'rotated', 'rows': 3, 'cols': 2, 'rotationAngle': 30}
+        kb.create_keyboard(build_keyboard_config(web_config))
+        matrix_config = keyboard_builder.create_matrix_config_from_web_request(web_config)
+        v2_model = ModelingEngine()._plan_switch_positions(matrix_config, switch_registry.get("gamdias_lp"))
+        
+        keys = drawn[0]['switches']
+        for v1_key, v2_position in zip(keys, v2_model):
+            assert abs(v1_key['x'] - v2_position['x']) < 1e-9
+            assert abs(v1_key['y'] - v2_position['y']) < 1e-9
+            assert abs(v1_key['c_angle'] + v2_position['rotation']) < 1e-9
+        pitch = legacy_switch.conf['switch_sizes_x']
+        for i, a in enumerate(keys):
+            for b in keys[i + 1:]:
+                assert (a['x'] - b['x']) ** 2 + (a['y'] - b['y']) ** 2 >= pitch ** 2 - 1e-6
+    
+    def test_v1_column_angles_keep_their_splay(self, monkeypatch):
+        """Test V1 key positions for a column angle against the original V1 numbers."""
+        import copy
+        from app import build_keyboard_config
+        from libs import printboard as kb
+        from libs.switches import gamdias_lp as legacy_switch
+        
+        monkeypatch.setattr(legacy_switch, 'pins', copy.deepcopy(legacy_switch.pins))
+        layout = build_keyboard_config({'rows': 3, 'cols': 2, 'columnsAngle': [0, 10]})
+        keys = kb.fix_rotation_matrix_data(kb.plan_matrix(layout), layout)['switches']
+        
+        positions = {(key['row'], key['column']): (key['x'], key['y']) for key in keys}
+        expected = {
+            (0, 0): (9.25, 9.25), (0, 1): (34.175, 9.25),
+            (1, 0): (9.25, 27.75), (1, 1): (30.9625, 27.75),
+            (2, 0): (9.25, 46.25), (2, 1): (27.75, 46.25),
+        }
+        for cell, (x, y) in expected.items():
+            assert positions[cell] == pytest.approx((x, y), abs=1e-3)
+    
+    def test_modeling_places_each_matrix_once(self, monkeypatch):
+        """Test that a part's cavities and instances share one placement."""
+        from libs.printboard_v2 import modeling
+        
+        calls = []
+        place_matrix = modeling.place_matrix
+        monkeypatch.setattr(modeling, 'place_matrix', lambda *args: calls.append(args) or place_matrix(*args))
+        config = KeyboardConfig(name="once", matrices={
+            "left": MatrixConfig(rows=2, cols=3),
+            "right": MatrixConfig(rows=2, cols=3, rotation_angle=10),
+        })
+        parts = modeling.ModelingEngine().create_keyboard_parts(config)
+        
+        assert len(calls) == 2
+        assert [part["instances"].x.size for part in parts] == [6, 6]
+
 
 class TestV2Builder:
     """Test keyboard builder functionality."""
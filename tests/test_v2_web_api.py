@@ -258,6 +258,110 @@ class TestV2WebAPI:
                 assert v1_key['width'] == v2_key['width']
                 assert v1_key['height'] == v2_key['height']
 
+    
+    def test_v2_preview_batch_matches_single_preview(self, client):
+        """Test that batch preview returns the same layouts as single previews."""
+        configs = [
+            {'rows': 2, 'cols': 3, 'rowsStagger': [0, 5]},
+            {'rows': 3, 'cols': 3, 'rotationAngle': 15, 'matrixOffsetX': 10},
+            {'rows': 2, 'cols': 3, 'columnsAngle': [0, 5, 10]}
+        ]
+        
+        response = client.post('/api/v2/keyboard/preview/batch',
+                             data=json.dumps({'configs': configs}),
+                             content_type='application/json')
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['success'] is True
+        assert data['count'] == 3
+        
+        for config, batch_layout in zip(configs, data['layouts']):
+            single = json.loads(client.post('/api/v2/keyboard/preview',
+                                            data=json.dumps(config),
+                                            content_type='application/json').data)
+            assert len(single['layout']) == len(batch_layout)
+            for single_row, batch_row in zip(single['layout'], batch_layout):
+                for single_key, batch_key in zip(single_row, batch_row):
+                    assert abs(single_key['x'] - batch_key['x']) < 1e-9
+                    assert abs(single_key['y'] - batch_key['y']) < 1e-9
+                    assert single_key['angle'] == batch_key['angle']
+                    assert single_key['label'] == batch_key['label']
+    
+    def test_v2_preview_batch_binary(self, client):
+        """Test the compact binary batch preview payload."""
+        import numpy as np
+        
+        configs = [{'rows': 2, 'cols': 2}, {'rows': 3, 'cols': 4, 'rowsStagger': [0, 1, 2]}]
+        response = client.post('/api/v2/keyboard/preview/batch',
+                             data=json.dumps({'configs': configs, 'format': 'binary'}),
+                             content_type='application/json')
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/octet-stream'
+        assert response.headers['X-Batch-Shapes'] == '2x2,3x4'
+        
+        values = np.frombuffer(response.data, dtype='<f4').reshape(-1, 3)
+        assert values.shape == (16, 3)
+        # Second config, row 1, col 0 is staggered by 1
+        assert values[4 + 4][0] == -1
+    
+    def test_v2_preview_batch_errors(self, client):
+        """Test batch preview validation errors."""
+        response = client.post('/api/v2/keyboard/preview/batch',
+                             data=json.dumps({'configs': []}),
+                             content_type='application/json')
+        assert response.status_code == 400
+        
+        response = client.post('/api/v2/keyboard/preview/batch',
+                             data=json.dumps({'configs': [{'rows': 2}, {'rows': 0}]}),
+                             content_type='application/json')
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert data['success'] is False
+        assert 'configs[1]' in data['error']
+
+    
+    def test_v2_scene_instances_match_placement(self, client):
+        """Test the instanced scene: one transform per key at the key centers."""
+        import base64
+        import numpy as np
+        from libs.mesh import decode_indexed_mesh
+        from libs.printboard_v2.builder import keyboard_builder
+        from libs.printboard_v2.placement import place_matrix
+        
+        config = {'name': 'scene_test', 'rows': 2, 'cols': 3, 'rotationAngle': 30}
+        response = client.post('/api/v2/keyboard/scene',
+                             data=json.dumps(config),
+                             content_type='application/json')
+        assert response.status_code == 200
+        scene = json.loads(response.data)['scene']
+        
+        assert scene['instances']['count'] == 6
+        assert scene['instances']['matrices'] == {'main': [0, 6]}
+        transforms = np.array(scene['instances']['transforms']).reshape(6, 4, 4)
+        placement = place_matrix(keyboard_builder.create_matrix_config_from_web_request(config), (18.5, 18.5))
+        # Column-major: translation in the last row, rotation in the upper-left block
+        assert np.allclose(transforms[:, 3, 0], placement.x.ravel(), atol=1e-3)
+        assert np.allclose(transforms[:, 3, 1], placement.y.ravel(), atol=1e-3)
+        assert np.allclose(transforms[:, 0, 1], np.sin(np.radians(30)), atol=1e-3)
+        
+        # 2 row routes + 3 column routes, through key centers
+        assert len(scene['tubes']) == 5
+        assert scene['tubes'][0]['points'][0][:2] == pytest.approx([placement.x[0, 0], placement.y[0, 0]], abs=1e-3)
+        
+        positions, indices = decode_indexed_mesh(base64.b64decode(scene['cavity']['data']))
+        assert len(positions) > 0 and len(indices) % 3 == 0
+    
+    def test_v2_scene_without_cavity(self, client):
+        """Test omitting the cavity mesh for clients that already have it."""
+        response = client.post('/api/v2/keyboard/scene',
+                             data=json.dumps({'rows': 2, 'cols': 2, 'includeCavity': False}),
+                             content_type='application/json')
+        scene = json.loads(response.data)['scene']
+        assert 'cavity' not in scene
+        assert len(scene['instances']['transforms']) == 4 * 16
+
 
 class TestV2APIIntegration:
     """Integration tests for V2 API."""
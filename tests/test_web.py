@@ -1,4 +1,5 @@
 import pytest
+import gzip
 import json
 import os
 import tempfile
@@ -168,4 +169,76 @@ def test_presets_api(client):
     assert 'presets' in data
     assert 'basic_5x5' in data['presets']
     assert data['presets']['basic_5x5']['rows'] == 5
-    assert data['presets']['basic_5x5']['cols'] == 5
\ No newline at end of file
+    assert data['presets']['basic_5x5']['cols'] == 5
+def _generated_scad(client):
+    response = client.post('/api/keyboard/generate',
+                          data=json.dumps({'name': 'download_test', 'rows': 2, 'cols': 2}),
+                          content_type='application/json')
+    return json.loads(response.data)['scad_files'][0]
+
+def test_download_caching_and_validators(client):
+    """Test that downloads are cacheable and support conditional requests."""
+    filename = _generated_scad(client)
+    
+    response = client.get(f'/api/keyboard/download/{filename}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers.get('ETag')
+    assert response.headers.get('Last-Modified')
+    assert response.headers.get('Accept-Ranges') == 'bytes'
+    
+    response = client.get(f'/api/keyboard/download/{filename}',
+                          headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+def test_download_range_request(client):
+    """Test resuming a download with a Range request."""
+    filename = _generated_scad(client)
+    full_body = client.get(f'/api/keyboard/download/{filename}').data
+    
+    response = client.get(f'/api/keyboard/download/{filename}',
+                          headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == full_body[10:20]
+    assert response.headers['Content-Range'].startswith('bytes 10-19/')
+
+def test_download_x_accel_offload(client):
+    """Test handing the download off to the front proxy."""
+    filename = _generated_scad(client)
+    app.config['ARTIFACT_OFFLOAD'] = 'x-accel'
+    try:
+        response = client.get(f'/api/keyboard/download/{filename}')
+    finally:
+        app.config['ARTIFACT_OFFLOAD'] = ''
+    
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == f'/protected-output/{filename}'
+    assert response.data == b''
+
+def test_download_missing_file(client):
+    """Test downloading a file that does not exist."""
+    response = client.get('/api/keyboard/download/missing.stl')
+    assert response.status_code == 404
+
+def test_download_precompressed_stl(client):
+    """Test that STL downloads use the gzip copy when the client accepts it."""
+    from app import artifact_store
+    from libs.render import write_gzip_sibling
+    
+    stl_path = os.path.join(app.config['OUTPUT_DIR'], 'compressed_part.stl')
+    with open(stl_path, 'wb') as f:
+        f.write(b'\0' * 84)
+    write_gzip_sibling(stl_path)
+    artifact_store().record('compressed_part.stl')
+    
+    response = client.get('/api/keyboard/download/compressed_part.stl',
+                          headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'compressed_part.stl' in response.headers['Content-Disposition']
+    assert gzip.decompress(response.data) == b'\0' * 84
+    
+    response = client.get('/api/keyboard/download/compressed_part.stl')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'\0' * 84